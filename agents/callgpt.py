@@ -1,7 +1,11 @@
 import asyncio
+import time
 import openai
 from asyncio_throttle import Throttler
 from config import settings
+from agents.embedding_cache import embedding_cache
+from clients import get_openai_client
+from metrics import EMBEDDING_CACHE_LOOKUPS, OPENAI_FAILURES, OPENAI_RETRIES, RATE_LIMIT_WAIT, record_usage, span
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,39 +13,77 @@ logger = logging.getLogger(__name__)
 gpt_throttler = Throttler(rate_limit=1000, period=1)
 embedding_throttler = Throttler(rate_limit=1000, period=1)
 
+def log_usage(model, response):
+    usage = getattr(response, 'usage', None)
+    if not usage:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) or 0
+    logger.info(f"{model} prompt_tokens={usage.prompt_tokens} cached_tokens={cached} completion_tokens={usage.completion_tokens}")
+    record_usage(model, usage)
+
+async def backoff(endpoint, attempt):
+    OPENAI_RETRIES.labels(endpoint).inc()
+    delay = 2 ** attempt
+    RATE_LIMIT_WAIT.labels(endpoint, 'backoff').inc(delay)
+    await asyncio.sleep(delay)
+
 async def call_gpt(messages, model="o4-mini", retries=3, **kwargs):
     for attempt in range(retries):
         try:
+            queued = time.perf_counter()
             async with gpt_throttler:
-                client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-                response = await client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    **kwargs
-                )
+                RATE_LIMIT_WAIT.labels('chat', 'throttle').inc(time.perf_counter() - queued)
+                client = get_openai_client()
+                with span('openai.chat'):
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        **kwargs
+                    )
+                log_usage(model, response)
                 return response
         except openai.RateLimitError as e:
             logger.warning(f"OpenAI rate limit: {e}, attempt {attempt+1}")
-            await asyncio.sleep(2 ** attempt)
+            await backoff('chat', attempt)
         except Exception as e:
             logger.error(f"GPT call failed: {e}", exc_info=True)
             break
+    OPENAI_FAILURES.labels('chat').inc()
     return None
 
-async def get_embedding(text: str, retries=3) -> list:
+async def get_embedding(text: str, retries=3, use_cache=True) -> list:
+    if not isinstance(text, str) or not text.strip():
+        # Nothing to embed; callers treat None as "no embedding", as when the API rejected it
+        return None
+    model = settings.EMBEDDING_MODEL or "text-embedding-ada-002"
+    use_cache = use_cache and settings.EMBEDDING_CACHE_ENABLED
+    if use_cache:
+        cached = await asyncio.to_thread(embedding_cache.get, model, text)
+        EMBEDDING_CACHE_LOOKUPS.labels('miss' if cached is None else 'hit').inc()
+        if cached is not None:
+            return cached
     for attempt in range(retries):
         try:
+            queued = time.perf_counter()
             async with embedding_throttler:
-                client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-                response = await client.embeddings.create(
-                    model=settings.EMBEDDING_MODEL or "text-embedding-ada-002",
-                    input=text
-                )
-                return response.data[0].embedding
+                RATE_LIMIT_WAIT.labels('embeddings', 'throttle').inc(time.perf_counter() - queued)
+                client = get_openai_client()
+                with span('openai.embeddings'):
+                    response = await client.embeddings.create(
+                        model=model,
+                        input=text
+                    )
+                record_usage(model, response.usage)
+                embedding = response.data[0].embedding
+                if use_cache:
+                    await asyncio.to_thread(embedding_cache.set, model, text, embedding)
+                return embedding
         except openai.RateLimitError as e:
             logger.warning(f"OpenAI embedding rate limit: {e}, attempt {attempt+1}")
-            await asyncio.sleep(2 ** attempt)
+            await backoff('embeddings', attempt)
         except Exception as e:
             logger.error(f"Error getting embedding: {str(e)}", exc_info=True)
             break
+    OPENAI_FAILURES.labels('embeddings').inc()
     return None
\ No newline at end of file
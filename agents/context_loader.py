@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from config import settings
+from database.supabase import get_async_supabase_client
+from database.bookkeeping import latest_pending
+from database.message_log import fetch_recent_messages
+from database.opportunity_catalog import opportunity_catalog
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationContext(BaseModel):
+    user_id: str
+    profile: Optional[Dict[str, Any]] = None  # profiles row without the embedding
+    conversation: Optional[Dict[str, Any]] = None  # active user_conversations row
+    messages: List[Dict[str, Any]] = Field(default_factory=list)  # oldest first, from conversation_messages for the active conversation
+    last_recommendation: Optional[Dict[str, Any]] = None
+    recent_recommendations: List[Dict[str, Any]] = Field(default_factory=list)
+    loaded_at: float = 0.0
+
+
+def _first(response) -> Optional[Dict[str, Any]]:
+    return response.data[0] if response and response.data else None
+
+
+async def _fetch_profile(user_id):
+    supabase = get_async_supabase_client()
+    row = _first(await supabase.table('profiles').select('*').eq('user_id', user_id).limit(1).execute())
+    if row and 'embedding' in row:
+        row = {k: v for k, v in row.items() if k != 'embedding'}
+    return row
+
+
+async def _fetch_active_conversation(user_id):
+    supabase = get_async_supabase_client()
+    return _first(await supabase.table('user_conversations').select('id, user_id, item_id, started_at, ended_at').eq('user_id', user_id).is_('ended_at', 'null').order('started_at', desc=True).limit(1).execute())
+
+
+async def _fetch_conversation_and_messages(user_id):
+    conversation = await _fetch_active_conversation(user_id)
+    messages = await fetch_recent_messages(user_id, conversation_id=conversation['id']) if conversation else []
+    return conversation, messages
+
+
+async def _fetch_last_user_recommendation(user_id):
+    # A recommendation sent moments ago may still be in the write-behind buffer
+    pending = latest_pending('user_recommendations', user_id=user_id)
+    if pending:
+        return pending
+    supabase = get_async_supabase_client()
+    return _first(await supabase.table('user_recommendations').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(1).execute())
+
+
+async def _fetch_recent_recommendations(user_id):
+    supabase = get_async_supabase_client()
+    row = _first(await supabase.table('recent_recommendations').select('recommendations').eq('user_id', user_id).limit(1).execute())
+    recs = row.get('recommendations') if row else None
+    return recs if isinstance(recs, list) else []
+
+
+def format_last_recommendation(last_rec, opportunity) -> Optional[Dict[str, Any]]:
+    if not last_rec or not opportunity:
+        return None
+    return {
+        "id": last_rec['item_id'],
+        "title": opportunity.get('title'),
+        "description": opportunity.get('description'),
+        "details": opportunity.get('details', {}),
+        "recommended_at": last_rec['created_at'],
+        "status": last_rec['status']
+    }
+
+
+class ContextCache:
+    """Short-lived per-user cache of ConversationContext, updated in place on writes."""
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else settings.CONTEXT_CACHE_TTL
+        self._entries: Dict[str, ConversationContext] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id) -> Optional[ConversationContext]:
+        with self._lock:
+            context = self._entries.get(user_id)
+            if context and time.monotonic() - context.loaded_at < self.ttl:
+                return context
+            self._entries.pop(user_id, None)
+            return None
+
+    def put(self, context: ConversationContext) -> None:
+        with self._lock:
+            self._entries[context.user_id] = context
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+context_cache = ContextCache()
+
+
+@timed('supabase.load_context')
+async def load_conversation_context(user_id: str, profile: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> ConversationContext:
+    """
+    Load everything converse_with_user needs before calling the model.
+
+    The profile, active conversation, the last user_recommendations row and
+    recent_recommendations are fetched concurrently; only the conversation's
+    latest messages and the opportunity behind the last recommendation depend
+    on an earlier result. A profile already fetched by the caller
+    (process_message) is reused. Every query is awaited on the async client,
+    so concurrent turns do not queue for the default thread pool.
+    """
+    if use_cache:
+        cached = context_cache.get(user_id)
+        if cached:
+            return cached
+
+    start = time.perf_counter()
+    profile_task = asyncio.sleep(0, profile) if profile is not None else _fetch_profile(user_id)
+    profile, (conversation, messages), last_rec, recent = await asyncio.gather(
+        profile_task,
+        _fetch_conversation_and_messages(user_id),
+        _fetch_last_user_recommendation(user_id),
+        _fetch_recent_recommendations(user_id),
+    )
+    opportunity = await opportunity_catalog.aget(last_rec['item_id']) if last_rec else None
+
+    context = ConversationContext(
+        user_id=user_id,
+        profile=profile,
+        conversation=conversation,
+        messages=messages,
+        last_recommendation=format_last_recommendation(last_rec, opportunity),
+        recent_recommendations=recent,
+        loaded_at=time.monotonic(),
+    )
+    logger.info(f"Loaded conversation context for {user_id} in {(time.perf_counter() - start) * 1000:.0f}ms")
+    if use_cache:
+        context_cache.put(context)
+    return context
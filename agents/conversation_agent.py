@@ -1,34 +1,38 @@
 from config import settings
-from database.supabase import get_supabase_client
-from agents.system_prompts import ALEX_HEFLE_PROMPT, RECOMMENDATION_PROMPT, FINAL_RECOMMENDATION
+from database.supabase import get_async_supabase_client
+from agents.system_prompts import ALEX_HEFLE_PROMPT, RECOMMENDATION_PROMPT, FINAL_RECOMMENDATION, CASUAL_CHAT_PROMPT
 from matcher.recommendation_engine import recommend_to_user, record_recommendation, secondary_recommend
-from twilio.rest import Client
+from clients import get_twilio_client
 import asyncio
 import logging
-import json
 import requests
 from datetime import datetime, timezone
-import re
 from profiles.profiles import update_user_profile
 from agents.callgpt import call_gpt, get_embedding
+from agents.context_loader import load_conversation_context, context_cache
+from agents.prompt_builder import build_messages, format_recommendations, to_chat_history
+from agents.response_parser import parse_gpt_response, profile_embedding_input
+from database.message_log import append_messages
+from metrics import INTENT_ROUTES, timed
+from classifier.model import SIMPLE_INTENTS, classify_intent, get_intent_classifier
 
 logger = logging.getLogger(__name__)
 
-client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+client = get_twilio_client()
 twilio_number = settings.TWILIO_PHONE_NUMBER
 
 redis_client = settings.redis_client
 
-async def record_message(active_conversation, user_message, message_to_process):
-    supabase = get_supabase_client()
-    updated_messages = active_conversation.get('messages', [])
-    updated_messages.extend([
-        {"sender": "user", "content": message_to_process, "timestamp": datetime.now(timezone.utc)},
-        {"sender": "system", "content": user_message, "timestamp": datetime.now(timezone.utc)}
-    ])
-    supabase.table('user_conversations').update({
-        'messages': updated_messages
-    }).eq('id', active_conversation['id']).execute()
+async def record_message(context, user_message, message_to_process):
+    turn = [
+        {"sender": "user", "content": message_to_process},
+        {"sender": "system", "content": user_message}
+    ]
+    conversation_id = (context.conversation or {}).get('id')
+    await append_messages(context.user_id, conversation_id, turn)
+    # Keep the cached context in step with what was just written
+    now = datetime.now(timezone.utc).isoformat()
+    context.messages.extend({**msg, "timestamp": now} for msg in turn)
 
 async def message_to_json(message) -> str:
     if isinstance(message, list):
@@ -38,176 +42,131 @@ async def message_to_json(message) -> str:
     return message_to_process
 
 async def final_send(conversation_history, last_recommendation, user_profile, recs2, message_to_process):
-    context = {
-        "conversation_history": conversation_history,
-        "last_recommendation": last_recommendation,
-        "user_profile": user_profile,
-        "new_recommendations": recs2
-    }
-    messages = [
-        {"role": "system", "content": FINAL_RECOMMENDATION},
-        {"role": "system", "content": f"Context for this conversation:\n{json.dumps(context, indent=2)}"},
-    ]
-    
-    messages.extend(conversation_history)
-    messages.append({"role": "user", "content": message_to_process})
+    messages = build_messages(
+        FINAL_RECOMMENDATION,
+        conversation_history,
+        message_to_process,
+        profile=user_profile,
+        context={
+            "last_recommendation": last_recommendation,
+            "new_recommendations": recs2
+        }
+    )
 
     # Call GPT
     response = await call_gpt(messages, model="o4-mini")
-    return response
-
-async def converse_with_user(user_id: str, message) -> str:
+    if not response:
+        return None
+    return response.choices[0].message.content.strip()
+
+def use_small_prompt(prediction) -> bool:
+    if prediction is None:
+        return False
+    confident = get_intent_classifier().is_confident(prediction)
+    small = confident and prediction.intent in SIMPLE_INTENTS
+    INTENT_ROUTES.labels(prediction.intent, 'small' if small else 'full').inc()
+    return small
+
+async def casual_reply(conversation_history, user_profile, message_to_process):
+    messages = build_messages(CASUAL_CHAT_PROMPT, conversation_history, message_to_process, profile=user_profile)
+    response = await call_gpt(messages, model=settings.SMALL_CHAT_MODEL)
+    if not response:
+        return None
+    return response.choices[0].message.content.strip()
+
+@timed('agent.converse_with_user')
+async def converse_with_user(user_id: str, message, user_profile=None) -> str:
     if isinstance(message, list):
         message_to_process = '\n'.join(message)
     else:
         message_to_process = message
 
-    supabase = get_supabase_client()
-    
-    user_profile_response = supabase.table('profiles').select('*').eq('user_id', user_id).single().execute()
-    user_profile = user_profile_response.data if user_profile_response and user_profile_response.data else None
-    if user_profile and 'embedding' in user_profile:
-        user_profile = {k: v for k, v in user_profile.items() if k != 'embedding'}
-    
-    active_conv_response = supabase.table('user_conversations').select('*').eq('user_id', user_id).is_('ended_at', 'null').order('started_at', desc=True).limit(1).execute()
-    
-    if not active_conv_response.data:
+    # The intent only needs the message embedding, so it is classified while the context loads
+    context, prediction = await asyncio.gather(
+        load_conversation_context(user_id, profile=user_profile),
+        classify_intent(message_to_process)
+    )
+    user_profile = context.profile
+
+    if not context.conversation:
+        supabase = get_async_supabase_client()
         new_conv = {
             'user_id': user_id,
-            'started_at': datetime.now(timezone.utc),
-            'messages': []
+            'started_at': datetime.now(timezone.utc).isoformat()
         }
-        active_conv_response = supabase.table('user_conversations').insert(new_conv).execute()
+        active_conv_response = await supabase.table('user_conversations').insert(new_conv).execute()
         if not active_conv_response.data:
             logger.error(f"Failed to create new conversation for user {user_id}")
             return "Sorry, I'm having trouble starting our conversation. Please try again."
+        context.conversation = active_conv_response.data[0]
     
-    active_conversation = active_conv_response.data[0]
-    messages = active_conversation.get('messages', [])
-    
-    last_rec_response = supabase.table('user_recommendations').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(1).execute()
-    
-    recs_response = supabase.table('recent_recommendations').select('recommendations').eq('user_id', user_id).single().execute()
-    recs = recs_response.data['recommendations'] if recs_response and recs_response.data and recs_response.data.get('recommendations') else []
+    messages = context.messages
+
+    if use_small_prompt(prediction):
+        logger.info(f"Routing {prediction.intent} turn ({prediction.confidence:.2f}) for {user_id} to {settings.SMALL_CHAT_MODEL}")
+        user_message = await casual_reply(to_chat_history(messages), user_profile, message_to_process)
+        if user_message:
+            await record_message(context, user_message, message_to_process)
+            return user_message
+
+    recs = context.recent_recommendations
     if not recs or not isinstance(recs, list) or len(recs) == 0:
         logger.info(f"No recommendations found for user {user_id}")
         return "Hey! I'm having trouble finding opportunities that match your interests right now. Want to chat about something else?"
 
-    conversation_history = []
-    for msg in messages:
-        role = "assistant" if msg['sender'] == 'system' else "user"
-        conversation_history.append({"role": role, "content": msg['content']})
-
-    last_recommendation = None
-    if last_rec_response.data and last_rec_response.data[0]:
-        last_rec = last_rec_response.data[0]
-        opp_response = supabase.table('opportunities').select('*').eq('id', last_rec['item_id']).single().execute()
-        if opp_response.data:
-            last_recommendation = {
-                "id": last_rec['item_id'],
-                "title": opp_response.data.get('title'),
-                "description": opp_response.data.get('description'),
-                "details": opp_response.data.get('details', {}),
-                "recommended_at": last_rec['created_at'],
-                "status": last_rec['status']
-            }
-
-    # Format current recommendations
-    current_recommendation = []
-    for rec in recs[:5]:  # Only include top 1
-        current_recommendation.append({
-            "id": rec['id'],
-            "title": rec.get('title'),
-            "description": rec.get('description'),
-            "details": rec.get('details', {}),
-            "score": rec.get('distance', 0),
-            "tags": rec.get('tags', [])
-        })
-
-    context = {
-        "conversation_history": conversation_history,
-        "last_recommendation": last_recommendation,
-        "current_recommendations": current_recommendation,
-        "user_profile": user_profile
-    }
-    messages = [
-        {"role": "system", "content": ALEX_HEFLE_PROMPT},
-        {"role": "system", "content": f"Context for this conversation:\n{json.dumps(context, indent=2)}"},
-    ]
-    
-    messages.extend(conversation_history)
-    messages.append({"role": "user", "content": message_to_process})
+    conversation_history = to_chat_history(messages)
+    last_recommendation = context.last_recommendation
+    current_recommendation = format_recommendations(recs)
+
+    messages = build_messages(
+        ALEX_HEFLE_PROMPT,
+        conversation_history,
+        message_to_process,
+        profile=user_profile,
+        context={
+            "last_recommendation": last_recommendation,
+            "current_recommendations": current_recommendation
+        }
+    )
 
     # Call GPT
     response = await call_gpt(messages, model="o4-mini")
     
     gpt_response = response.choices[0].message.content.strip()
     user_message = None
-    json_match = re.match(r'\{[\s\S]*\}$', gpt_response)
-    if json_match:
-        try:
-            gpt_json = json.loads(gpt_response)
-            if isinstance(gpt_json, dict) and 'id' in gpt_json and 'message' in gpt_json:
-                user_message = gpt_json['message']
-                record_recommendation(user_id, gpt_json['id'], 1.0)
-            elif (
-                isinstance(gpt_json, dict) and
-                isinstance(list(gpt_json.values()), list) and
-                len(list(gpt_json.values())) >= 3 and
-                isinstance(list(gpt_json.values())[2], str) and
-                list(gpt_json.values())[2].upper() == 'RAG' and
-                isinstance(list(gpt_json.values())[1], list)
-            ):
-                modified_user_message = list(gpt_json.values())[0]
-                tags = list(gpt_json.values())[1]
-                recs2 = await secondary_recommend(user_id, modified_user_message, tags)
-                user_message = final_send(conversation_history, last_recommendation, user_profile, recs2, message_to_process)
-            # New RAG format: second dict has 'type': 'RAG' (no tag filtering)
-            elif (
-                isinstance(gpt_json, dict) and
-                isinstance(list(gpt_json.values()), list) and
-                len(list(gpt_json.values()) )>= 2 and
-                isinstance(list(gpt_json.values())[1], str) and
-                list(gpt_json.values())[1].upper() == 'RAG'
-            ):
-                modified_user_message = list(gpt_json.values())[0]
-                recs2 = await secondary_recommend(user_id, modified_user_message, None)
-                user_message = final_send(conversation_history, last_recommendation, user_profile, recs2, message_to_process)
-
-            elif gpt_json.get('type', '').upper() == 'UPDATE':
-                user_message = gpt_json.get('message', user_message)
-                profile_updates = {k: v for k, v in gpt_json.items() if k not in ['message', 'type']}
-                if profile_updates:
-                    embedding_fields = []
-                    for field in ['bio', 'username', 'location']:
-                        if field in profile_updates and profile_updates[field]:
-                            embedding_fields.append(profile_updates[field])
-                    if embedding_fields:
-                        embedding_input = ' '.join(embedding_fields)
-                        embedding = await get_embedding(embedding_input)
-                        if embedding:
-                            profile_updates['embedding'] = embedding
-                    if user_profile:
-                        merged_profile = user_profile.copy()
-                        merged_profile.update(profile_updates)
-                        await update_user_profile(user_id, merged_profile)
-                    else:
-                        await update_user_profile(user_id, profile_updates)
-        except Exception as e:
-            logger.error(f"Failed to parse/update profile or RAG JSON: {e}")
+    parsed = parse_gpt_response(gpt_response) or {}
+    intent = parsed.get('intent')
+    try:
+        if intent == 'recommend':
+            user_message = parsed['message']
+            record_recommendation(user_id, parsed['id'], 1.0)
+        elif intent == 'rag':
+            recs2 = await secondary_recommend(user_id, parsed['query'], parsed['tags'])
+            user_message = await final_send(conversation_history, last_recommendation, user_profile, recs2, message_to_process)
+        elif intent == 'update':
+            user_message = parsed['message']
+            profile_updates = parsed['updates']
+            if profile_updates:
+                embedding_input = profile_embedding_input(profile_updates)
+                if embedding_input:
+                    embedding = await get_embedding(embedding_input)
+                    if embedding:
+                        profile_updates['embedding'] = embedding
+                if user_profile:
+                    merged_profile = user_profile.copy()
+                    merged_profile.update(profile_updates)
+                    await update_user_profile(user_id, merged_profile)
+                else:
+                    await update_user_profile(user_id, profile_updates)
+                context_cache.invalidate(user_id)
+    except Exception as e:
+        logger.error(f"Failed to parse/update profile or RAG JSON: {e}")
 
     # Update conversation with new messages
-    await record_message(active_conversation, user_message, message_to_process)
+    await record_message(context, user_message, message_to_process)
     return user_message
 
-async def send_daily_recommendation(user_id):
-    recs = await recommend_to_user(user_id)
-    if not recs or not isinstance(recs, list) or len(recs) == 0:
-        logger.info(f"No recommendations found for user {user_id}")
-        return
-    top_rec = recs[0]
-    # Record the top recommendation only here
-    record_recommendation(user_id, top_rec['id'], top_rec.get('score', 0))
+def queue_daily_sms(user_id, top_rec) -> bool:
     message = f"Hey! Based on your profile, here's something you might like: {top_rec['title']} - {top_rec['description']}"
     # Use the send_sms endpoint to queue the message
     payload = {
@@ -219,10 +178,21 @@ async def send_daily_recommendation(user_id):
         response = requests.post(url, json=payload)
         if response.status_code == 200:
             logger.info(f"Queued daily recommendation to {user_id}: {top_rec['id']}")
-        else:
-            logger.error(f"Failed to queue SMS for {user_id}: {response.text}")
+            return True
+        logger.error(f"Failed to queue SMS for {user_id}: {response.text}")
     except Exception as e:
         logger.error(f"Exception when calling send_sms endpoint: {e}")
+    return False
+
+async def send_daily_recommendation(user_id):
+    recs = await recommend_to_user(user_id)
+    if not recs or not isinstance(recs, list) or len(recs) == 0:
+        logger.info(f"No recommendations found for user {user_id}")
+        return
+    top_rec = recs[0]
+    # Record the top recommendation only here
+    record_recommendation(user_id, top_rec['id'], top_rec.get('score', 0))
+    queue_daily_sms(user_id, top_rec)
 
 # Example usage (for testing only):
 # import asyncio
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from redis import Redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+from config import settings
+from database.embedding import Embedding
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "emb:"
+REDIS_RETRY_SECONDS = 30  # skip the Redis tier this long after a failure instead of paying the timeout per call
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+    return KEY_PREFIX + digest
+
+
+def encode_vector(embedding) -> bytes:
+    return Embedding(np.asarray(embedding, dtype=np.float32), dim=len(embedding)).to_bytes()
+
+
+def decode_vector(blob: bytes) -> list:
+    return Embedding.from_bytes(blob, dim=len(blob) // 4).to_list()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: a per-process LRU in front of a shared Redis tier.
+
+    Both tiers hold raw float32 bytes (6 KB for a 1536-dim vector) keyed by a
+    SHA-256 of the model name and whitespace-normalized text. The LRU is guarded
+    by a lock so it can be shared by gunicorn threads and the worker's loop.
+    After a Redis error the cache runs on the LRU alone for REDIS_RETRY_SECONDS.
+    """
+
+    def __init__(self, max_items: int = None, ttl: int = None, redis_client: Redis = None):
+        self.max_items = max_items or settings.EMBEDDING_CACHE_SIZE
+        self.ttl = ttl or settings.EMBEDDING_CACHE_TTL
+        self._redis = redis_client
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis_down_until = 0.0
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    @property
+    def redis(self) -> Optional[Redis]:
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None and settings.REDIS_HOST:
+            # Separate connection from the queue client: values are binary, not decoded strings
+            self._redis = Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                password=settings.REDIS_PASSWORD,
+                ssl=settings.REDIS_SSL,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5,
+                # One attempt; _redis_failed backs off across calls instead
+                retry=Retry(NoBackoff(), 0),
+            )
+        return self._redis
+
+    def _redis_failed(self, action: str, error: Exception) -> None:
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning(f"Embedding cache Redis {action} failed, skipping Redis for {REDIS_RETRY_SECONDS}s: {error}")
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            blob = self._local.get(key)
+            if blob is not None:
+                self._local.move_to_end(key)
+            return blob
+
+    def _put_local(self, key: str, blob: bytes) -> None:
+        with self._lock:
+            self._local[key] = blob
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_items:
+                self._local.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[list]:
+        key = cache_key(model, text)
+        blob = self._get_local(key)
+        if blob is not None:
+            self.hits_local += 1
+            return decode_vector(blob)
+        redis = self.redis
+        try:
+            blob = redis.get(key) if redis else None
+        except Exception as e:
+            self._redis_failed("get", e)
+            blob = None
+        if blob is not None:
+            self.hits_redis += 1
+            self._put_local(key, blob)
+            return decode_vector(blob)
+        self.misses += 1
+        return None
+
+    def set(self, model: str, text: str, embedding) -> None:
+        key = cache_key(model, text)
+        blob = encode_vector(embedding)
+        self._put_local(key, blob)
+        redis = self.redis
+        try:
+            if redis:
+                redis.set(key, blob, ex=self.ttl)
+        except Exception as e:
+            self._redis_failed("set", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_rate": (self.hits_local + self.hits_redis) / lookups if lookups else 0.0,
+            "local_items": len(self._local),
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -3,6 +3,8 @@ import json
 import httpx
 from typing import Dict, Any, Optional, List
 from config import settings
+from clients import get_perplexity_client
+from metrics import span
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -52,26 +54,27 @@ async def query_user_background(db_messages: List[str]) -> dict:
         }
 
         logger.info(f"Sending query to Perplexity API for onboarding profile extraction")
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        client = get_perplexity_client()
+        with span('perplexity.query'):
             response = await client.post(
                 PERPLEXITY_API_URL,
                 headers=headers,
                 json=payload
             )
+        
+        if response.status_code != 200:
+            logger.error(f"Perplexity API error line 74 perplexity_client.py: {response.status_code} - {response.text}")
+            return {}
             
-            if response.status_code != 200:
-                logger.error(f"Perplexity API error line 74 perplexity_client.py: {response.status_code} - {response.text}")
-                return {}
-                
-            result = response.json()
-            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            logger.info(f"Generated profile extraction response ({len(content)} chars)")
-            try:
-                profile_data = json.loads(content)
-                return profile_data
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing JSON from Perplexity: {e}")
-                return {}
+        result = response.json()
+        content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+        logger.info(f"Generated profile extraction response ({len(content)} chars)")
+        try:
+            profile_data = json.loads(content)
+            return profile_data
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing JSON from Perplexity: {e}")
+            return {}
     except Exception as e:
         logger.error(f"Error querying Perplexity API line 84 perplexity_client.py: {str(e)}")
         return {}
\ No newline at end of file
@@ -0,0 +1,121 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough OpenAI tokenizer ratio for English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+TRUNCATED = "…"
+# Values the model has to echo back or act on verbatim; a cut id would be recorded as a recommendation
+UNTRUNCATED_KEYS = frozenset({'id', 'item_id', 'user_id', 'link', 'url', 'deadline', 'recommended_at'})
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def _shorten_strings(value: Any, max_chars: int) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars] + TRUNCATED
+    if isinstance(value, dict):
+        return {k: v if k in UNTRUNCATED_KEYS else _shorten_strings(v, max_chars) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_shorten_strings(v, max_chars) for v in value]
+    return value
+
+
+def fit_section(value: Any, budget: int) -> str:
+    """
+    Serialize `value` compactly within `budget` tokens.
+
+    Lists lose items from the end first (they are ranked), then long strings
+    are cut down until the section fits. Ids, links and dates
+    (UNTRUNCATED_KEYS) are never cut.
+    """
+    text = compact_json(value)
+    if estimate_tokens(text) <= budget:
+        return text
+    if isinstance(value, list):
+        while len(value) > 1 and estimate_tokens(text) > budget:
+            value = value[:-1]
+            text = compact_json(value)
+    max_chars = 512
+    while estimate_tokens(text) > budget and max_chars >= 32:
+        text = compact_json(_shorten_strings(value, max_chars))
+        max_chars //= 2
+    return text
+
+
+def fit_history(history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+    """Keep the newest chat turns that fit in `budget` tokens."""
+    kept = []
+    used = 0
+    for turn in reversed(history):
+        cost = estimate_tokens(turn.get('content') or '') + 4  # per-message overhead
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def to_chat_history(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    return [
+        {"role": "assistant" if msg['sender'] == 'system' else "user", "content": msg['content']}
+        for msg in messages
+    ]
+
+
+def format_recommendations(recs: List[Dict[str, Any]], limit: int = 5) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": rec['id'],
+            "title": rec.get('title'),
+            "description": rec.get('description'),
+            "details": rec.get('details', {}),
+            "score": rec.get('distance', 0),
+            "tags": rec.get('tags', [])
+        }
+        for rec in recs[:limit]
+    ]
+
+
+def build_messages(
+    static_prompt: str,
+    history: List[Dict[str, str]],
+    user_message: str,
+    profile: Optional[Dict[str, Any]] = None,
+    context: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Assemble chat messages so the longest possible prefix is reused between calls.
+
+    Order is: the static system prompt (byte-identical for every user), the
+    user's profile (changes rarely), the chat history (append-only), and only
+    then the per-turn context such as recommendations, followed by the new
+    message. History is sent once, as chat turns, and never inside the
+    context JSON.
+    """
+    messages = [{"role": "system", "content": static_prompt}]
+    if profile:
+        profile_json = fit_section(profile, settings.PROMPT_BUDGET_PROFILE)
+        messages.append({"role": "system", "content": f"User profile:{profile_json}"})
+    messages.extend(fit_history(history, settings.PROMPT_BUDGET_HISTORY))
+    if context:
+        sections = [
+            f"{name}:{fit_section(value, settings.PROMPT_BUDGET_CONTEXT)}"
+            for name, value in context.items()
+            if value
+        ]
+        if sections:
+            messages.append({"role": "system", "content": "Context for this turn:\n" + "\n".join(sections)})
+    messages.append({"role": "user", "content": user_message})
+    return messages
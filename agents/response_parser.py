@@ -0,0 +1,55 @@
+import json
+import logging
+import re
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JSON_OBJECT = re.compile(r'\{[\s\S]*\}$')
+
+PROFILE_EMBEDDING_FIELDS = ['bio', 'username', 'location']
+
+
+def parse_gpt_response(gpt_response: str) -> Optional[Dict[str, Any]]:
+    """
+    Classify a reply from the conversation model.
+
+    Returns None for plain text, otherwise a dict whose 'intent' is one of:
+      'recommend' - {'id', 'message'}: the model picked one of the current recommendations
+      'rag'       - {'query', 'tags'}: search again with a rewritten query (tags may be None)
+      'update'    - {'message', 'updates'}: profile fields to merge
+    """
+    if not JSON_OBJECT.match(gpt_response):
+        return None
+    try:
+        gpt_json = json.loads(gpt_response)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse GPT JSON: {e}")
+        return None
+    if not isinstance(gpt_json, dict):
+        return None
+
+    if 'id' in gpt_json and 'message' in gpt_json:
+        return {"intent": "recommend", "id": gpt_json['id'], "message": gpt_json['message']}
+
+    # RAG replies are positional: [query, tags, "RAG"] or [query, "RAG"]
+    values = list(gpt_json.values())
+    if len(values) >= 3 and isinstance(values[2], str) and values[2].upper() == 'RAG' and isinstance(values[1], list):
+        return {"intent": "rag", "query": values[0], "tags": values[1]}
+    if len(values) >= 2 and isinstance(values[1], str) and values[1].upper() == 'RAG':
+        return {"intent": "rag", "query": values[0], "tags": None}
+
+    reply_type = gpt_json.get('type')
+    if isinstance(reply_type, str) and reply_type.upper() == 'UPDATE':
+        return {
+            "intent": "update",
+            "message": gpt_json.get('message'),
+            "updates": {k: v for k, v in gpt_json.items() if k not in ['message', 'type']}
+        }
+    return None
+
+
+def profile_embedding_input(updates: Dict[str, Any]) -> Optional[str]:
+    """Text to re-embed when an update touches the fields the profile embedding is built from."""
+    fields = [updates[field] for field in PROFILE_EMBEDDING_FIELDS if updates.get(field)]
+    return ' '.join(fields) if fields else None
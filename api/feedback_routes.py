@@ -0,0 +1,25 @@
+from flask import Blueprint, request, jsonify
+from pydantic import ValidationError
+import logging
+from config import settings
+from database.models import UserFeedback
+from feedback.rocchio_state import enqueue_feedback
+
+logger = logging.getLogger(__name__)
+
+feedback_bp = Blueprint('feedback', __name__)
+
+@feedback_bp.route("/feedback", methods=['POST'])
+def receive_feedback():
+    try:
+        feedback = UserFeedback(**(request.get_json() or {}))
+    except ValidationError as e:
+        return jsonify({'error': e.errors()}), 400
+    try:
+        # Applied by `python api/message_processor.py feedback`, in order per user
+        enqueue_feedback(settings.redis_client, feedback)
+        logger.info(f"Queued {feedback.feedback_type} feedback from {feedback.user_id} on {feedback.item_id}")
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Error queueing feedback: {str(e)}")
+        return jsonify({'error': str(e)}), 500
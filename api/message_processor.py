@@ -1,135 +1,195 @@
 import asyncio
 import logging
-from twilio.rest import Client
+from collections import deque
+from clients import close_async_clients
 from config import settings
-from twilio_routes import process_message, handle_onboarding
-from database.models import UserConversation, ConversationArchive
-from database.supabase import get_supabase_client
-from datetime import datetime, timezone
+from metrics import start_metrics_server, timed
+from twilio_routes import process_message, handle_onboarding, debouncer
+from api.sms_dispatcher import OUTBOUND_QUEUE_NAME, dispatch_sms, enqueue_sms
+from feedback.rocchio_state import FEEDBACK_QUEUE_NAME, handle_feedback_message
 import json
+import signal
 import sys
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-twilio_number = settings.TWILIO_PHONE_NUMBER
-
 redis_client = settings.redis_client
 
-def process_queued_messages(queue_name='twilio_messages'):
-    while True:
+def _join_message(msg):
+    return '\n'.join(msg) if isinstance(msg, list) else msg
+
+def _async_redis():
+    from redis.asyncio import Redis as AsyncRedis
+    return AsyncRedis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        ssl=settings.REDIS_SSL,
+        decode_responses=True
+    )
+
+@timed('twilio.enqueue_sms')
+async def send_sms(to, body):
+    # Handed to the outbound dispatcher; the conversation slot is freed without waiting on Twilio
+    await asyncio.to_thread(enqueue_sms, redis_client, to, body)
+
+@timed('worker.handle_queued_message')
+async def handle_queued_message(data):
+    if data.get('is_outbound'):
+        # Payloads queued here before the dispatcher existed
+        await send_sms(data['phone_number'], data['message'])
+        return
+    # Handle batched messages
+    msg_to_process = _join_message(data['message'])
+    # converse_with_user appends the whole turn to the message log itself
+    response = await process_message(data['phone_number'], msg_to_process)
+    # Send the response back to the user
+    await send_sms(data['phone_number'], response)
+    logger.info(f"Queued response to {data['phone_number']}")
+
+@timed('worker.handle_onboarding_message')
+async def handle_onboarding_message(data):
+    msg_to_process = _join_message(data['message'])
+    response = await handle_onboarding(data['phone_number'], msg_to_process)
+    await send_sms(data['phone_number'], response)
+    logger.info(f"Queued onboarding response to {data['phone_number']}")
+
+class QueueWorker:
+    """
+    Pops messages off a Redis list with BRPOP and runs up to `concurrency`
+    handlers at once on a single event loop. Messages for the same phone number
+    are handled in the order they were queued by a single task per number, which
+    holds one slot; later messages for that number wait in its deque without one.
+    """
+
+    def __init__(self, queue_name, handler, concurrency=None, pop_timeout=1):
+        self.queue_name = queue_name
+        self.handler = handler
+        self.concurrency = concurrency or settings.WORKER_CONCURRENCY
+        self.pop_timeout = pop_timeout
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._pending = {}  # phone number -> deque of messages its running task has yet to handle
+        self._tasks = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    async def _drain(self, phone_number):
+        pending = self._pending[phone_number]
         try:
-            # Get the oldest message from the queue
-            message_data = redis_client.rpop(queue_name)
-            if message_data:
-                data = json.loads(message_data)
-                
-                if data.get('is_outbound'):
-                    client.messages.create(
-                        body=data['message'],
-                        from_=twilio_number,
-                        to=data['phone_number']
-                    )
-                    logger.info(f"Sent message to {data['phone_number']}")
-                else:
-                    # Handle batched messages
-                    msg = data['message']
-                    if isinstance(msg, list):
-                        msg_to_process = '\n'.join(msg)
-                    else:
-                        msg_to_process = msg
-                    loop = asyncio.new_event_loop()
-                    response = loop.run_until_complete(process_message(data['phone_number'], msg_to_process))
-                    loop.close()
-                    store_message(data['phone_number'], 'user', msg_to_process)
-                    # Send the response back to the user
-                    client.messages.create(
-                        body=response,
-                        from_=twilio_number,
-                        to=data['phone_number']
-                    )
-                    logger.info(f"Sent response to {data['phone_number']}")
-        except Exception as e:
-            logger.error(f"Error processing queued message: {str(e)}")
-            continue
+            while pending:
+                try:
+                    await self.handler(pending.popleft())
+                except Exception as e:
+                    logger.error(f"Error processing queued message from {self.queue_name}: {str(e)}")
+        finally:
+            # No await between the empty check and here, so _dispatch cannot append to a finished deque
+            del self._pending[phone_number]
+            self._slots.release()
 
-def process_onboarding_queue(queue_name='onboarding_queue'):
-    while True:
+    def _dispatch(self, data):
+        phone_number = data.get('phone_number')
+        pending = self._pending.get(phone_number)
+        if pending is not None:
+            # That number's task already holds a slot and handles this next
+            pending.append(data)
+            self._slots.release()
+            return
+        self._pending[phone_number] = deque([data])
+        task = asyncio.create_task(self._drain(phone_number))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self):
+        redis = _async_redis()
+        logger.info(f"Worker listening on {self.queue_name} with concurrency {self.concurrency}")
+        try:
+            while not self._stopping.is_set():
+                # Wait for a free slot before popping so unclaimed messages stay in Redis
+                await self._slots.acquire()
+                try:
+                    item = await redis.brpop(self.queue_name, timeout=self.pop_timeout)
+                except Exception as e:
+                    self._slots.release()
+                    logger.error(f"Error reading from {self.queue_name}: {str(e)}")
+                    await asyncio.sleep(1)
+                    continue
+                if item is None:
+                    self._slots.release()
+                    continue
+                try:
+                    data = json.loads(item[1])
+                except json.JSONDecodeError as e:
+                    self._slots.release()
+                    logger.error(f"Dropping malformed message on {self.queue_name}: {e}")
+                    continue
+                self._dispatch(data)
+        finally:
+            in_flight = list(self._tasks)
+            if in_flight:
+                logger.info(f"Waiting for {len(in_flight)} in-flight conversations to finish")
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            await redis.close()
+            await close_async_clients()
+
+async def flush_debounced_batches(worker, interval=None):
+    # Safe to run in several workers at once: each flush is one atomic Redis script
+    interval = interval or settings.DEBOUNCE_FLUSH_INTERVAL
+    while not worker.stopping:
         try:
-            message_data = redis_client.rpop(queue_name)
-            if message_data:
-                data = json.loads(message_data)
-                msg = data['message']
-                if isinstance(msg, list):
-                    msg_to_process = '\n'.join(msg)
-                else:
-                    msg_to_process = msg
-                loop = asyncio.new_event_loop()
-                response = loop.run_until_complete(handle_onboarding(data['phone_number'], msg_to_process))
-                loop.close()
-                client.messages.create(
-                    body=response,
-                    from_=twilio_number,
-                    to=data['phone_number']
-                )
-                logger.info(f"Sent onboarding response to {data['phone_number']}")
+            await asyncio.to_thread(debouncer.flush_due)
         except Exception as e:
-            logger.error(f"Error processing onboarding queued message: {str(e)}")
-            continue
+            logger.error(f"Error flushing batched messages: {str(e)}")
+        await asyncio.sleep(interval)
+
+async def run_worker(queue_name, handler, concurrency=None, flush_batches=False):
+    worker = QueueWorker(queue_name, handler, concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Not on the main thread (e.g. started from app.py); rely on the daemon thread exiting
+            pass
+    flusher = asyncio.create_task(flush_debounced_batches(worker)) if flush_batches else None
+    await worker.run()
+    if flusher:
+        await flusher
+
+def process_queued_messages(queue_name='twilio_messages'):
+    asyncio.run(run_worker(queue_name, handle_queued_message, flush_batches=True))
+
+def process_onboarding_queue(queue_name='onboarding_queue'):
+    asyncio.run(run_worker(queue_name, handle_onboarding_message))
+
+def process_outbound_queue(queue_name=OUTBOUND_QUEUE_NAME):
+    asyncio.run(run_worker(queue_name, dispatch_sms, settings.SMS_DISPATCH_CONCURRENCY))
+
+def process_feedback_queue(queue_name=FEEDBACK_QUEUE_NAME):
+    asyncio.run(run_worker(queue_name, handle_feedback_message))
+
+def warm_vector_index():
+    if settings.MATCHER_BACKEND == "faiss":
+        from matcher.vector_index import get_opportunity_index, start_index_refresher
+        get_opportunity_index()
+        start_index_refresher()
 
 if __name__ == "__main__":
+    warm_vector_index()
+    start_metrics_server()
     # Choose which queue to process based on command-line argument
     if len(sys.argv) > 1 and sys.argv[1] == 'onboarding':
         process_onboarding_queue()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'outbound':
+        process_outbound_queue()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'feedback':
+        process_feedback_queue()
     else:
-        process_queued_messages() 
-
-
-MAX_HISTORY = settings.MAX_HISTORY
-
-def store_message(user_id, sender, content):
-    supabase = get_supabase_client()
-    now = datetime.now(timezone.utc)
-    response = supabase.table('user_conversations').select('*').eq('user_id', user_id).order('started_at', desc=True).limit(1).execute()
-    def store_one(msg):
-        if response.data:
-            convo = UserConversation(**response.data[0])
-            convo.messages.append({
-                "sender": sender,
-                "content": msg,
-                "timestamp": now.isoformat() + "Z"
-            })
-            convo.ended_at = now
-            # If messages exceed MAX_HISTORY, archive the oldest
-            if len(convo.messages) > MAX_HISTORY:
-                to_archive = convo.messages[:-MAX_HISTORY]
-                convo.messages = convo.messages[-MAX_HISTORY:]
-                archive = ConversationArchive(
-                    user_id=convo.user_id,
-                    item_id=convo.item_id,
-                    started_at=convo.started_at,
-                    ended_at=now,
-                    messages=to_archive
-                )
-                supabase.table('conversation_archives').insert(archive.dict()).execute()
-            supabase.table('user_conversations').update(convo.dict()).eq('id', str(convo.id)).execute()
-        else:
-            messages = [{
-                "sender": sender,
-                "content": msg,
-                "timestamp": now.isoformat() + "Z"
-            }]
-            new_convo = UserConversation(
-                user_id=user_id,
-                messages=messages,
-                started_at=now,
-                ended_at=now
-            )
-            supabase.table('user_conversations').insert(new_convo.dict()).execute()
-    if isinstance(content, list):
-        for msg in content:
-            store_one(msg)
-    else:
-        store_one(content)
\ No newline at end of file
+        process_queued_messages()
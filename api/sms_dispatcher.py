@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import zlib
+from typing import List, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+from clients import get_async_twilio_client
+from config import settings
+from metrics import SMS_QUEUED_SECONDS, SMS_SENT, SMS_THROTTLE_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+# Every outbound text goes through this queue; `python api/message_processor.py outbound`
+# drains it, so a slow Twilio call never holds up a conversation worker.
+OUTBOUND_QUEUE_NAME = 'outbound_sms'
+
+
+def outbound_payload(to: str, body: str) -> str:
+    # phone_number is what QueueWorker chains on, so texts to one user stay in order
+    return json.dumps({'phone_number': to, 'message': body, 'queued_at': time.time()})
+
+
+def enqueue_sms(redis, to: str, body: str) -> None:
+    redis.lpush(OUTBOUND_QUEUE_NAME, outbound_payload(to, body))
+
+
+class TokenBucket:
+    """Allows `rate` sends per second with bursts of up to `burst`; callers that find it empty sleep for their turn."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Take the token now, even if that goes negative, so waiters are served in arrival order
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class Sender:
+    """A Twilio phone number, or a messaging service SID (MG...), with its own send budget."""
+
+    def __init__(self, address: str, rate: float, burst: float):
+        self.address = address
+        self.is_service = address.startswith('MG')
+        self.bucket = TokenBucket(rate, burst)
+
+    async def send(self, to: str, body: str):
+        client = get_async_twilio_client()
+        if self.is_service:
+            return await client.messages.create_async(body=body, messaging_service_sid=self.address, to=to)
+        return await client.messages.create_async(body=body, from_=self.address, to=to)
+
+
+def configured_senders() -> List[Sender]:
+    addresses = [a.strip() for a in settings.TWILIO_SENDERS.split(',') if a.strip()] or [settings.TWILIO_PHONE_NUMBER]
+    return [
+        Sender(a, settings.SMS_SERVICE_RATE if a.startswith('MG') else settings.SMS_SENDER_RATE, settings.SMS_SENDER_BURST)
+        for a in addresses
+    ]
+
+
+_senders: Optional[List[Sender]] = None
+
+
+def sender_for(to: str) -> Sender:
+    # Hashing spreads recipients across senders while each user keeps hearing from the same number
+    global _senders
+    if _senders is None:
+        _senders = configured_senders()
+    return _senders[zlib.crc32(to.encode()) % len(_senders)]
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return True  # timeouts and connection errors
+
+
+def backoff(attempt: int) -> float:
+    return min(settings.SMS_RETRY_BASE_SECONDS * 2 ** (attempt - 1), 30.0) * random.uniform(0.5, 1.0)
+
+
+@timed('dispatcher.send_sms')
+async def dispatch_sms(data) -> bool:
+    to, body = data['phone_number'], data['message']
+    sender = sender_for(to)
+    for attempt in range(1, settings.SMS_MAX_ATTEMPTS + 1):
+        SMS_THROTTLE_SECONDS.labels(sender.address).inc(await sender.bucket.acquire())
+        try:
+            await sender.send(to, body)
+        except Exception as e:
+            if not _retryable(e) or attempt == settings.SMS_MAX_ATTEMPTS:
+                SMS_SENT.labels(sender.address, 'failed').inc()
+                logger.error(f"Giving up on SMS to {to} from {sender.address} after {attempt} attempts: {e}")
+                return False
+            SMS_SENT.labels(sender.address, 'retried').inc()
+            delay = backoff(attempt)
+            logger.warning(f"SMS to {to} failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        SMS_SENT.labels(sender.address, 'sent').inc()
+        if data.get('queued_at'):
+            SMS_QUEUED_SECONDS.observe(time.time() - data['queued_at'])
+        logger.info(f"Sent SMS to {to} from {sender.address}")
+        return True
+    return False
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from twilio.rest import Client
+from clients import get_twilio_client
 from twilio.twiml.messaging_response import MessagingResponse
 import logging
 import asyncio
@@ -10,8 +10,8 @@ from database.supabase import get_supabase_client
 from profiles.profiles import get_profile_by_phone, get_user_profile, get_user_state, create_user_state, update_user_state, delete_user_state
 from onboarding.onboarding_messages import process_onboarding_message
 from agents.conversation_agent import converse_with_user
-import threading
-import time
+from metrics import timed
+from api.sms_dispatcher import enqueue_sms
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,7 +19,7 @@ logger = logging.getLogger(__name__)
 twilio_bp = Blueprint('twilio', __name__)
 
 # Initialize Twilio client
-client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+client = get_twilio_client()
 twilio_number = settings.TWILIO_PHONE_NUMBER
 
 # Initialize Redis connection
@@ -40,22 +40,76 @@ ONBOARDING_QUEUE_NAME = 'onboarding_queue'
 
 # Session window (in seconds)
 SESSION_WINDOW = 3
-# In-memory store for batching messages per user
-user_message_batches = {}
-user_timers = {}
-
-# Helper to queue batched messages
-def queue_batched_message(phone_number):
-    batch = user_message_batches.pop(phone_number, [])
-    if batch:
-        message_data = {
-            'phone_number': phone_number,
-            'message': batch,  # List of strings
-            'timestamp': str(time.time())
-        }
-        redis_client.lpush(MESSAGING_QUEUE_NAME, json.dumps(message_data))
-        logger.info(f"Queued batched message for {phone_number}: {message_data['message']}")
-    user_timers.pop(phone_number, None)
+# Redis keys for batching messages per user across all web workers
+DEBOUNCE_DEADLINES_KEY = 'sms_debounce'  # sorted set: phone number -> flush deadline
+DEBOUNCE_BATCH_PREFIX = 'sms_batch:'  # list per phone number of messages waiting to be flushed
+DEBOUNCE_BATCH_TTL = 24 * 3600  # safety net if a batch is never flushed
+
+# Append a message and push the user's deadline out to now + window, using the
+# Redis clock so web workers on different hosts agree on time.
+DEBOUNCE_ADD_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[1]), ARGV[3])
+return 1
+"""
+
+# Move every batch whose deadline has passed onto the queue as one message.
+# Runs atomically, so concurrent flushers can never emit the same batch twice.
+DEBOUNCE_FLUSH_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[1]))
+for _, phone in ipairs(due) do
+    redis.call('ZREM', KEYS[1], phone)
+    local batch_key = ARGV[2] .. phone
+    local messages = redis.call('LRANGE', batch_key, 0, -1)
+    redis.call('DEL', batch_key)
+    if #messages > 0 then
+        redis.call('LPUSH', KEYS[2], cjson.encode({phone_number = phone, message = messages, timestamp = tostring(now)}))
+    end
+end
+return #due
+"""
+
+class MessageDebouncer:
+    """
+    Coalesces each user's burst of inbound texts into one queued message.
+
+    The webhook appends to a per-user list and resets the user's deadline in a
+    sorted set; a flusher (see api/message_processor.py) periodically moves
+    expired batches onto MESSAGING_QUEUE_NAME with a single atomic script.
+    """
+
+    def __init__(self, redis, window=None, max_flush=500):
+        self.redis = redis
+        self.window = window
+        self.max_flush = max_flush
+        self._add = redis.register_script(DEBOUNCE_ADD_SCRIPT)
+        self._flush = redis.register_script(DEBOUNCE_FLUSH_SCRIPT)
+
+    def add(self, phone_number, message):
+        window = self.window if self.window is not None else SESSION_WINDOW
+        self._add(
+            keys=[DEBOUNCE_DEADLINES_KEY, DEBOUNCE_BATCH_PREFIX + phone_number],
+            args=[window, message, phone_number, DEBOUNCE_BATCH_TTL]
+        )
+
+    def flush_due(self):
+        flushed = self._flush(
+            keys=[DEBOUNCE_DEADLINES_KEY, MESSAGING_QUEUE_NAME],
+            args=[self.max_flush, DEBOUNCE_BATCH_PREFIX]
+        )
+        if flushed:
+            logger.info(f"Queued {flushed} batched messages")
+        return flushed
+
+    def pending(self):
+        return self.redis.zcard(DEBOUNCE_DEADLINES_KEY)
+
+debouncer = MessageDebouncer(redis_client)
 
 @twilio_bp.route("/webhook/sms", methods=['POST'])
 def receive_sms():
@@ -65,18 +119,8 @@ def receive_sms():
         logger.info(f"Received message from {sender}: {incoming_msg}")
         resp = MessagingResponse()
 
-        # Batch messages per user
-        if sender not in user_message_batches:
-            user_message_batches[sender] = []
-        user_message_batches[sender].append(incoming_msg)
-
-        # If a timer is already running, cancel it
-        if sender in user_timers:
-            user_timers[sender].cancel()
-        # Start a new timer for this user
-        timer = threading.Timer(SESSION_WINDOW, queue_batched_message, args=[sender])
-        user_timers[sender] = timer
-        timer.start()
+        # Batch messages per user; the flusher queues them once the window passes
+        debouncer.add(sender, incoming_msg)
 
         return str(resp)
     except Exception as e:
@@ -85,6 +129,7 @@ def receive_sms():
         resp.message("Sorry, we encountered an error processing your message.")
         return str(resp), 500
 
+@timed('twilio.process_message')
 async def process_message(phone_number: str, message) -> str:
     try:
         # If message is a list, join with '\n'
@@ -105,7 +150,9 @@ async def process_message(phone_number: str, message) -> str:
             return "Welcome! To get started, I'd like to know your name. What should I call you?"
         logger.info(f"Found profile for {phone_number}, processing with conversation agent")
         # Use converse_with_user to handle the message
-        response = await converse_with_user(phone_number, message_to_process)
+        # Hand the profile over so the context loader doesn't fetch it again
+        profile_row = user_profile.model_dump(mode='json', exclude={'embedding'}, exclude_none=True)
+        response = await converse_with_user(phone_number, message_to_process, user_profile=profile_row)
         if not response:
             logger.error(f"No response from conversation agent for {phone_number}")
             return "Hey! I'm having trouble processing that right now. Can you try again?"
@@ -114,6 +161,7 @@ async def process_message(phone_number: str, message) -> str:
         logger.error(f"Error in process_message: {str(e)}")
         return "Sorry, I encountered an error. Please try again later."
 
+@timed('twilio.handle_onboarding')
 async def handle_onboarding(phone_number: str, message) -> str:
     try:
         # If message is a list, join with '\n'
@@ -166,16 +214,10 @@ def send_sms():
         to_number = data['to']
         message_body = data['message']
         
-        # Queue the message in Redis
-        message_data = {
-            'phone_number': to_number,
-            'message': message_body,
-            'timestamp': str(asyncio.get_event_loop().time()),
-            'is_outbound': True  
-        }
-        redis_client.lpush('twilio_messages', json.dumps(message_data))
+        # Straight onto the outbound dispatcher's queue
+        enqueue_sms(redis_client, to_number, message_body)
         
-        logger.info(f"Queued message to {to_number}, twilio_routes.py line 134")
+        logger.info(f"Queued message to {to_number}")
         
         return jsonify({
             'success': True,
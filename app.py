@@ -1,6 +1,8 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 from api.twilio_routes import twilio_bp
-from api.message_processor import process_queued_messages
+from api.feedback_routes import feedback_bp
+from api.message_processor import process_outbound_queue, process_queued_messages, warm_vector_index
+from metrics import render as render_metrics
 import threading
 import os
 import logging
@@ -8,6 +10,7 @@ import traceback
 
 app = Flask(__name__)
 app.register_blueprint(twilio_bp, url_prefix='/twilio')
+app.register_blueprint(feedback_bp)
 
 @app.errorhandler(Exception)
 def handle_exception(e):
@@ -18,10 +21,18 @@ def handle_exception(e):
     }
     return jsonify(response), 500
 
+@app.route('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 def start_message_processor():
     """Start the message processor in a separate thread"""
+    warm_vector_index()
     processor_thread = threading.Thread(target=process_queued_messages, daemon=True)
     processor_thread.start()
+    dispatcher_thread = threading.Thread(target=process_outbound_queue, daemon=True)
+    dispatcher_thread.start()
 
 if __name__ == '__main__':
     start_message_processor()
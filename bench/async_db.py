@@ -0,0 +1,111 @@
+"""
+Concurrent turns against a Supabase with fixed latency, blocking vs async client.
+
+Each simulated turn runs the profile/state queries a message makes through
+profiles.profiles (get_user_profile, get_user_state, update_user_state), then
+the conversation path: load_conversation_context (profile, conversation and
+messages, last recommendation and its opportunity, recent recommendations)
+and append_messages. With --mode blocking the queries sleep the thread like a
+sync client on the loop, so turns on one event loop serialize; with --mode
+async they overlap.
+
+    python -m bench.async_db --turns 64 --supabase-ms 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+for _key, _value in {
+    "OPENAI_API_KEY": "bench",
+    "EMBEDDING_MODEL": "text-embedding-ada-002",
+    "CLASSIFIER_MODEL": "bench",
+    "GENERATOR_MODEL": "bench",
+    "VECTOR_DIM": "1536",
+    "VECTOR_INDEX_PATH": "/tmp/bench.faiss",
+    "DATABASE_URL": "postgresql://bench",
+    "REDIS_PORT": "6379",
+}.items():
+    os.environ.setdefault(_key, _value)
+os.environ["REDIS_HOST"] = ""  # keep the catalog and embedding caches off the network
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import clients  # noqa: E402
+from loadtest.fakes import AsyncSupabaseView, FakeSupabase, Latency  # noqa: E402
+from profiles import profiles  # noqa: E402
+from agents.context_loader import load_conversation_context  # noqa: E402
+from database.message_log import append_messages  # noqa: E402
+from database.opportunity_catalog import opportunity_catalog  # noqa: E402
+
+# Sequential round trips per turn when turns overlap perfectly: 3 profile/state
+# queries, 2 for the context (conversation then its messages, or the last
+# recommendation then its opportunity) and 1 append
+QUERIES_PER_TURN = 6
+
+
+def seed(db, users):
+    db.primary_keys['user_states'] = 'phone_number'
+    opportunity = {'id': "opp-0", 'title': "Founder Night", 'description': "Pitch practice.", 'details': {}, 'tags': [], 'updated_at': "2026-01-01T00:00:00+00:00"}
+    db.tables['opportunities'] = [opportunity]
+    for i in range(users):
+        phone = f"+1555{i:07d}"
+        conversation_id = f"00000000-0000-0000-0000-{i:012d}"
+        db.tables.setdefault('profiles', []).append({'user_id': phone, 'username': f"user{i}", 'location': "Toronto", 'bio': "Building a dev tools startup."})
+        db.tables.setdefault('user_states', []).append({'phone_number': phone, 'step': 1, 'profile': {}, 'accumulated_messages': []})
+        db.tables.setdefault('user_conversations', []).append({'id': conversation_id, 'user_id': phone, 'started_at': "2026-01-01T00:00:00+00:00", 'ended_at': None})
+        db.tables.setdefault('conversation_messages', []).append({'id': i + 1, 'user_id': phone, 'conversation_id': conversation_id, 'sender': 'user', 'content': "hey", 'created_at': "2026-01-01T00:00:00+00:00"})
+        db.tables.setdefault('user_recommendations', []).append({'user_id': phone, 'item_id': "opp-0", 'status': 'sent', 'created_at': "2026-01-01T00:00:00+00:00"})
+        db.tables.setdefault('recent_recommendations', []).append({'user_id': phone, 'recommendations': [opportunity]})
+
+
+async def turn(phone):
+    await profiles.get_user_profile(phone)
+    await profiles.get_user_state(phone)
+    await profiles.update_user_state(phone, {'step': 2})
+    context = await load_conversation_context(phone, use_cache=False)
+    await append_messages(phone, context.conversation['id'], [{'sender': 'user', 'content': "hi"}, {'sender': 'system', 'content': "hey!"}])
+
+
+async def run_turns(turns):
+    start = time.perf_counter()
+    await asyncio.gather(*(turn(f"+1555{i:07d}") for i in range(turns)))
+    return time.perf_counter() - start
+
+
+def bench(mode, turns, supabase_ms):
+    db = FakeSupabase(Latency(supabase_ms))
+    seed(db, turns)
+    clients.get_supabase_client = lambda: db
+    clients.get_async_supabase_client = lambda: AsyncSupabaseView(db, blocking=(mode == 'blocking'))
+    opportunity_catalog._local.clear()
+    seconds = asyncio.run(run_turns(turns))
+    return {
+        "mode": mode,
+        "turns": turns,
+        "supabase_ms": supabase_ms,
+        "wall_s": round(seconds, 3),
+        "turns_per_s": round(turns / seconds, 1),
+        "ideal_s": round(QUERIES_PER_TURN * supabase_ms / 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare blocking and async Supabase access under concurrent turns")
+    parser.add_argument('--turns', type=int, default=64, help="Turns in flight at once on one event loop")
+    parser.add_argument('--supabase-ms', type=float, default=40.0, help="Latency of each query")
+    parser.add_argument('--mode', choices=['blocking', 'async', 'both'], default='both')
+    parser.add_argument('--output', help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    modes = ['blocking', 'async'] if args.mode == 'both' else [args.mode]
+    results = [bench(mode, args.turns, args.supabase_ms) for mode in modes]
+    for row in results:
+        print(f"{row['mode']:<9} {row['turns']} turns: {row['wall_s']:.2f}s wall, {row['turns_per_s']:.1f} turns/s (ideal {row['ideal_s']:.2f}s)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,139 @@
+"""
+Compare the PostgREST RPC and asyncpg/pgvector matcher backends.
+
+Live mode needs SUPABASE_URL/SUPABASE_SERVICE_ROLE_KEY and a DATABASE_URL that
+reaches the same database, and times end-to-end match_opportunities calls:
+
+    python -m bench.matcher_backends --queries 200 --top-k 1,5,10
+
+--offline needs no database and times only the client-side work each backend
+does per call: encoding the 1536-dim query (JSON body vs binary pgvector) and
+decoding top_k result rows (JSON vs already-typed records).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import timeit
+
+for _key, _value in {
+    "OPENAI_API_KEY": "bench",
+    "EMBEDDING_MODEL": "text-embedding-ada-002",
+    "CLASSIFIER_MODEL": "bench",
+    "GENERATOR_MODEL": "bench",
+    "VECTOR_DIM": "1536",
+    "VECTOR_INDEX_PATH": "/tmp/bench.faiss",
+    "DATABASE_URL": "postgresql://bench",
+    "REDIS_PORT": "6379",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from pgvector import Vector  # noqa: E402
+
+from config import settings  # noqa: E402
+
+
+def _queries(n, seed=7):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, settings.VECTOR_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _row(i):
+    return {
+        "id": f"opp-{i}",
+        "title": "Founder Night",
+        "description": "Pitch practice and demos with local founders. " * 4,
+        "details": {"deadline": "2026-12-01", "location": "Toronto", "link": "https://example.com"},
+        "tags": ["Networking Events"],
+        "deadline": "2026-12-01T00:00:00+00:00",
+        "updated_at": "2026-01-01T00:00:00+00:00",
+        "distance": 0.2,
+    }
+
+
+def offline(top_ks, number=2000):
+    query = _queries(1)[0]
+    as_list = query.tolist()
+    results = []
+    encode_json = min(timeit.repeat(lambda: json.dumps({"p_user_id": "+15550000000", "p_embedding": as_list, "p_top_k": 5}), number=number, repeat=5)) / number
+    encode_binary = min(timeit.repeat(lambda: Vector(query).to_binary(), number=number, repeat=5)) / number
+    for top_k in top_ks:
+        body = json.dumps([_row(i) for i in range(top_k)])
+        decode_json = min(timeit.repeat(lambda: json.loads(body), number=number, repeat=5)) / number
+        results.append({
+            "top_k": top_k,
+            "rpc_encode_us": encode_json * 1e6,
+            "pg_encode_us": encode_binary * 1e6,
+            "rpc_decode_us": decode_json * 1e6,
+            "rpc_request_bytes": len(json.dumps({"p_embedding": as_list})),
+            "pg_request_bytes": len(Vector(query).to_binary()),
+        })
+    return results
+
+
+def _summary(backend, top_k, timings):
+    timings = sorted(timings)
+    return {
+        "backend": backend,
+        "top_k": top_k,
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+    }
+
+
+async def live(top_ks, queries, user_id, warmup=10):
+    from matcher import pg_matcher
+    from matcher.supabase_matcher import match_opportunities_rpc
+
+    vectors = _queries(queries + warmup)
+    results = []
+    for top_k in top_ks:
+        for backend in ("rpc", "pg"):
+            timings = []
+            for i, vec in enumerate(vectors):
+                start = time.perf_counter()
+                if backend == "rpc":
+                    await asyncio.to_thread(match_opportunities_rpc, user_id, vec.tolist(), top_k)
+                else:
+                    await pg_matcher.match_opportunities(user_id, vec, top_k)
+                if i >= warmup:
+                    timings.append(time.perf_counter() - start)
+            results.append(_summary(backend, top_k, timings))
+    await pg_matcher.close_pool()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rpc and pg matcher backends")
+    parser.add_argument('--top-k', default="1,5,10", help="Comma-separated top_k values")
+    parser.add_argument('--queries', type=int, default=200, help="Timed queries per backend and top_k")
+    parser.add_argument('--user-id', default="+15550000000", help="User whose sent items are excluded")
+    parser.add_argument('--offline', action='store_true', help="Only time client-side encoding and decoding")
+    parser.add_argument('--output', help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+    top_ks = [int(k) for k in args.top_k.split(',')]
+
+    if args.offline:
+        results = offline(top_ks)
+        for row in results:
+            print(
+                f"top_k={row['top_k']:<3} encode rpc {row['rpc_encode_us']:.0f}us ({row['rpc_request_bytes']} B) "
+                f"vs pg {row['pg_encode_us']:.1f}us ({row['pg_request_bytes']} B), rpc decode {row['rpc_decode_us']:.1f}us"
+            )
+    else:
+        results = asyncio.run(live(top_ks, args.queries, args.user_id))
+        for row in results:
+            print(f"{row['backend']:<4} top_k={row['top_k']:<3} p50 {row['p50_ms']:.1f}ms p95 {row['p95_ms']:.1f}ms mean {row['mean_ms']:.1f}ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,267 @@
+"""
+Offline microbenchmarks for the CPU work done on every turn or batch.
+
+No network or credentials are needed; inputs are synthetic but shaped like
+production data (1536-dim embeddings, 50-message histories, 5 recommendations).
+Results are written as JSON so two commits can be compared:
+
+    python -m bench.micro                      # writes bench/results/<commit>.json
+    python -m bench.micro --compare bench/results/abc1234.json bench/results/def5678.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timezone
+
+# Settings are validated at import time; give the required ones offline values
+for _key, _value in {
+    "OPENAI_API_KEY": "bench",
+    "EMBEDDING_MODEL": "text-embedding-ada-002",
+    "CLASSIFIER_MODEL": "bench",
+    "GENERATOR_MODEL": "bench",
+    "VECTOR_DIM": "1536",
+    "VECTOR_INDEX_PATH": "/tmp/bench.faiss",
+    "DATABASE_URL": "postgresql://bench",
+    "REDIS_PORT": "6379",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from agents.prompt_builder import build_messages, compact_json, format_recommendations, to_chat_history
+from agents.response_parser import parse_gpt_response
+from database.models import UserConversation, UserState
+from feedback.enhanced_rocchio import EnhancedRocchioUpdater
+from profiles.profiles import merge_profile_updates
+
+DIM = 1536
+HISTORY_LENGTH = 50
+FEEDBACK_SIZES = (1, 10, 100, 1000)
+
+rng = random.Random(7)
+
+
+def _vector():
+    vec = np.random.default_rng(rng.randrange(2 ** 32)).standard_normal(DIM)
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+def _sentence(words=18):
+    vocab = ["startup", "grant", "founder", "ai", "climate", "hackathon", "fellowship", "research",
+             "design", "python", "investor", "mentor", "berkeley", "deadline", "remote", "build"]
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def _messages(n=HISTORY_LENGTH):
+    return [
+        {
+            "sender": "user" if i % 2 == 0 else "system",
+            "content": _sentence(rng.randint(8, 40)),
+            "timestamp": datetime(2025, 1, 1, tzinfo=timezone.utc).isoformat()
+        }
+        for i in range(n)
+    ]
+
+
+def _opportunity(i):
+    return {
+        "id": f"opp-{i}",
+        "title": _sentence(6),
+        "description": _sentence(60),
+        "details": {"deadline": "2025-06-01", "location": "Remote", "url": f"https://example.com/{i}"},
+        "distance": rng.random(),
+        "tags": ["ai", "startups", "funding"]
+    }
+
+
+def _profile():
+    return {
+        "user_id": "+15550000000",
+        "username": "bench",
+        "location": "San Francisco",
+        "occupation": "student",
+        "bio": _sentence(80),
+        "interests": ["ai", "climate", "design"],
+        "skills": ["python", "ml"],
+        "current_projects": ["carbon tracker"],
+        "goals": ["raise a pre-seed round"]
+    }
+
+
+# Benchmarks: each returns a zero-argument callable to time
+
+def bench_rocchio_update(size):
+    updater = EnhancedRocchioUpdater()
+    original = _vector()
+    feedback = [(_vector(), rng.random(), rng.choice(["like", "skip", "neutral"])) for _ in range(size)]
+    return lambda: updater.update_embedding(original, feedback)
+
+
+def bench_context_assembly():
+    static_prompt = _sentence(1200)
+    history_rows = _messages()
+    recs = [_opportunity(i) for i in range(10)]
+    profile = _profile()
+    last = {"id": "opp-0", "title": _sentence(6), "description": _sentence(40), "status": "sent"}
+    user_message = _sentence(20)
+
+    def run():
+        history = to_chat_history(history_rows)
+        return build_messages(static_prompt, history, user_message, profile=profile, context={
+            "last_recommendation": last,
+            "current_recommendations": format_recommendations(recs)
+        })
+    return run
+
+
+def bench_context_json():
+    payload = {"profile": _profile(), "recommendations": format_recommendations([_opportunity(i) for i in range(5)])}
+    return lambda: compact_json(payload)
+
+
+def bench_parse_responses():
+    replies = [
+        _sentence(30),
+        json.dumps({"id": "opp-3", "message": _sentence(30)}),
+        json.dumps({"query": _sentence(10), "tags": ["ai", "funding"], "type": "RAG"}),
+        json.dumps({"query": _sentence(10), "type": "RAG"}),
+        json.dumps({"type": "UPDATE", "message": _sentence(20), "bio": _sentence(40), "location": "NYC"}),
+    ]
+    return lambda: [parse_gpt_response(reply) for reply in replies]
+
+
+def bench_user_conversation():
+    row = {
+        "id": "0b7e4c1e-3f1a-4d8e-9d51-8f0f3c1f2a11",
+        "user_id": "+15550000000",
+        "started_at": "2025-01-01T00:00:00+00:00",
+        "messages": _messages()
+    }
+    return lambda: UserConversation(**row)
+
+
+def bench_user_state():
+    row = {
+        "phone_number": "+15550000000",
+        "step": 2,
+        "profile": json.dumps(_profile()),
+        "accumulated_messages": json.dumps([m["content"] for m in _messages()]),
+        "updated_at": "2025-01-01T00:00:00+00:00"
+    }
+    return lambda: UserState.from_supabase_dict(dict(row))
+
+
+def bench_merge_profile_updates():
+    existing = _profile()
+    updates = {
+        "bio": "",
+        "location": None,
+        "occupation": "founder",
+        "interests": ["ai", "robotics", "education", "design"],
+        "skills": ["python", "go", "sql"],
+        "goals": ["hire a first engineer"],
+        "current_projects": []
+    }
+    return lambda: merge_profile_updates(existing, updates)
+
+
+BENCHMARKS = {
+    **{f"rocchio_update_{size}": (lambda size=size: bench_rocchio_update(size)) for size in FEEDBACK_SIZES},
+    "context_assembly": bench_context_assembly,
+    "context_json": bench_context_json,
+    "parse_responses": bench_parse_responses,
+    "user_conversation_validate": bench_user_conversation,
+    "user_state_validate": bench_user_state,
+    "merge_profile_updates": bench_merge_profile_updates,
+}
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """Per-call seconds for each of `repeat` runs, auto-sizing the loop count like `python -m timeit`."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    runs = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return number, runs
+
+
+def run(selected=None, repeat=5):
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if selected and not any(s in name for s in selected):
+            continue
+        number, runs = measure(factory(), repeat=repeat)
+        results[name] = {
+            "loops": number,
+            "min_us": min(runs) * 1e6,
+            "median_us": statistics.median(runs) * 1e6,
+        }
+        print(f"{name:30s} {results[name]['min_us']:12.2f} us  (median {results[name]['median_us']:.2f}, {number} loops)")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(old_path, new_path, threshold=0.10):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'benchmark':30s} {old.get('commit') or 'old':>12s} {new.get('commit') or 'new':>12s}   change")
+    regressions = 0
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if not before:
+            print(f"{name:30s} {'-':>12s} {result['min_us']:12.2f}")
+            continue
+        change = result["min_us"] / before["min_us"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"{name:30s} {before['min_us']:12.2f} {result['min_us']:12.2f}   {change:+.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU microbenchmarks for the conversation and feedback hot paths")
+    parser.add_argument("--output", help="Results JSON path (default bench/results/<commit>.json)")
+    parser.add_argument("--only", action="append", help="Run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files and exit")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown reported as a regression by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": run(args.only, repeat=args.repeat),
+    }
+    output = args.output or os.path.join(ROOT, "bench", "results", f"{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional, Sequence
+
+import joblib
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from agents.callgpt import get_embedding
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Intent labels, matching the categories ALEX_HEFLE_PROMPT asks o4-mini to detect
+CASUAL_CHAT = "CASUAL_CHAT"
+FOLLOW_UP = "FOLLOW_UP"
+NEW_RECOMMENDATION = "NEW_RECOMMENDATION"
+NEW_RECOMMENDATION_TYPE2 = "NEW_RECOMMENDATION_TYPE2"
+UPDATE_PROFILE = "UPDATE_PROFILE"
+ADVICE = "ADVICE"
+DETAILS_REQUEST = "DETAILS_REQUEST"
+
+INTENTS = [
+    CASUAL_CHAT,
+    FOLLOW_UP,
+    NEW_RECOMMENDATION,
+    NEW_RECOMMENDATION_TYPE2,
+    UPDATE_PROFILE,
+    ADVICE,
+    DETAILS_REQUEST,
+]
+
+# Intents whose reply needs no recommendations, profile edits or retrieval, so
+# they can be answered with the short persona prompt and a smaller model
+SIMPLE_INTENTS = {CASUAL_CHAT}
+
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    latency_ms: float
+
+
+class IntentClassifier:
+    """
+    Multinomial logistic regression over L2-normalized message embeddings.
+
+    Prediction is a single (1 x dim) @ (dim x classes) product plus a softmax,
+    well under a millisecond, so it can run before every LLM call.
+    """
+
+    def __init__(self, model: Optional[LogisticRegression] = None, threshold: float = None):
+        self.model = model
+        self.threshold = settings.INTENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+
+    @staticmethod
+    def _normalize(embeddings) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def fit(self, embeddings: Sequence, labels: Sequence[str], c: float = 100.0) -> 'IntentClassifier':
+        # Unit vectors give small logits, so weak regularization is needed for usable confidences
+        self.model = LogisticRegression(C=c, max_iter=2000, class_weight='balanced')
+        self.model.fit(self._normalize(embeddings), list(labels))
+        return self
+
+    def predict_proba(self, embeddings) -> np.ndarray:
+        return self.model.predict_proba(self._normalize(embeddings))
+
+    def predict(self, embedding) -> IntentPrediction:
+        start = time.perf_counter()
+        probs = self.predict_proba(embedding)[0]
+        best = int(np.argmax(probs))
+        return IntentPrediction(self.model.classes_[best], float(probs[best]), (time.perf_counter() - start) * 1000)
+
+    def is_confident(self, prediction: IntentPrediction) -> bool:
+        return prediction.confidence >= self.threshold
+
+    @property
+    def classes(self) -> List[str]:
+        return list(self.model.classes_)
+
+    def save(self, path: str = None) -> None:
+        path = path or settings.INTENT_MODEL_PATH
+        joblib.dump({"model": self.model, "threshold": self.threshold, "dim": self.model.coef_.shape[1]}, path)
+
+    @classmethod
+    def load(cls, path: str = None) -> 'IntentClassifier':
+        path = path or settings.INTENT_MODEL_PATH
+        artifact = joblib.load(path)
+        # An explicit INTENT_CONFIDENCE_THRESHOLD overrides the one chosen at training time
+        threshold = settings.INTENT_CONFIDENCE_THRESHOLD if 'INTENT_CONFIDENCE_THRESHOLD' in os.environ else artifact.get("threshold")
+        return cls(artifact["model"], threshold=threshold)
+
+
+_classifier = None
+_lock = threading.Lock()
+_load_failed = False
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """The trained classifier, or None when routing is disabled or no model has been trained."""
+    global _classifier, _load_failed
+    if not settings.INTENT_ROUTING_ENABLED or _load_failed:
+        return None
+    if _classifier is None:
+        with _lock:
+            if _classifier is None and not _load_failed:
+                if not os.path.exists(settings.INTENT_MODEL_PATH):
+                    logger.info(f"No intent model at {settings.INTENT_MODEL_PATH}; every turn goes to the full prompt")
+                    _load_failed = True
+                    return None
+                try:
+                    _classifier = IntentClassifier.load()
+                    logger.info(f"Loaded intent classifier with classes {_classifier.classes}")
+                except Exception as e:
+                    logger.error(f"Failed to load intent classifier: {str(e)}")
+                    _load_failed = True
+    return _classifier
+
+
+async def classify_intent(message: str) -> Optional[IntentPrediction]:
+    classifier = get_intent_classifier()
+    if classifier is None:
+        return None
+    try:
+        embedding = await get_embedding(message)
+        return classifier.predict(embedding) if embedding else None
+    except Exception as e:
+        # Routing is an optimization; the full prompt handles anything we can't classify
+        logger.error(f"Intent classification failed: {str(e)}")
+        return None
@@ -0,0 +1,149 @@
+"""
+Train the intent classifier used to route turns before calling the LLM.
+
+    python -m classifier.train --data classifier/data/intents.jsonl --report classifier/report.json
+
+The data file is JSON lines of {"text": ..., "intent": ...}. Texts are embedded
+with get_embedding (so EMBEDDING_MODEL must match production), every example is
+scored by a model trained on the other folds, the confidence threshold is
+picked from those out-of-fold scores, and the model is refit on everything and
+written to INTENT_MODEL_PATH.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import StratifiedKFold
+
+from agents.callgpt import get_embedding
+from classifier.model import SIMPLE_INTENTS, IntentClassifier
+from config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+MIN_ROUTED = 10  # routed turns a threshold must be judged on, capped at half the simple-intent examples
+
+
+def load_examples(path):
+    texts, labels = [], []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                texts.append(row['text'])
+                labels.append(row['intent'])
+    return texts, labels
+
+
+async def embed_all(texts, concurrency=16):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def embed(text):
+        async with slots:
+            return await get_embedding(text)
+    embeddings = await asyncio.gather(*(embed(text) for text in texts))
+    missing = sum(e is None for e in embeddings)
+    if missing:
+        raise RuntimeError(f"{missing} of {len(texts)} examples could not be embedded")
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def out_of_fold_proba(embeddings, labels, folds=5, c=100.0, seed=7):
+    """Class probabilities for every example from a model that did not train on it, and the class order."""
+    labels = np.asarray(labels)
+    probs, classes = None, None
+    for train_idx, test_idx in StratifiedKFold(folds, shuffle=True, random_state=seed).split(embeddings, labels):
+        fold = IntentClassifier().fit(embeddings[train_idx], labels[train_idx], c=c)
+        if probs is None:
+            classes = list(fold.classes)
+            probs = np.zeros((len(labels), len(classes)), dtype=np.float32)
+        probs[test_idx] = fold.predict_proba(embeddings[test_idx])
+    return probs, classes
+
+
+def threshold_table(probs, classes, labels):
+    """Share of simple-intent turns that would be routed to the small prompt at each threshold, and how often that routing is right."""
+    predicted = np.asarray(classes)[probs.argmax(axis=1)]
+    confidence = probs.max(axis=1)
+    labels = np.asarray(labels)
+    rows = []
+    for threshold in THRESHOLDS:
+        routed = np.isin(predicted, list(SIMPLE_INTENTS)) & (confidence >= threshold)
+        rows.append({
+            "threshold": threshold,
+            "routed": int(routed.sum()),
+            "routed_share": float(routed.mean()),
+            "routed_precision": float((predicted[routed] == labels[routed]).mean()) if routed.any() else None,
+            "confident_accuracy": float((predicted[confidence >= threshold] == labels[confidence >= threshold]).mean()) if (confidence >= threshold).any() else None,
+        })
+    return rows
+
+
+def pick_threshold(rows, target_precision, min_routed=MIN_ROUTED):
+    # Lowest threshold that is precise enough on a meaningful number of routed turns
+    for row in rows:
+        if row["routed"] >= min_routed and row["routed_precision"] >= target_precision:
+            return row["threshold"]
+    logger.warning(f"No threshold reached {target_precision:.0%} precision on {min_routed}+ routed turns; keeping {settings.INTENT_CONFIDENCE_THRESHOLD}")
+    return settings.INTENT_CONFIDENCE_THRESHOLD
+
+
+def measure_latency(classifier, embeddings, runs=1000):
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        classifier.predict(embeddings[i % len(embeddings)])
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99))}
+
+
+def train(data_path, output=None, folds=5, target_precision=0.95, c=100.0, seed=7):
+    texts, labels = load_examples(data_path)
+    embeddings = asyncio.run(embed_all(texts))
+
+    probs, classes = out_of_fold_proba(embeddings, labels, folds, c, seed)
+    predicted = np.asarray(classes)[probs.argmax(axis=1)]
+    rows = threshold_table(probs, classes, labels)
+    simple = sum(label in SIMPLE_INTENTS for label in labels)
+    threshold = pick_threshold(rows, target_precision, min_routed=max(1, min(MIN_ROUTED, simple // 2)))
+
+    final = IntentClassifier(threshold=threshold).fit(embeddings, labels, c=c)
+    final.save(output)
+
+    report = {
+        "examples": len(texts),
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "folds": folds,
+        "test_accuracy": float(accuracy_score(labels, predicted)),
+        "per_class": classification_report(labels, predicted, output_dict=True, zero_division=0),
+        "thresholds": rows,
+        "threshold": threshold,
+        "latency": measure_latency(final, embeddings),
+    }
+    logger.info(f"Out-of-fold accuracy {report['test_accuracy']:.3f} on {len(labels)} examples ({folds} folds); threshold {threshold}")
+    for row in rows:
+        logger.info(f"  threshold {row['threshold']:.2f}: routes {row['routed_share']:.0%} of turns, precision {row['routed_precision']}")
+    logger.info(f"Predict latency p50 {report['latency']['p50_ms']:.3f} ms, p99 {report['latency']['p99_ms']:.3f} ms")
+    logger.info(f"Saved model to {output or settings.INTENT_MODEL_PATH}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the embedding-based intent classifier")
+    parser.add_argument('--data', default='classifier/data/intents.jsonl')
+    parser.add_argument('--output', help="Model path (default INTENT_MODEL_PATH)")
+    parser.add_argument('--folds', type=int, default=5, help="Cross-validation folds used to score the thresholds")
+    parser.add_argument('--target-precision', type=float, default=0.95, help="Required precision of turns routed to the small prompt")
+    parser.add_argument('--c', type=float, default=100.0, help="Inverse regularization strength")
+    parser.add_argument('--report', help="Write the evaluation report as JSON to this path")
+    args = parser.parse_args()
+    report = train(args.data, args.output, args.folds, args.target_precision, args.c)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
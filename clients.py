@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import threading
+import weakref
+
+import httpx
+import openai
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+from postgrest.utils import SyncClient as PostgrestSession
+from requests.adapters import HTTPAdapter
+from supabase import Client as SupabaseClient
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client as TwilioClient
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry of long-lived API clients.
+#
+# Sync clients (Supabase, Twilio) are shared by every thread in the process.
+# Async clients (OpenAI, Perplexity, PostgREST, outbound Twilio) hold connections bound to the event loop
+# they were first used on, so one instance is kept per running loop.
+
+_lock = threading.Lock()
+_supabase = None
+_twilio = None
+_loop_clients = weakref.WeakKeyDictionary()  # event loop -> {name: client}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.CLIENT_POOL_SIZE,
+        max_keepalive_connections=settings.CLIENT_POOL_SIZE,
+        keepalive_expiry=settings.CLIENT_KEEPALIVE_SECONDS,
+    )
+
+
+class _PooledSyncPostgrestClient(SyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout):
+        return PostgrestSession(base_url=base_url, headers=headers, timeout=timeout, limits=_limits())
+
+
+class _PooledSupabaseClient(SupabaseClient):
+    # supabase-py builds its PostgREST client here, also again after an auth token change
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None) -> SyncPostgrestClient:
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        return _PooledSyncPostgrestClient(rest_url, headers=headers, schema=schema, **kwargs)
+
+
+def get_supabase_client() -> SupabaseClient:
+    global _supabase
+    if _supabase is None:
+        with _lock:
+            if _supabase is None:
+                _supabase = _PooledSupabaseClient(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+    return _supabase
+
+
+def get_twilio_client() -> TwilioClient:
+    global _twilio
+    if _twilio is None:
+        with _lock:
+            if _twilio is None:
+                http_client = TwilioHttpClient(pool_connections=True)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.CLIENT_POOL_SIZE)
+                http_client.session.mount("https://", adapter)
+                _twilio = TwilioClient(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+    return _twilio
+
+
+def _for_loop(name: str, factory):
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _loop_clients.setdefault(loop, {})
+        if name not in clients:
+            clients[name] = factory()
+        return clients[name]
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    return _for_loop("openai", lambda: openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        http_client=httpx.AsyncClient(limits=_limits(), timeout=httpx.Timeout(600.0, connect=5.0)),
+    ))
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout):
+        return httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=_limits())
+
+
+def get_async_supabase_client() -> AsyncPostgrestClient:
+    """Non-blocking PostgREST client for Supabase; same query builder as the sync client, but `execute()` is awaited."""
+    key = settings.SUPABASE_SERVICE_ROLE_KEY
+    return _for_loop("supabase", lambda: _PooledPostgrestClient(
+        f"{settings.SUPABASE_URL}/rest/v1",
+        headers={
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        },
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    ))
+
+
+def get_perplexity_client() -> httpx.AsyncClient:
+    return _for_loop("perplexity", lambda: httpx.AsyncClient(limits=_limits(), timeout=30.0))
+
+
+def get_async_twilio_client() -> TwilioClient:
+    """Twilio client whose `create_async` calls run on aiohttp instead of a thread."""
+    return _for_loop("twilio", lambda: TwilioClient(
+        settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=AsyncTwilioHttpClient(timeout=15.0)
+    ))
+
+
+async def close_async_clients() -> None:
+    """Close the async clients owned by the running loop, e.g. before the loop shuts down."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _loop_clients.pop(loop, {})
+    for client in clients.values():
+        try:
+            if isinstance(client, openai.AsyncOpenAI):
+                await client.close()
+            elif isinstance(client, TwilioClient):
+                await client.http_client.close()
+            else:
+                await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing client: {e}")
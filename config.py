@@ -1,6 +1,7 @@
 # config.py
 import os
 from pathlib import Path
+from typing import Any
 from pydantic_settings import BaseSettings
 import logging
 
@@ -23,12 +24,24 @@ class Settings(BaseSettings):
     GENERATOR_MODEL: str
     VECTOR_DIM: int
     VECTOR_INDEX_PATH: str
+    MATCHER_BACKEND: str = "rpc"  # "rpc" (Supabase match_opportunities), "faiss" (matcher/vector_index.py) or "pg" (matcher/pg_matcher.py)
+    VECTOR_INDEX_REFRESH_SECONDS: int = 300
+    VECTOR_INDEX_RECONCILE_SECONDS: int = 3600  # full id scan that drops deleted opportunities from the faiss index
     DATABASE_URL: str
+    PG_POOL_MIN_SIZE: int = 1  # asyncpg connections per event loop for MATCHER_BACKEND=pg
+    PG_POOL_MAX_SIZE: int = 10
     PERPLEXITY_API_KEY: str = ""
 
     TWILIO_ACCOUNT_SID: str = ""
     TWILIO_AUTH_TOKEN: str = ""
     TWILIO_PHONE_NUMBER: str = ""
+    TWILIO_SENDERS: str = ""  # comma-separated numbers and/or messaging service SIDs (MG...); defaults to TWILIO_PHONE_NUMBER
+    SMS_SENDER_RATE: float = 1.0  # messages per second per phone number
+    SMS_SERVICE_RATE: float = 10.0  # messages per second per messaging service
+    SMS_SENDER_BURST: float = 3.0
+    SMS_DISPATCH_CONCURRENCY: int = 64  # outbound sends in flight per dispatcher process
+    SMS_MAX_ATTEMPTS: int = 5
+    SMS_RETRY_BASE_SECONDS: float = 1.0
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
 
     SUPABASE_URL: str = ""
@@ -39,6 +52,45 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str = ""
     REDIS_SSL: bool = os.getenv('REDIS_SSL', 'True').lower() == 'true'
     MAX_HISTORY: int = 50
+    redis_client: Any = None  # set by api/twilio_routes.py once the Redis connection exists
+    DAILY_SEND_HOUR: int = 8  # local hour the daily recommendation goes out
+    DAILY_CONCURRENCY: int = 16
+    WORKER_CONCURRENCY: int = 32  # conversations in flight per worker process
+    WORKER_METRICS_PORT: int = 9100  # Prometheus port for the standalone worker, 0 to disable
+    CONTEXT_CACHE_TTL: float = 30.0  # seconds a loaded conversation context is reused
+    PROMPT_BUDGET_PROFILE: int = 400  # approximate tokens per prompt section
+    PROMPT_BUDGET_HISTORY: int = 3000
+    PROMPT_BUDGET_CONTEXT: int = 1500
+    DEBOUNCE_FLUSH_INTERVAL: float = 0.25  # seconds between scans for expired message batches
+    CLIENT_POOL_SIZE: int = 20  # keep-alive connections per backend client
+    CLIENT_KEEPALIVE_SECONDS: float = 60.0
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_SIZE: int = 10000  # vectors kept in each process's LRU
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600  # seconds, Redis tier
+    INTENT_ROUTING_ENABLED: bool = True  # no-op until classifier/train.py has written a model
+    INTENT_MODEL_PATH: str = str(BASE_DIR / "classifier" / "intent_model.joblib")
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.85  # overridden by the threshold saved with the model unless set
+    SMALL_CHAT_MODEL: str = "gpt-4.1-mini"  # model for turns routed to the short persona prompt
+    TAG_PREDICTION_ENABLED: bool = True
+    TAG_EMBEDDINGS_PATH: str = str(BASE_DIR / "matcher" / "tag_embeddings.npz")
+    TAG_MARGIN_THRESHOLD: float = 0.02  # cosine gap between the top two tags needed to skip the LLM
+    PRECOMPUTE_USER_BLOCK: int = 1024  # users scored per matrix product in precompute_daily
+    PRECOMPUTE_ITEM_BLOCK: int = 16384  # opportunities per tile; bounds the score matrix to users x block floats
+    PRECOMPUTE_MAX_AGE_HOURS: float = 6  # older precomputed rows are recomputed at send time
+    CATALOG_CACHE_SIZE: int = 20000  # opportunity rows kept in each process's LRU
+    CATALOG_CACHE_TTL: int = 24 * 3600  # seconds, Redis tier
+    CATALOG_REFRESH_SECONDS: int = 60  # how often lookups first poll opportunities.updated_at
+    CATALOG_RECONCILE_SECONDS: int = 3600  # full id scan that evicts deleted opportunities from both catalog tiers
+    BOOKKEEPING_FLUSH_ROWS: int = 200  # buffered user_recommendations rows that trigger a bulk insert
+    BOOKKEEPING_FLUSH_SECONDS: float = 1.0  # max time a buffered row waits
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_USERS: int = 5000  # users with cached secondary_recommend results per process
+    RESULT_CACHE_TTL: int = 1800  # seconds
+    RESULT_CACHE_SIMILARITY: float = 0.95  # cosine similarity between queries needed to reuse results
+    RESULT_CACHE_LSH_BITS: int = 8  # hyperplanes per bucket key; fewer bits means fewer boundary misses
+    RESULT_CACHE_CATALOG_CHECK: int = 60  # seconds between opportunities.updated_at checks
+    ONBOARDING_PREFETCH_ENABLED: bool = True
+    ONBOARDING_PREFETCH_TTL: int = 3600  # seconds a step-1 background lookup waits in Redis for the final answer
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,119 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+from database.supabase import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+
+class BookkeepingBuffer:
+    """
+    Write-behind buffer for recommendation bookkeeping.
+
+    `add(table, row)` queues a row and returns immediately; a background thread
+    bulk-inserts each table's rows once `max_rows` are waiting, every
+    `interval` seconds, and at interpreter exit. `defer(func, ...)` runs a
+    read-modify-write (e.g. store_recent_recommendations) on the same thread,
+    in submission order, so the caller never waits on the database. Rows that
+    fail to insert are retried on the next flush, up to `max_pending`.
+    """
+
+    def __init__(self, max_rows: int = None, interval: float = None, max_pending: int = None):
+        self.max_rows = max_rows or settings.BOOKKEEPING_FLUSH_ROWS
+        self.interval = interval or settings.BOOKKEEPING_FLUSH_SECONDS
+        self.max_pending = max_pending or self.max_rows * 20
+        self._rows: Dict[str, List[dict]] = {}
+        self._calls = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def _ensure_thread(self) -> None:
+        # Started on first use so forked gunicorn workers each get their own
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="bookkeeping-flusher", daemon=True)
+            self._thread.start()
+
+    def add(self, table: str, row: dict) -> None:
+        with self._cond:
+            rows = self._rows.setdefault(table, [])
+            rows.append(row)
+            if len(rows) > self.max_pending:
+                logger.error(f"Bookkeeping buffer for {table} is full; dropping the oldest row")
+                rows.pop(0)
+            self._ensure_thread()
+            if len(rows) >= self.max_rows:
+                self._cond.notify()
+
+    def defer(self, func: Callable, *args, **kwargs) -> None:
+        with self._cond:
+            self._calls.append((func, args, kwargs))
+            self._ensure_thread()
+            self._cond.notify()
+
+    def pending(self, table: str, **match) -> List[dict]:
+        """Rows of `table` not yet written whose fields equal `match`, oldest first."""
+        with self._cond:
+            rows = list(self._rows.get(table, ()))
+        return [row for row in rows if all(row.get(k) == v for k, v in match.items())]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._calls and sum(map(len, self._rows.values())) < self.max_rows:
+                    self._cond.wait(self.interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _run_calls(self) -> None:
+        while True:
+            with self._cond:
+                if not self._calls:
+                    return
+                func, args, kwargs = self._calls.popleft()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Deferred bookkeeping call {getattr(func, '__name__', func)} failed: {e}")
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows inserted."""
+        with self._flush_lock:
+            written = 0
+            with self._cond:
+                batches, self._rows = self._rows, {}
+            for table, rows in batches.items():
+                if not rows:
+                    continue
+                try:
+                    get_supabase_client().table(table).insert(rows).execute()
+                    written += len(rows)
+                except Exception as e:
+                    logger.error(f"Bulk insert of {len(rows)} rows into {table} failed, will retry: {e}")
+                    with self._cond:
+                        self._rows[table] = (rows + self._rows.get(table, []))[-self.max_pending:]
+            self._run_calls()
+            if written:
+                logger.debug(f"Flushed {written} bookkeeping rows")
+            return written
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+
+
+bookkeeping = BookkeepingBuffer()
+atexit.register(bookkeeping.close)
+
+
+def latest_pending(table: str, **match) -> Optional[Dict[str, Any]]:
+    rows = bookkeeping.pending(table, **match)
+    return rows[-1] if rows else None
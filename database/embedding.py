@@ -0,0 +1,158 @@
+import json
+from typing import Any, List, Optional
+
+import numpy as np
+from pydantic_core import core_schema
+
+EMBEDDING_DIM = 1536
+
+
+class Embedding:
+    """
+    Compact, lazily-decoded vector for model fields, caches and storage.
+
+    Wraps whatever the source handed us (a list, pgvector text like
+    "[0.1,...]", raw bytes or an ndarray) and only decodes it into a float32
+    array the first time `.array` is read, so loading a profile whose
+    embedding is never used costs next to nothing.
+
+    Binary form is headerless and identified by length: float32 (4 bytes per
+    dim), float16 (2 bytes per dim) or int8 (a float32 scale followed by one
+    byte per dim). `from_bytes` wraps the buffer without copying it.
+    """
+
+    __slots__ = ('_raw', '_array', '_blob', 'dtype', 'scale', 'dim')
+
+    def __init__(self, raw: Any, dtype: str = 'float32', scale: Optional[float] = None, dim: int = EMBEDDING_DIM):
+        self._raw = raw
+        self._array = None
+        self._blob = None  # original bytes, when built by from_bytes
+        self.dtype = dtype
+        self.scale = scale
+        self.dim = dim
+
+    # Construction
+
+    @classmethod
+    def from_bytes(cls, blob, dim: int = EMBEDDING_DIM) -> 'Embedding':
+        size = len(blob)
+        if size == dim * 4:
+            embedding = cls(np.frombuffer(blob, dtype=np.float32), dim=dim)
+        elif size == dim * 2:
+            embedding = cls(np.frombuffer(blob, dtype=np.float16), dtype='float16', dim=dim)
+        elif size == dim + 4:
+            scale = float(np.frombuffer(blob, dtype=np.float32, count=1)[0])
+            embedding = cls(np.frombuffer(blob, dtype=np.int8, offset=4), dtype='int8', scale=scale, dim=dim)
+        else:
+            raise ValueError(f"Embedding blob of {size} bytes does not match dim {dim}")
+        if isinstance(blob, bytes):
+            embedding._blob = blob
+        return embedding
+
+    @classmethod
+    def validate(cls, value: Any) -> 'Embedding':
+        if isinstance(value, Embedding):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(value)
+        if isinstance(value, (list, tuple, np.ndarray)):
+            if len(value) != EMBEDDING_DIM:
+                raise ValueError(f"Embedding must have {EMBEDDING_DIM} dimensions, got {len(value)}")
+            return cls(value)
+        if isinstance(value, str):
+            # pgvector text from PostgREST; parsed on first access
+            return cls(value)
+        raise TypeError(f"Cannot build an Embedding from {type(value).__name__}")
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler):
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            # Python-mode model_dump too, so dumps can go straight to json.dumps or the Supabase client
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda v: v.to_list(), when_used='always'
+            ),
+        )
+
+    # Decoding
+
+    def _decode(self) -> np.ndarray:
+        raw = self._raw
+        if isinstance(raw, str):
+            raw = json.loads(raw)
+        array = np.asarray(raw)
+        if self.dtype == 'int8':
+            array = array.astype(np.float32) * self.scale
+        else:
+            array = array.astype(np.float32, copy=False)
+        if array.shape != (self.dim,):
+            raise ValueError(f"Embedding must have {self.dim} dimensions, got {array.shape}")
+        return array
+
+    @property
+    def array(self) -> np.ndarray:
+        """float32 view of the vector (dequantized for float16/int8)."""
+        if self._array is None:
+            self._array = self._decode()
+        return self._array
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._array is not None or (isinstance(self._raw, np.ndarray) and self.dtype == 'float32')
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __len__(self) -> int:
+        return self.dim
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Embedding):
+            return self.dtype == other.dtype and np.array_equal(self.array, other.array)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Embedding(dim={self.dim}, dtype={self.dtype})"
+
+    # Encoding
+
+    def to_bytes(self) -> bytes:
+        if self._blob is not None:
+            return self._blob
+        raw = self._raw
+        if isinstance(raw, np.ndarray) and raw.dtype == np.dtype(self.dtype):
+            payload = raw.tobytes()  # no intermediate Python floats
+        elif self.dtype == 'float32':
+            payload = self.array.tobytes()
+        else:
+            payload = np.asarray(raw, dtype=self.dtype).tobytes()
+        if self.dtype == 'int8':
+            return np.float32(self.scale).tobytes() + payload
+        return payload
+
+    def to_list(self) -> List[float]:
+        return self.array.tolist()
+
+    def quantize(self, dtype: str) -> 'Embedding':
+        """Return a float16 or int8 copy; int8 uses one symmetric scale for the whole vector."""
+        if dtype == 'float32':
+            return Embedding(self.array, dim=self.dim)
+        if dtype == 'float16':
+            return Embedding(self.array.astype(np.float16), dtype='float16', dim=self.dim)
+        if dtype == 'int8':
+            peak = float(np.abs(self.array).max()) or 1.0
+            scale = peak / 127.0
+            codes = np.clip(np.rint(self.array / scale), -127, 127).astype(np.int8)
+            return Embedding(codes, dtype='int8', scale=scale, dim=self.dim)
+        raise ValueError(f"Unsupported embedding dtype {dtype}")
+
+
+def parse_embedding(value) -> Optional[np.ndarray]:
+    """float32 array from a list, ndarray, Embedding or pgvector text ("[0.1,0.2,...]"), or None."""
+    if value is None:
+        return None
+    if isinstance(value, Embedding):
+        return value.array
+    if isinstance(value, str):
+        value = json.loads(value)
+    return Embedding(value, dim=len(value)).array
@@ -0,0 +1,192 @@
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from database.models import ConversationArchive, ConversationMessage
+from database.supabase import get_async_supabase_client, get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+MAX_HISTORY = settings.MAX_HISTORY
+PAGE_SIZE = 1000
+
+
+# The turn path (append and fetch) awaits the async client; compaction and
+# backfill are background jobs and stay on the sync client.
+
+async def append_messages(user_id: str, conversation_id: Optional[str], messages: List[Dict[str, Any]]) -> None:
+    """
+    Append one turn's messages to `conversation_messages` in a single insert.
+
+    `messages` are {"sender": ..., "content": ...} dicts. Rows are never
+    rewritten, so concurrent writers cannot clobber each other and the cost
+    of a write does not grow with history length.
+    """
+    if not messages:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [
+        ConversationMessage(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            sender=msg['sender'],
+            content=msg.get('content'),
+            created_at=now,
+        ).model_dump(mode='json', exclude_none=True)
+        for msg in messages
+    ]
+    supabase = get_async_supabase_client()
+    await supabase.table('conversation_messages').insert(rows).execute()
+
+
+def to_history(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert log rows (newest first) into the oldest-first message dicts stored on conversations."""
+    return [
+        {"sender": row['sender'], "content": row['content'], "timestamp": row.get('created_at')}
+        for row in reversed(rows)
+    ]
+
+
+async def _legacy_messages(user_id: str, conversation_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    # Conversations from before the log keep their history in user_conversations.messages until backfilled
+    supabase = get_async_supabase_client()
+    query = supabase.table('user_conversations').select('messages').eq('user_id', user_id)
+    if conversation_id:
+        query = query.eq('id', conversation_id)
+    response = await query.order('started_at', desc=True).limit(1).execute()
+    messages = (response.data[0].get('messages') if response.data else None) or []
+    return messages[-limit:]
+
+
+async def fetch_recent_messages(user_id: str, limit: int = None, conversation_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Latest messages, oldest first, for one conversation or across all of the user's conversations."""
+    limit = limit or MAX_HISTORY
+    supabase = get_async_supabase_client()
+    query = supabase.table('conversation_messages').select('sender, content, created_at').eq('user_id', user_id)
+    if conversation_id:
+        query = query.eq('conversation_id', conversation_id)
+    response = await query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
+    if response.data:
+        return to_history(response.data)
+    return await _legacy_messages(user_id, conversation_id, limit)
+
+
+# Background compaction: move everything beyond the newest MAX_HISTORY
+# messages per user into conversation_archives.
+
+def _users_with_messages():
+    supabase = get_supabase_client()
+    offset = 0
+    while True:
+        response = supabase.table('profiles').select('user_id').range(offset, offset + PAGE_SIZE - 1).execute()
+        batch = response.data or []
+        for row in batch:
+            yield row['user_id']
+        if len(batch) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+
+def compact_user(user_id: str, keep: int = None) -> int:
+    keep = keep or MAX_HISTORY
+    supabase = get_supabase_client()
+    archived = 0
+    while True:
+        # Rows past the newest `keep`, oldest-first within this page
+        response = supabase.table('conversation_messages').select('*').eq('user_id', user_id).order('created_at', desc=True).order('id', desc=True).range(keep, keep + PAGE_SIZE - 1).execute()
+        rows = response.data or []
+        if not rows:
+            return archived
+        rows.sort(key=lambda r: (r['created_at'], r['id']))
+        archive = ConversationArchive(
+            user_id=user_id,
+            started_at=rows[0].get('created_at'),
+            ended_at=rows[-1].get('created_at'),
+            messages=to_history(list(reversed(rows)))
+        )
+        supabase.table('conversation_archives').insert(archive.model_dump(mode='json', exclude_none=True)).execute()
+        supabase.table('conversation_messages').delete().in_('id', [r['id'] for r in rows]).execute()
+        archived += len(rows)
+
+
+def compact_all(keep: int = None) -> int:
+    total = 0
+    for user_id in _users_with_messages():
+        try:
+            archived = compact_user(user_id, keep)
+        except Exception as e:
+            logger.error(f"Error compacting messages for {user_id}: {str(e)}")
+            continue
+        if archived:
+            logger.info(f"Archived {archived} messages for {user_id}")
+        total += archived
+    logger.info(f"Compaction finished, archived {total} messages")
+    return total
+
+
+# One-off backfill: copy the messages arrays on user_conversations into the
+# log, keeping their original timestamps so they sort before newer turns.
+
+def _legacy_timestamp(value, default: str) -> str:
+    if isinstance(value, str) and value:
+        # store_message wrote isoformat() + "Z", e.g. "...+00:00Z"
+        text = value[:-1] if value.endswith('Z') and '+' in value else value
+        try:
+            return datetime.fromisoformat(text.replace('Z', '+00:00')).isoformat()
+        except ValueError:
+            pass
+    return default
+
+
+def backfill_conversation(conversation: Dict[str, Any]) -> int:
+    messages = conversation.get('messages') or []
+    if not messages:
+        return 0
+    default = conversation.get('started_at') or datetime.now(timezone.utc).isoformat()
+    rows = [
+        ConversationMessage(
+            user_id=conversation['user_id'],
+            conversation_id=conversation['id'],
+            sender=msg.get('sender') or 'user',
+            content=msg.get('content'),
+            created_at=_legacy_timestamp(msg.get('timestamp'), default),
+        ).model_dump(mode='json', exclude_none=True)
+        for msg in messages
+    ]
+    supabase = get_supabase_client()
+    for start in range(0, len(rows), PAGE_SIZE):
+        supabase.table('conversation_messages').insert(rows[start:start + PAGE_SIZE]).execute()
+    # Emptying the array marks the conversation as migrated, so reruns skip it
+    supabase.table('user_conversations').update({'messages': []}).eq('id', conversation['id']).execute()
+    return len(rows)
+
+
+def backfill_all() -> int:
+    supabase = get_supabase_client()
+    total = 0
+    while True:
+        # Migrated rows drop out of the filter, so always read the first page
+        response = supabase.table('user_conversations').select('id, user_id, started_at, messages').neq('messages', '[]').limit(PAGE_SIZE).execute()
+        batch = response.data or []
+        for conversation in batch:
+            try:
+                total += backfill_conversation(conversation)
+            except Exception as e:
+                logger.error(f"Error backfilling conversation {conversation.get('id')}: {str(e)}")
+                return total
+        if len(batch) < PAGE_SIZE:
+            break
+    logger.info(f"Backfill finished, copied {total} messages")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == 'compact':
+        compact_all()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'backfill':
+        backfill_all()
+    else:
+        print("usage: python -m database.message_log compact|backfill")
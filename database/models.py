@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field
 from datetime import datetime, timezone
 import uuid
 import json
+from database.embedding import Embedding
 
 class UserProfile(BaseModel):
     id: Optional[uuid.UUID] = None
@@ -12,11 +13,9 @@ class UserProfile(BaseModel):
     bio: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
-    embedding: Optional[List[float]] = Field(
+    embedding: Optional[Embedding] = Field(
         default=None,
-        description="Vector embedding for similarity search",
-        min_items=1536,
-        max_items=1536
+        description="Vector embedding for similarity search"
     )
     
     # Extended profile fields (these will be stored in the application logic
@@ -34,7 +33,7 @@ class UserProfile(BaseModel):
             "username": self.username,
             "location": self.location,
             "bio": self.bio,
-            "embedding": self.embedding,  # Include embedding in Supabase dict
+            "embedding": self.embedding.to_list() if self.embedding is not None else None,  # Include embedding in Supabase dict
         }
     
     @classmethod
@@ -76,6 +75,14 @@ class UserConversation(BaseModel):
     ended_at: Optional[datetime] = None
     messages: List[Dict[str, Any]] = Field(default_factory=list)
 
+class ConversationMessage(BaseModel):
+    id: Optional[int] = None
+    user_id: str
+    conversation_id: Optional[uuid.UUID] = None
+    sender: str  # 'user' or 'system'
+    content: Optional[str] = None
+    created_at: Optional[datetime] = None
+
 class UserFeedback(BaseModel):
     id: Optional[uuid.UUID] = None
     user_id: str
@@ -102,11 +109,9 @@ class Opportunity(BaseModel):
     city: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
-    embedding: Optional[List[float]] = Field(
+    embedding: Optional[Embedding] = Field(
         default=None,
-        description="Vector embedding for similarity search",
-        min_items=1536,
-        max_items=1536
+        description="Vector embedding for similarity search"
     )
     location: Optional[Dict[str, Any]] = None  # You can define a more specific type if needed
 
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from redis import Redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+from agents.embedding_cache import REDIS_RETRY_SECONDS
+from config import settings
+from database.supabase import get_async_supabase_client, get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "opp:"
+# Everything the prompts and SMS need; the embedding stays in the database
+CATALOG_COLUMNS = 'id, title, description, details, tags, deadline, updated_at'
+IN_CHUNK = 200  # ids per `in` filter, keeps PostgREST URLs short
+PAGE_SIZE = 1000
+
+
+class OpportunityCatalog:
+    """
+    Read-through cache of opportunity rows without their embeddings.
+
+    Lookups go to a bounded per-process LRU, then Redis (JSON, `ttl` seconds),
+    then one `in` query to Supabase for whatever is still missing. Every
+    `refresh_interval` seconds the next lookup first reads the rows whose
+    updated_at reached the last watermark and overwrites both tiers, so an
+    edited opportunity is seen within one interval by every process. Every
+    `reconcile_interval` seconds the refresh also scans the live ids and evicts
+    deleted opportunities from both tiers. After a Redis error the catalog
+    runs on the LRU and Supabase alone for REDIS_RETRY_SECONDS.
+    `aget`/`aget_many` are the event-loop versions: misses are fetched with the
+    async client and the periodic refresh runs on its own thread.
+    """
+
+    def __init__(self, max_items: int = None, ttl: int = None, refresh_interval: float = None, reconcile_interval: float = None, redis_client: Redis = None):
+        self.max_items = max_items or settings.CATALOG_CACHE_SIZE
+        self.ttl = ttl or settings.CATALOG_CACHE_TTL
+        self.refresh_interval = settings.CATALOG_REFRESH_SECONDS if refresh_interval is None else refresh_interval
+        self.reconcile_interval = settings.CATALOG_RECONCILE_SECONDS if reconcile_interval is None else reconcile_interval
+        self._redis = redis_client
+        self._redis_down_until = 0.0
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._watermark = None
+        self._seen_at_watermark = set()  # ids already applied whose updated_at equals the watermark
+        self._refreshed_at = 0.0
+        self._reconciled_at = time.monotonic()
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    @property
+    def redis(self) -> Optional[Redis]:
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None and settings.REDIS_HOST:
+            self._redis = Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                password=settings.REDIS_PASSWORD,
+                ssl=settings.REDIS_SSL,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5,
+                # One attempt; _redis_failed backs off across calls instead
+                retry=Retry(NoBackoff(), 0),
+            )
+        return self._redis
+
+    def _redis_failed(self, action: str, error: Exception) -> None:
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning(f"Opportunity catalog Redis {action} failed, skipping Redis for {REDIS_RETRY_SECONDS}s: {error}")
+
+    def _put_local(self, rows: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            for row in rows:
+                key = str(row['id'])
+                self._local[key] = row
+                self._local.move_to_end(key)
+            while len(self._local) > self.max_items:
+                self._local.popitem(last=False)
+
+    def _put_redis(self, rows: List[Dict[str, Any]]) -> None:
+        redis = self.redis
+        if not rows or not redis:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for row in rows:
+                pipe.set(KEY_PREFIX + str(row['id']), json.dumps(row, default=str), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed("set", e)
+
+    def _get_redis(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        redis = self.redis
+        if not ids or not redis:
+            return {}
+        try:
+            blobs = redis.mget([KEY_PREFIX + item_id for item_id in ids])
+        except Exception as e:
+            self._redis_failed("get", e)
+            return {}
+        return {item_id: json.loads(blob) for item_id, blob in zip(ids, blobs) if blob is not None}
+
+    def _fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        supabase = get_supabase_client()
+        found = {}
+        for start in range(0, len(ids), IN_CHUNK):
+            response = supabase.table('opportunities').select(CATALOG_COLUMNS).in_('id', ids[start:start + IN_CHUNK]).execute()
+            for row in response.data or []:
+                found[str(row['id'])] = row
+        return found
+
+    async def _afetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        supabase = get_async_supabase_client()
+        responses = await asyncio.gather(*(
+            supabase.table('opportunities').select(CATALOG_COLUMNS).in_('id', ids[start:start + IN_CHUNK]).execute()
+            for start in range(0, len(ids), IN_CHUNK)
+        ))
+        return {str(row['id']): row for response in responses for row in response.data or []}
+
+    def refresh(self) -> int:
+        """Pull rows changed since the last refresh into both tiers; returns how many changed."""
+        supabase = get_supabase_client()
+        if self._watermark is None:
+            latest = supabase.table('opportunities').select('updated_at').order('updated_at', desc=True).limit(1).execute()
+            self._watermark = latest.data[0]['updated_at'] if latest.data else ''
+            return 0
+        # gte, not gt: a row committed later with the same updated_at as the
+        # watermark would otherwise be skipped; rows already applied are dropped below
+        rows, offset = [], 0
+        while True:
+            response = (
+                supabase.table('opportunities').select(CATALOG_COLUMNS).gte('updated_at', self._watermark)
+                .order('updated_at').order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+            )
+            batch = response.data or []
+            rows.extend(batch)
+            if len(batch) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        changed = [
+            row for row in rows
+            if not (row['updated_at'] == self._watermark and str(row['id']) in self._seen_at_watermark)
+        ]
+        if changed:
+            watermark = rows[-1]['updated_at']
+            at_watermark = {str(row['id']) for row in rows if row['updated_at'] == watermark}
+            if watermark == self._watermark:
+                at_watermark |= self._seen_at_watermark
+            self._watermark, self._seen_at_watermark = watermark, at_watermark
+            self._put_local(changed)
+            self._put_redis(changed)
+            logger.info(f"Opportunity catalog picked up {len(changed)} changed rows")
+        return len(changed)
+
+    def _live_ids(self) -> set:
+        supabase = get_supabase_client()
+        live, offset = set(), 0
+        while True:
+            response = supabase.table('opportunities').select('id').order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+            batch = response.data or []
+            live.update(str(row['id']) for row in batch)
+            if len(batch) < PAGE_SIZE:
+                return live
+            offset += PAGE_SIZE
+
+    def reconcile(self) -> int:
+        """Evict opportunities that were deleted from Supabase from both tiers. Returns how many were evicted."""
+        live = self._live_ids()
+        with self._lock:
+            deleted = {item_id for item_id in self._local if item_id not in live}
+            for item_id in deleted:
+                del self._local[item_id]
+        redis = self.redis
+        if redis:
+            # Other processes may have cached rows this one never looked up
+            try:
+                stale = {}
+                for key in redis.scan_iter(match=KEY_PREFIX + '*', count=1000):
+                    item_id = (key.decode() if isinstance(key, bytes) else key)[len(KEY_PREFIX):]
+                    if item_id not in live:
+                        stale[item_id] = key
+                if stale:
+                    redis.delete(*stale.values())
+                deleted.update(stale)
+            except Exception as e:
+                self._redis_failed("reconcile", e)
+        if deleted:
+            logger.info(f"Opportunity catalog evicted {len(deleted)} deleted opportunities")
+        return len(deleted)
+
+    def _claim_refresh(self) -> bool:
+        # One caller refreshes; the rest keep serving what they have
+        if time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        self._refreshed_at = time.monotonic()
+        return True
+
+    def _run_claimed_refresh(self) -> None:
+        try:
+            self.refresh()
+            if time.monotonic() - self._reconciled_at >= self.reconcile_interval:
+                self._reconciled_at = time.monotonic()
+                self.reconcile()
+        except Exception as e:
+            logger.warning(f"Opportunity catalog refresh failed: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    def _maybe_refresh(self) -> None:
+        if self._claim_refresh():
+            self._run_claimed_refresh()
+
+    def _get_cached(self, ids: List[str]):
+        """(rows found in the LRU or Redis, ids still missing)."""
+        found, missing = {}, []
+        with self._lock:
+            for item_id in ids:
+                row = self._local.get(item_id)
+                if row is None:
+                    missing.append(item_id)
+                else:
+                    self._local.move_to_end(item_id)
+                    found[item_id] = row
+        self.hits_local += len(found)
+
+        from_redis = self._get_redis(missing)
+        self.hits_redis += len(from_redis)
+        self._put_local(from_redis.values())
+        found.update(from_redis)
+
+        missing = [item_id for item_id in missing if item_id not in from_redis]
+        self.misses += len(missing)
+        return found, missing
+
+    def _store(self, fetched: Dict[str, Dict[str, Any]]) -> None:
+        self._put_local(fetched.values())
+        self._put_redis(list(fetched.values()))
+
+    def get_many(self, ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Rows by id (as str); ids that do not exist are left out."""
+        self._maybe_refresh()
+        found, missing = self._get_cached(list(dict.fromkeys(str(item_id) for item_id in ids if item_id is not None)))
+        if missing:
+            fetched = self._fetch(missing)
+            self._store(fetched)
+            found.update(fetched)
+        return found
+
+    async def aget_many(self, ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        if self._claim_refresh():
+            # This lookup serves what the tiers hold now
+            threading.Thread(target=self._run_claimed_refresh, daemon=True).start()
+        found, missing = await asyncio.to_thread(self._get_cached, list(dict.fromkeys(str(item_id) for item_id in ids if item_id is not None)))
+        if missing:
+            fetched = await self._afetch(missing)
+            await asyncio.to_thread(self._store, fetched)
+            found.update(fetched)
+        return found
+
+    def get(self, item_id) -> Optional[Dict[str, Any]]:
+        if item_id is None:
+            return None
+        return self.get_many([item_id]).get(str(item_id))
+
+    async def aget(self, item_id) -> Optional[Dict[str, Any]]:
+        if item_id is None:
+            return None
+        return (await self.aget_many([item_id])).get(str(item_id))
+
+    def stats(self) -> dict:
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_rate": (self.hits_local + self.hits_redis) / lookups if lookups else 0.0,
+            "local_items": len(self._local),
+        }
+
+
+opportunity_catalog = OpportunityCatalog()
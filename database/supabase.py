@@ -1,13 +1,23 @@
 import logging
-from supabase import create_client, Client
+from postgrest import AsyncPostgrestClient
+from supabase import Client
 from config import settings
+import clients
 
 logger = logging.getLogger(__name__)
 
 def get_supabase_client() -> Client:
+    # Shared, keep-alive client from the process-wide registry
     try:
-        supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
-        return supabase
+        return clients.get_supabase_client()
     except Exception as e:
         logger.error(f"Error creating Supabase client: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def get_async_supabase_client() -> AsyncPostgrestClient:
+    # Per-event-loop client; use from async code so queries don't block the loop
+    try:
+        return clients.get_async_supabase_client()
+    except Exception as e:
+        logger.error(f"Error creating async Supabase client: {str(e)}")
+        raise
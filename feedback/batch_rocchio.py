@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from feedback.rocchio_state import rebuild_states
+from matcher.pg_matcher import close_pool, get_pool
+
+logger = logging.getLogger(__name__)
+
+# rocchio_states owns the Rocchio result: record_feedback folds in each event as
+# it arrives, and this job reconciles every user with recent feedback by
+# rebuilding their state from the full history, so the two never overwrite
+# each other with different answers.
+RECENT_USERS_SQL = 'select distinct user_id from user_feedback where "timestamp" >= $1'
+
+
+async def users_with_feedback(since: datetime) -> List[str]:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return [row['user_id'] for row in await conn.fetch(RECENT_USERS_SQL, since)]
+
+
+async def run(hours=24, dry_run=False) -> int:
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    try:
+        user_ids = await users_with_feedback(since)
+        if not user_ids:
+            logger.info(f"No feedback since {since.isoformat()}, nothing to update")
+            return 0
+        return await rebuild_states(user_ids, dry_run=dry_run)
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Nightly batch Rocchio rebuild for users with recent feedback")
+    parser.add_argument('--hours', type=int, default=24, help="Rebuild users with feedback in the last N hours")
+    parser.add_argument('--dry-run', action='store_true', help="Compute updates without writing them")
+    args = parser.parse_args()
+    asyncio.run(run(hours=args.hours, dry_run=args.dry_run))
@@ -1,9 +1,82 @@
 import logging
 from typing import List, Tuple, Optional, Dict, Any
 import numpy as np
+from scipy import sparse
+
+from database.embedding import parse_embedding
 
 logger = logging.getLogger(__name__)
 
+# Sign of each feedback type in the batch API's feedback_signs array
+FEEDBACK_SIGNS = {"like": 1, "neutral": 0, "skip": -1, "dislike": -1}
+
+class RocchioState:
+    """
+    Running Rocchio accumulators for one user.
+
+    Keeps the embedding the updates are applied to (`base`) plus the
+    confidence-weighted sum and total weight of liked and of skipped/disliked
+    item embeddings, so each new feedback event costs O(dim) regardless of
+    how much feedback the user has given before.
+    """
+
+    def __init__(
+        self,
+        base: np.ndarray,
+        positive_sum: Optional[np.ndarray] = None,
+        positive_weight: float = 0.0,
+        negative_sum: Optional[np.ndarray] = None,
+        negative_weight: float = 0.0
+    ):
+        self.base = np.asarray(base, dtype=np.float32)
+        self.positive_sum = np.zeros_like(self.base) if positive_sum is None else np.asarray(positive_sum, dtype=np.float32)
+        self.positive_weight = float(positive_weight)
+        self.negative_sum = np.zeros_like(self.base) if negative_sum is None else np.asarray(negative_sum, dtype=np.float32)
+        self.negative_weight = float(negative_weight)
+
+    def add(self, embedding, confidence: float, feedback_type: str) -> bool:
+        """Fold one feedback item into the accumulators. Returns False if it was ignored."""
+        if embedding is None:
+            return False
+        sign = FEEDBACK_SIGNS.get(feedback_type, 0)
+        if sign == 0:
+            return False
+        weighted = np.asarray(embedding, dtype=np.float32) * confidence
+        if sign > 0:
+            self.positive_sum += weighted
+            self.positive_weight += confidence
+        else:
+            self.negative_sum += weighted
+            self.negative_weight += confidence
+        return True
+
+    def reset(self) -> None:
+        self.positive_sum[:] = 0
+        self.negative_sum[:] = 0
+        self.positive_weight = 0.0
+        self.negative_weight = 0.0
+
+    def to_supabase_dict(self, user_id: str) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "base_embedding": self.base.tolist(),
+            "positive_sum": self.positive_sum.tolist(),
+            "positive_weight": self.positive_weight,
+            "negative_sum": self.negative_sum.tolist(),
+            "negative_weight": self.negative_weight,
+        }
+
+    @classmethod
+    def from_supabase_dict(cls, data: Dict[str, Any]) -> 'RocchioState':
+        # pgvector columns arrive as text from PostgREST and as arrays from asyncpg
+        return cls(
+            base=parse_embedding(data["base_embedding"]),
+            positive_sum=parse_embedding(data.get("positive_sum")),
+            positive_weight=data.get("positive_weight") or 0.0,
+            negative_sum=parse_embedding(data.get("negative_sum")),
+            negative_weight=data.get("negative_weight") or 0.0,
+        )
+
 class EnhancedRocchioUpdater:
     """
     Enhanced version of the Rocchio algorithm that incorporates confidence scores 
@@ -103,4 +176,105 @@ class EnhancedRocchioUpdater:
             
         except Exception as e:
             logger.error(f"Error updating embedding with Enhanced Rocchio: {str(e)}")
-            return original_embedding  # Return original embedding if update fails
\ No newline at end of file
+            return original_embedding  # Return original embedding if update fails
+
+    def embedding_from_state(self, state: RocchioState) -> List[float]:
+        """
+        Compute the updated embedding from a user's accumulators in O(dim).
+
+        Gives the same result as update_embedding(state.base, <all feedback
+        folded into state>), without revisiting the feedback history.
+        """
+        positive_centroid = state.positive_sum / state.positive_weight if state.positive_weight > 0 else np.zeros_like(state.base)
+        negative_centroid = state.negative_sum / state.negative_weight if state.negative_weight > 0 else np.zeros_like(state.base)
+        new_embedding = (
+            self.alpha * state.base +
+            self.beta * positive_centroid -
+            self.gamma * negative_centroid
+        )
+        norm = np.linalg.norm(new_embedding)
+        if norm > 0:
+            new_embedding = new_embedding / norm
+        return new_embedding.tolist()
+
+    def apply_feedback(self, state: RocchioState, embedding, confidence: float, feedback_type: str) -> List[float]:
+        """Add one feedback event to `state` and return the user's new embedding."""
+        state.add(embedding, confidence, feedback_type)
+        return self.embedding_from_state(state)
+
+    def accumulate_batch(
+        self,
+        n_users: int,
+        item_embeddings: np.ndarray,
+        indptr: np.ndarray,
+        item_indices: np.ndarray,
+        confidences: np.ndarray,
+        feedback_signs: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        RocchioState accumulators for every user at once, from feedback in the
+        CSR layout described in update_embeddings_batch.
+
+        Returns:
+            (positive_sums, positive_weights, negative_sums, negative_weights):
+            (n_users, dim) float32 confidence-weighted sums and (n_users,) weight totals
+        """
+        items = np.asarray(item_embeddings, dtype=np.float32)
+        confidences = np.asarray(confidences, dtype=np.float32)
+        feedback_signs = np.asarray(feedback_signs)
+        shape = (n_users, items.shape[0])
+
+        # One sparse weight matrix per group; neutral entries carry zero weight in both
+        positive = sparse.csr_matrix((np.where(feedback_signs > 0, confidences, 0), item_indices, indptr), shape=shape)
+        negative = sparse.csr_matrix((np.where(feedback_signs < 0, confidences, 0), item_indices, indptr), shape=shape)
+
+        def sums(weights):
+            return np.asarray(weights @ items, dtype=np.float32), np.asarray(weights.sum(axis=1), dtype=np.float32).ravel()
+
+        return (*sums(positive), *sums(negative))
+
+    def update_embeddings_batch(
+        self,
+        user_embeddings: np.ndarray,
+        item_embeddings: np.ndarray,
+        indptr: np.ndarray,
+        item_indices: np.ndarray,
+        confidences: np.ndarray,
+        feedback_signs: np.ndarray
+    ) -> np.ndarray:
+        """
+        Apply update_embedding to every user at once.
+
+        Feedback is grouped by user in CSR layout: user u's feedback is entries
+        indptr[u]:indptr[u+1] of item_indices / confidences / feedback_signs.
+
+        Args:
+            user_embeddings: (n_users, dim) current user embeddings
+            item_embeddings: (n_items, dim) embeddings of every item referenced
+            indptr: (n_users + 1,) CSR row pointers
+            item_indices: (nnz,) row in item_embeddings for each feedback entry
+            confidences: (nnz,) confidence of each entry, between 0 and 1
+            feedback_signs: (nnz,) 1 for like, -1 for skip/dislike, 0 for neutral
+                (see FEEDBACK_SIGNS)
+
+        Returns:
+            (n_users, dim) float32 array of normalized updated embeddings
+        """
+        users = np.asarray(user_embeddings, dtype=np.float32)
+        positive_sums, positive_weights, negative_sums, negative_weights = self.accumulate_batch(
+            users.shape[0], item_embeddings, indptr, item_indices, confidences, feedback_signs
+        )
+
+        def centroids(sums, totals):
+            totals = totals[:, None]
+            return np.divide(sums, totals, out=np.zeros_like(sums), where=totals > 0)
+
+        updated = (
+            self.alpha * users +
+            self.beta * centroids(positive_sums, positive_weights) -
+            self.gamma * centroids(negative_sums, negative_weights)
+        ).astype(np.float32)
+
+        norms = np.linalg.norm(updated, axis=1, keepdims=True)
+        np.divide(updated, norms, out=updated, where=norms > 0)
+        return updated
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from database.models import UserFeedback
+from feedback.enhanced_rocchio import EnhancedRocchioUpdater, FEEDBACK_SIGNS, RocchioState
+from matcher.pg_matcher import close_pool, get_pool
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_QUEUE_NAME = 'user_feedback'
+REBUILD_CHUNK = 500  # users rebuilt per transaction
+# profiles.embedding further than this from what the state produces was rewritten
+# elsewhere (bio update, onboarding) and becomes the state's new base
+REBASE_SIMILARITY = 0.9999
+
+updater = EnhancedRocchioUpdater()
+
+# Every read-modify-write of a state first locks the user's profiles row, so
+# concurrent events for one user are applied one after another, in any process.
+LOCK_PROFILES_SQL = """
+    select user_id, embedding from profiles
+    where user_id = any($1::text[]) and embedding is not null
+    order by user_id
+    for update
+"""
+STATES_SQL = "select * from rocchio_states where user_id = any($1::text[])"
+UPSERT_STATE_SQL = """
+    insert into rocchio_states (user_id, base_embedding, positive_sum, positive_weight, negative_sum, negative_weight, updated_at)
+    values ($1, $2, $3, $4, $5, $6, now())
+    on conflict (user_id) do update set
+        base_embedding = excluded.base_embedding,
+        positive_sum = excluded.positive_sum,
+        positive_weight = excluded.positive_weight,
+        negative_sum = excluded.negative_sum,
+        negative_weight = excluded.negative_weight,
+        updated_at = excluded.updated_at
+"""
+UPDATE_PROFILE_SQL = "update profiles set embedding = $2, updated_at = now() where user_id = $1"
+INSERT_FEEDBACK_SQL = """
+    insert into user_feedback (user_id, item_id, feedback_type, confidence, "timestamp", metadata)
+    values ($1, $2, $3, $4, coalesce($5, now()), $6)
+"""
+ITEM_EMBEDDING_SQL = "select embedding from opportunities where id::text = $1 and embedding is not null"
+HISTORY_SQL = "select user_id, item_id::text as item_id, feedback_type, confidence from user_feedback where user_id = any($1::text[])"
+ITEM_EMBEDDINGS_SQL = "select id::text as id, embedding from opportunities where id::text = any($1::text[]) and embedding is not null"
+
+
+def _similarity(a, b) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if a.shape != b.shape:
+        return -1.0
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denom if denom else -1.0
+
+
+async def lock_states(conn, user_ids: Iterable[str]) -> Dict[str, RocchioState]:
+    """
+    Lock the users' profiles rows and return their states. Must run inside a transaction.
+
+    Users without a state start from their current profile embedding. If
+    profiles.embedding no longer matches what the state produces, it was
+    rewritten since the last update, so it becomes the new base and the
+    accumulated feedback is applied on top of it instead of reverting it.
+    """
+    profiles = {row['user_id']: row['embedding'] for row in await conn.fetch(LOCK_PROFILES_SQL, list(user_ids))}
+    rows = {row['user_id']: row for row in await conn.fetch(STATES_SQL, list(profiles))}
+    states = {}
+    for user_id, embedding in profiles.items():
+        current = np.asarray(embedding, dtype=np.float32)
+        row = rows.get(user_id)
+        if row is None:
+            states[user_id] = RocchioState(current)
+            continue
+        state = RocchioState.from_supabase_dict(dict(row))
+        if _similarity(updater.embedding_from_state(state), current) < REBASE_SIMILARITY:
+            logger.info(f"Profile embedding for {user_id} changed outside Rocchio, rebasing its state")
+            state.base = current
+        states[user_id] = state
+    return states
+
+
+async def save_states(conn, states: Dict[str, RocchioState]) -> Dict[str, List[float]]:
+    """Write the states and the profile embeddings they produce. Returns the embeddings by user."""
+    embeddings = {user_id: updater.embedding_from_state(state) for user_id, state in states.items()}
+    await conn.executemany(UPSERT_STATE_SQL, [
+        (user_id, state.base, state.positive_sum, state.positive_weight, state.negative_sum, state.negative_weight)
+        for user_id, state in states.items()
+    ])
+    await conn.executemany(UPDATE_PROFILE_SQL, [
+        (user_id, np.asarray(embedding, dtype=np.float32)) for user_id, embedding in embeddings.items()
+    ])
+    return embeddings
+
+
+async def record_feedback(feedback: UserFeedback) -> Optional[List[float]]:
+    """
+    Store one feedback event and fold it into the user's persisted
+    accumulators and profiles.embedding. Cost is O(dim), independent of
+    history length. The event and the state change commit together.
+    """
+    confidence = 1.0 if feedback.confidence is None else feedback.confidence
+    try:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    INSERT_FEEDBACK_SQL, feedback.user_id, feedback.item_id, feedback.feedback_type,
+                    feedback.confidence, feedback.timestamp, feedback.metadata
+                )
+                state = (await lock_states(conn, [feedback.user_id])).get(feedback.user_id)
+                if state is None:
+                    logger.info(f"No embedding for user {feedback.user_id}, skipping Rocchio update")
+                    return None
+                item_embedding = await conn.fetchval(ITEM_EMBEDDING_SQL, feedback.item_id)
+                if not state.add(item_embedding, confidence, feedback.feedback_type):
+                    return None
+                return (await save_states(conn, {feedback.user_id: state}))[feedback.user_id]
+    except Exception as e:
+        logger.error(f"Error applying feedback for user {feedback.user_id}: {str(e)}")
+        return None
+
+
+def enqueue_feedback(redis, feedback: UserFeedback) -> None:
+    # phone_number is what QueueWorker chains on, so one user's events are applied in order
+    redis.lpush(FEEDBACK_QUEUE_NAME, json.dumps({
+        'phone_number': feedback.user_id,
+        'feedback': feedback.model_dump(mode='json', exclude_none=True),
+    }))
+
+
+async def handle_feedback_message(data) -> None:
+    await record_feedback(UserFeedback(**data['feedback']))
+
+
+def _history_batch(user_ids: List[str], history, item_embeddings: Dict[str, np.ndarray], dim: int):
+    """Group history rows by user into the CSR arrays EnhancedRocchioUpdater.accumulate_batch expects."""
+    item_ids = list(item_embeddings)
+    item_pos = {item_id: i for i, item_id in enumerate(item_ids)}
+    by_user = {}
+    for row in history:
+        sign = FEEDBACK_SIGNS.get(row['feedback_type'])
+        if not sign or row['item_id'] not in item_pos:
+            continue
+        confidence = row['confidence']
+        by_user.setdefault(row['user_id'], []).append((item_pos[row['item_id']], 1.0 if confidence is None else confidence, sign))
+
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    entries = []
+    for u, user_id in enumerate(user_ids):
+        entries.extend(by_user.get(user_id, ()))
+        indptr[u + 1] = len(entries)
+    item_indices = np.fromiter((e[0] for e in entries), dtype=np.int64, count=len(entries))
+    confidences = np.fromiter((e[1] for e in entries), dtype=np.float32, count=len(entries))
+    signs = np.fromiter((e[2] for e in entries), dtype=np.int8, count=len(entries))
+    items = np.stack([item_embeddings[i] for i in item_ids]) if item_ids else np.zeros((0, dim), dtype=np.float32)
+    return items, indptr, item_indices, confidences, signs
+
+
+async def rebuild_states(user_ids: Iterable[str], dry_run: bool = False) -> int:
+    """
+    Recompute the users' accumulators and profile embeddings from their full
+    user_feedback history, a chunk of users per vectorized pass.
+
+    Existing states keep their base embedding, rebased as in lock_states;
+    users without one start from their current profile embedding.
+    """
+    user_ids = sorted(set(user_ids))
+    pool = await get_pool()
+    rebuilt = 0
+    for start in range(0, len(user_ids), REBUILD_CHUNK):
+        chunk = user_ids[start:start + REBUILD_CHUNK]
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                states = await lock_states(conn, chunk)
+                users = list(states)
+                if not users:
+                    continue
+                history = await conn.fetch(HISTORY_SQL, users)
+                item_embeddings = {
+                    row['id']: np.asarray(row['embedding'], dtype=np.float32)
+                    for row in await conn.fetch(ITEM_EMBEDDINGS_SQL, list({row['item_id'] for row in history}))
+                }
+                items, indptr, item_indices, confidences, signs = _history_batch(users, history, item_embeddings, states[users[0]].base.shape[0])
+                positive_sums, positive_weights, negative_sums, negative_weights = updater.accumulate_batch(
+                    len(users), items, indptr, item_indices, confidences, signs
+                )
+                for u, user_id in enumerate(users):
+                    state = states[user_id]
+                    state.positive_sum, state.positive_weight = positive_sums[u], float(positive_weights[u])
+                    state.negative_sum, state.negative_weight = negative_sums[u], float(negative_weights[u])
+                if not dry_run:
+                    await save_states(conn, states)
+        rebuilt += len(states)
+    logger.info(f"{'Computed' if dry_run else 'Rebuilt'} Rocchio state for {rebuilt} users")
+    return rebuilt
+
+
+async def _all_feedback_users() -> List[str]:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return [row['user_id'] for row in await conn.fetch("select distinct user_id from user_feedback")]
+
+
+async def _rebuild(user_ids: Optional[List[str]]) -> int:
+    try:
+        return await rebuild_states(user_ids or await _all_feedback_users())
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rebuild per-user Rocchio accumulators from user_feedback")
+    parser.add_argument('--user', action='append', help="Only rebuild these user ids (repeatable)")
+    args = parser.parse_args()
+    asyncio.run(_rebuild(args.user))
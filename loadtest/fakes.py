@@ -0,0 +1,426 @@
+"""
+In-process stand-ins for Redis, Supabase, OpenAI and Twilio used by the load
+generator. Each fake sleeps for a configurable latency (plus jitter) per call so
+the SMS pipeline can be measured offline with realistic backend round trips.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class Latency:
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    def seconds(self) -> float:
+        return max(0.0, random.gauss(self.mean_ms, self.jitter_ms)) / 1000.0 if self.jitter_ms else self.mean_ms / 1000.0
+
+    def sleep(self) -> None:
+        delay = self.seconds()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self) -> None:
+        delay = self.seconds()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# Redis
+
+class FakeRedis:
+    """
+    Thread-safe list/sorted-set subset of Redis, with an awaitable BRPOP.
+
+    Lua scripts cannot run here; register a Python equivalent in
+    `script_handlers` (script text -> fn(redis, keys, args)) and it runs
+    under the same lock, i.e. atomically, like the real script would.
+    """
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self._lists = {}
+        self._zsets = {}
+        self._lock = threading.RLock()
+        self._waiters = []  # (loop, future) pairs blocked in brpop
+        self.script_handlers = {}
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+
+    def lpush(self, key, *values):
+        self.latency.sleep()
+        with self._lock:
+            lst = self._lists.setdefault(key, deque())
+            for value in values:
+                lst.appendleft(value)
+            self._wake()
+            return len(lst)
+
+    def rpush(self, key, *values):
+        with self._lock:
+            lst = self._lists.setdefault(key, deque())
+            lst.extend(values)
+            self._wake()
+            return len(lst)
+
+    def rpop(self, key):
+        self.latency.sleep()
+        with self._lock:
+            lst = self._lists.get(key)
+            return lst.pop() if lst else None
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            items = list(self._lists.get(key, ()))
+        end = len(items) if end == -1 else end + 1
+        return items[start:end]
+
+    def llen(self, key):
+        with self._lock:
+            return len(self._lists.get(key, ()))
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(
+                int(self._lists.pop(key, None) is not None) + int(self._zsets.pop(key, None) is not None)
+                for key in keys
+            )
+
+    def expire(self, key, seconds):
+        return True
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            self._zsets.setdefault(key, {}).update(mapping)
+            return len(mapping)
+
+    def zrangebyscore(self, key, min_score, max_score, start=None, num=None):
+        lo = float('-inf') if min_score == '-inf' else float(min_score)
+        hi = float('inf') if max_score == '+inf' else float(max_score)
+        with self._lock:
+            members = sorted((score, m) for m, score in self._zsets.get(key, {}).items() if lo <= score <= hi)
+        members = [m for _, m in members]
+        if start is not None and num is not None:
+            members = members[start:start + num]
+        return members
+
+    def zrem(self, key, *members):
+        with self._lock:
+            zset = self._zsets.get(key, {})
+            return sum(zset.pop(m, None) is not None for m in members)
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._zsets.get(key, {}))
+
+    def register_script(self, script):
+        def run(keys=(), args=()):
+            self.latency.sleep()
+            with self._lock:
+                return self.script_handlers[script](self, list(keys), list(args))
+        return run
+
+    async def brpop(self, key, timeout=0):
+        await self.latency.asleep()
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                lst = self._lists.get(key)
+                if lst:
+                    return key, lst.pop()
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(fut, remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    async def close(self):
+        pass
+
+
+class AsyncRedisView:
+    """Async facade over a FakeRedis so code that expects redis.asyncio can share the same data."""
+
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+
+    def __getattr__(self, name):
+        attr = getattr(self._redis, name)
+        if asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+
+
+# Supabase
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._range = None
+        self._single = False
+        self._columns = None
+        self._op = 'select'
+        self._payload = None
+
+    def select(self, columns='*', **kwargs):
+        self._columns = None if columns.strip() == '*' else [c.strip() for c in columns.split(',')]
+        return self
+
+    def eq(self, col, value):
+        self._filters.append(lambda row: row.get(col) == value)
+        return self
+
+    def in_(self, col, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(col) in values)
+        return self
+
+    def gt(self, col, value):
+        self._filters.append(lambda row: row.get(col) is not None and str(row.get(col)) > str(value))
+        return self
+
+    def gte(self, col, value):
+        self._filters.append(lambda row: row.get(col) is not None and str(row.get(col)) >= str(value))
+        return self
+
+    def is_(self, col, value):
+        self._filters.append(lambda row: row.get(col) is None if value == 'null' else row.get(col) == value)
+        return self
+
+    def order(self, col, desc=False):
+        # Like PostgREST, later calls break ties in earlier ones
+        self._order.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def insert(self, rows):
+        self._op, self._payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self._op, self._payload = 'upsert', rows
+        return self
+
+    def update(self, values):
+        self._op, self._payload = 'update', values
+        return self
+
+    def delete(self):
+        self._op = 'delete'
+        return self
+
+    def _matches(self, rows):
+        return [row for row in rows if all(f(row) for f in self._filters)]
+
+    def execute(self):
+        self.db.latency.sleep()
+        return self._apply()
+
+    def _apply(self):
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self._op == 'insert' or self._op == 'upsert':
+                payload = self._payload if isinstance(self._payload, list) else [self._payload]
+                out = []
+                for row in payload:
+                    row = dict(row)
+                    if self._op == 'upsert':
+                        key = self.db.primary_keys.get(self.table, 'id')
+                        existing = next((r for r in rows if key in row and r.get(key) == row[key]), None)
+                        if existing is not None:
+                            existing.update(row)
+                            out.append(dict(existing))
+                            continue
+                    if self.table in self.db.serial_tables:
+                        row.setdefault('id', next(self.db.serial))
+                    else:
+                        row.setdefault('id', str(uuid.uuid4()))
+                    rows.append(row)
+                    out.append(dict(row))
+                return SimpleNamespace(data=out)
+            matched = self._matches(rows)
+            if self._op == 'update':
+                for row in matched:
+                    row.update(self._payload)
+                return SimpleNamespace(data=[dict(r) for r in matched])
+            if self._op == 'delete':
+                for row in matched:
+                    rows.remove(row)
+                return SimpleNamespace(data=[dict(r) for r in matched])
+            for col, desc in reversed(self._order):
+                matched = sorted(matched, key=lambda r: r.get(col) if isinstance(r.get(col), (int, float)) else str(r.get(col)), reverse=desc)
+            if self._range:
+                matched = matched[self._range[0]:self._range[1] + 1]
+            if self._limit is not None:
+                matched = matched[:self._limit]
+            if self._columns:
+                matched = [{c: r.get(c) for c in self._columns} for r in matched]
+            else:
+                matched = [dict(r) for r in matched]
+            if self._single:
+                return SimpleNamespace(data=matched[0] if matched else None)
+            return SimpleNamespace(data=matched)
+
+
+class FakeSupabase:
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.tables = {}
+        self.lock = threading.RLock()
+        self.primary_keys = {'recent_recommendations': 'user_id', 'profiles': 'user_id'}
+        self.serial_tables = {'conversation_messages'}  # bigserial ids, everything else gets a uuid
+        self.serial = itertools.count(1)
+        self.rpc_handlers = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        handler = self.rpc_handlers.get(name, lambda p: [])
+        db = self
+
+        class _Call:
+            def execute(self_inner):
+                db.latency.sleep()
+                return SimpleNamespace(data=handler(params))
+        return _Call()
+
+
+class AsyncFakeQuery(FakeQuery):
+    def __init__(self, db, table, blocking=False):
+        super().__init__(db, table)
+        self.blocking = blocking
+
+    async def execute(self):
+        if self.blocking:
+            self.db.latency.sleep()  # a sync client called from a coroutine
+        else:
+            await self.db.latency.asleep()
+        return self._apply()
+
+
+class AsyncSupabaseView:
+    """
+    Stand-in for clients.get_async_supabase_client() over the same FakeSupabase
+    data. With blocking=True, `await ...execute()` still sleeps the thread, which
+    is what calling the sync client from async code did.
+    """
+
+    def __init__(self, db: FakeSupabase, blocking: bool = False):
+        self.db = db
+        self.blocking = blocking
+
+    def table(self, name):
+        return AsyncFakeQuery(self.db, name, self.blocking)
+
+
+# OpenAI
+
+def fake_vector(text: str, dim: int = 1536) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:4], 'little')
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vec / np.linalg.norm(vec)).tolist()
+
+
+# build_messages renders the per-turn context as compact JSON
+CURRENT_RECOMMENDATION_ID = re.compile(r'current_recommendations:\[\{"id":"([^"]+)"')
+CHAT_REPLY = "ngl that sounds fun, what are u building rn?"
+
+
+def agent_reply(messages) -> str:
+    """
+    What the conversation model answers: the {"id", "message"} object
+    parse_gpt_response treats as a recommendation when the prompt offers
+    current recommendations, plain text for prompts that want prose.
+    """
+    for m in messages:
+        match = CURRENT_RECOMMENDATION_ID.search(m.get('content') or '')
+        if match:
+            return json.dumps({"id": match.group(1), "message": "this one looks like a fit for what ur building, check it out"})
+    return CHAT_REPLY
+
+
+class FakeOpenAI:
+    def __init__(self, chat_latency: Latency = None, embedding_latency: Latency = None, reply: str = None):
+        self.chat_latency = chat_latency or Latency()
+        self.embedding_latency = embedding_latency or Latency()
+        self.reply = reply  # fixed reply for every call; None answers like the real agent (agent_reply)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    async def _chat(self, model, messages, **kwargs):
+        await self.chat_latency.asleep()
+        prompt_chars = sum(len(m.get('content') or '') for m in messages)
+        reply = self.reply if self.reply is not None else agent_reply(messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+            usage=SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(reply) // 4, total_tokens=(prompt_chars + len(reply)) // 4),
+        )
+
+    async def _embed(self, model, input, **kwargs):
+        await self.embedding_latency.asleep()
+        return SimpleNamespace(data=[SimpleNamespace(embedding=fake_vector(input))])
+
+
+# Twilio
+
+class FakeTwilio:
+    def __init__(self, latency: Latency = None, on_send=None):
+        self.latency = latency or Latency()
+        self.on_send = on_send
+        self.sent = []
+        self._lock = threading.Lock()
+        self.messages = SimpleNamespace(create=self._create, create_async=self._create_async)
+
+    def _create(self, body=None, from_=None, to=None, **kwargs):
+        self.latency.sleep()
+        return self._record(to, body)
+
+    async def _create_async(self, body=None, from_=None, to=None, **kwargs):
+        await self.latency.asleep()
+        return self._record(to, body)
+
+    def _record(self, to, body):
+        now = time.monotonic()
+        with self._lock:
+            self.sent.append((to, now))
+        if self.on_send:
+            self.on_send(to, body, now)
+        return SimpleNamespace(sid=f"SM{uuid.uuid4().hex}", status='queued')
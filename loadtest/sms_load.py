@@ -0,0 +1,318 @@
+"""
+End-to-end load generator for the SMS pipeline.
+
+Posts synthetic Twilio webhooks to /twilio/webhook/sms through the Flask test
+client and runs the queue worker in-process, with Redis, Supabase, OpenAI and
+Twilio replaced by the fakes in loadtest/fakes.py. Measures the full path
+receive_sms -> Redis debounce -> queue -> process_message -> converse_with_user -> reply.
+
+    python -m loadtest.sms_load --users 200 --rate 20 --duration 60 --burst 3 --openai-ms 1500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Settings are validated at import time; give the required ones offline values
+for _key, _value in {
+    "OPENAI_API_KEY": "loadtest",
+    "EMBEDDING_MODEL": "text-embedding-ada-002",
+    "CLASSIFIER_MODEL": "loadtest",
+    "GENERATOR_MODEL": "loadtest",
+    "VECTOR_DIM": "1536",
+    "VECTOR_INDEX_PATH": "/tmp/loadtest.faiss",
+    "DATABASE_URL": "postgresql://loadtest",
+    "REDIS_PORT": "6379",
+}.items():
+    os.environ.setdefault(_key, _value)
+os.environ["REDIS_HOST"] = ""  # keep the embedding cache off the network
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# api/message_processor.py imports its sibling as a top-level module
+for _path in (ROOT, os.path.join(ROOT, "api")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from loadtest.fakes import Latency, FakeRedis, AsyncRedisView, FakeSupabase, AsyncSupabaseView, FakeOpenAI, FakeTwilio  # noqa: E402
+
+MESSAGING_QUEUE_NAME = 'twilio_messages'
+# Apologies process_message and converse_with_user send when a turn fails
+FALLBACK_MARKERS = ("having trouble", "encountered an error")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class LatencyTracker:
+    """
+    Matches each reply to the oldest unanswered inbound message for that number.
+    Fallback apologies answer the message but count as failures, and only real
+    replies contribute latencies.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.inbound = 0
+        self.replies = 0
+        self.failures = 0
+
+    def on_inbound(self, phone_number):
+        with self._lock:
+            self.inbound += 1
+            self._pending.setdefault(phone_number, []).append(time.monotonic())
+
+    def on_reply(self, phone_number, body, sent_at):
+        failed = any(marker in (body or '') for marker in FALLBACK_MARKERS)
+        with self._lock:
+            pending = self._pending.pop(phone_number, [])
+            if failed:
+                self.failures += 1
+                return
+            self.replies += 1
+            if pending:
+                # A batched burst gets one reply; measure from its first message
+                self.latencies.append(sent_at - pending[0])
+
+    @property
+    def unanswered(self):
+        with self._lock:
+            return sum(len(v) for v in self._pending.values())
+
+
+def seed(db: FakeSupabase, phone_numbers):
+    now = datetime.now(timezone.utc)
+    opportunities = [
+        {
+            'id': f"opp-{i}",
+            'title': f"Founder Night #{i}",
+            'description': "Pitch practice and demos with local founders.",
+            'details': {'deadline': '2026-12-01'},
+            'tags': ["Networking Events"],
+            'distance': 0.2,
+            'updated_at': now.isoformat(),
+        }
+        for i in range(20)
+    ]
+    db.tables['opportunities'] = [dict(o) for o in opportunities]
+    db.tables['profiles'] = [
+        {'id': f"00000000-0000-0000-0000-{i:012d}", 'user_id': phone, 'username': f"user{i}", 'location': "Toronto", 'bio': "Building a dev tools startup."}
+        for i, phone in enumerate(phone_numbers)
+    ]
+    db.tables['recent_recommendations'] = [
+        {'user_id': phone, 'recommendations': opportunities[:4], 'created_at': now}
+        for phone in phone_numbers
+    ]
+    db.rpc_handlers['match_opportunities'] = lambda params: opportunities[:params.get('p_top_k', 5)]
+
+
+def _debounce_add(redis, keys, args):
+    window, message, phone_number, _ttl = args
+    redis.rpush(keys[1], message)
+    redis.zadd(keys[0], {phone_number: time.time() + float(window)})
+    return 1
+
+
+def _debounce_flush(redis, keys, args):
+    now = time.time()
+    due = redis.zrangebyscore(keys[0], '-inf', now, start=0, num=int(args[0]))
+    for phone_number in due:
+        redis.zrem(keys[0], phone_number)
+        batch_key = args[1] + phone_number
+        messages = redis.lrange(batch_key, 0, -1)
+        redis.delete(batch_key)
+        if messages:
+            redis.lpush(keys[1], json.dumps({'phone_number': phone_number, 'message': messages, 'timestamp': str(now)}))
+    return len(due)
+
+
+def install_fakes(args, tracker):
+    """Swap every backend for an in-process fake before the app modules bind their clients."""
+    import clients
+
+    redis = FakeRedis(Latency(args.redis_ms, args.redis_ms / 4))
+    supabase = FakeSupabase(Latency(args.supabase_ms, args.supabase_ms / 4))
+    openai_client = FakeOpenAI(Latency(args.openai_ms, args.openai_ms / 4), Latency(args.embedding_ms, args.embedding_ms / 4))
+    twilio = FakeTwilio(Latency(args.twilio_ms, args.twilio_ms / 4), on_send=tracker.on_reply)
+
+    clients.get_supabase_client = lambda: supabase
+    clients.get_async_supabase_client = lambda: AsyncSupabaseView(supabase)
+    clients.get_twilio_client = lambda: twilio
+    clients.get_async_twilio_client = lambda: twilio
+    clients.get_openai_client = lambda: openai_client
+
+    # app.py imports api.twilio_routes, while the worker imports it as top-level
+    # twilio_routes, so both module objects need patching.
+    import app  # noqa: F401
+    import agents.callgpt
+    from config import settings
+    agents.callgpt.get_openai_client = lambda: openai_client
+    settings.redis_client = redis
+    if args.sms_rate:
+        # With one sender at the production rate, replies are capped by the token bucket, not the pipeline
+        settings.SMS_SENDER_RATE = args.sms_rate
+    routes = sys.modules['twilio_routes']
+    redis.script_handlers[routes.DEBOUNCE_ADD_SCRIPT] = _debounce_add
+    redis.script_handlers[routes.DEBOUNCE_FLUSH_SCRIPT] = _debounce_flush
+    debouncer = routes.MessageDebouncer(redis, window=args.session_window)
+    for name in ('twilio_routes', 'api.twilio_routes'):
+        module = sys.modules[name]
+        module.redis_client = redis
+        module.debouncer = debouncer
+    # start_worker runs api.message_processor; patch the top-level copy too if something imported it
+    for name in ('message_processor', 'api.message_processor'):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        module.redis_client = redis
+        module.debouncer = debouncer
+        module._async_redis = lambda: AsyncRedisView(redis)
+    return redis, supabase
+
+
+def start_worker(concurrency):
+    from api import message_processor
+    worker_box = {}
+    ready = threading.Event()
+
+    def run():
+        async def main():
+            worker_box['loop'] = asyncio.get_running_loop()
+            worker_box['worker'] = worker = message_processor.QueueWorker(
+                MESSAGING_QUEUE_NAME, message_processor.handle_queued_message, concurrency, pop_timeout=0.2
+            )
+            # Replies leave through the outbound dispatcher, as in production
+            worker_box['dispatcher'] = dispatcher = message_processor.QueueWorker(
+                message_processor.OUTBOUND_QUEUE_NAME, message_processor.dispatch_sms, pop_timeout=0.2
+            )
+            ready.set()
+            flusher = asyncio.create_task(message_processor.flush_debounced_batches(worker, interval=0.05))
+            await asyncio.gather(worker.run(), dispatcher.run())
+            await flusher
+        asyncio.run(main())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        worker_box['loop'].call_soon_threadsafe(worker_box['worker'].stop)
+        worker_box['loop'].call_soon_threadsafe(worker_box['dispatcher'].stop)
+        thread.join(timeout=30)
+    return stop
+
+
+def send_bursts(app, phone_numbers, args, tracker):
+    """Fire bursts of webhooks at `args.rate` messages/second for `args.duration` seconds."""
+    interval = args.burst / args.rate
+    senders = []
+    deadline = time.monotonic() + args.duration
+    next_at = time.monotonic()
+
+    def burst(phone_number):
+        test_client = app.test_client()
+        for i in range(args.burst):
+            tracker.on_inbound(phone_number)
+            test_client.post('/twilio/webhook/sms', data={'From': phone_number, 'Body': f"loadtest message {i}"})
+            if i + 1 < args.burst:
+                time.sleep(args.burst_gap_ms / 1000.0)
+
+    while time.monotonic() < deadline:
+        phone_number = random.choice(phone_numbers)
+        thread = threading.Thread(target=burst, args=(phone_number,), daemon=True)
+        thread.start()
+        senders.append(thread)
+        next_at += random.expovariate(1.0 / interval) if args.poisson else interval
+        time.sleep(max(0.0, next_at - time.monotonic()))
+    for thread in senders:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the inbound SMS pipeline")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=10.0, help="Inbound messages per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument('--burst', type=int, default=1, help="Messages per user burst")
+    parser.add_argument('--burst-gap-ms', type=float, default=500.0, help="Gap between messages within a burst")
+    parser.add_argument('--poisson', action='store_true', help="Exponential inter-arrival times instead of a fixed rate")
+    parser.add_argument('--session-window', type=float, default=3.0, help="Batching window in seconds")
+    parser.add_argument('--concurrency', type=int, default=None, help="Worker conversations in flight (default: WORKER_CONCURRENCY)")
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help="Seconds to wait for replies after load stops")
+    parser.add_argument('--redis-ms', type=float, default=0.5)
+    parser.add_argument('--supabase-ms', type=float, default=40.0)
+    parser.add_argument('--openai-ms', type=float, default=2500.0)
+    parser.add_argument('--embedding-ms', type=float, default=150.0)
+    parser.add_argument('--twilio-ms', type=float, default=250.0)
+    parser.add_argument('--sms-rate', type=float, default=None, help="Outbound sends per second per sender (default: SMS_SENDER_RATE)")
+    parser.add_argument('--output', help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    tracker = LatencyTracker()
+    redis, supabase = install_fakes(args, tracker)
+    phone_numbers = [f"+1555{i:07d}" for i in range(args.users)]
+    seed(supabase, phone_numbers)
+
+    import app as flask_app
+    stop_worker = start_worker(args.concurrency)
+
+    depth = []
+    sampling = threading.Event()
+    started = time.monotonic()
+
+    def sample_depth():
+        while not sampling.is_set():
+            # (seconds since start, queued turns, users with a batch still inside its window)
+            depth.append((round(time.monotonic() - started, 2), redis.llen(MESSAGING_QUEUE_NAME), redis.zcard(sys.modules['twilio_routes'].DEBOUNCE_DEADLINES_KEY)))
+            time.sleep(0.5)
+    sampler = threading.Thread(target=sample_depth, daemon=True)
+    sampler.start()
+
+    send_bursts(flask_app.app, phone_numbers, args, tracker)
+    load_done = time.monotonic()
+    drain_deadline = load_done + args.session_window + args.drain_timeout
+    while tracker.unanswered and time.monotonic() < drain_deadline:
+        time.sleep(0.2)
+    finished = time.monotonic()
+    sampling.set()
+    stop_worker()
+
+    latencies = tracker.latencies
+    report = {
+        'inbound_messages': tracker.inbound,
+        'replies': tracker.replies,
+        'failed_replies': tracker.failures,
+        'unanswered': tracker.unanswered,
+        'elapsed_s': round(finished - started, 2),
+        'inbound_per_s': round(tracker.inbound / (load_done - started), 2),
+        'replies_per_s': round(tracker.replies / (finished - started), 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'p99': round(percentile(latencies, 99) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        'max_queue_depth': max((d for _, d, _ in depth), default=0),
+        'max_pending_batches': max((p for _, _, p in depth), default=0),
+        'queue_depth': depth,
+        'config': vars(args),
+    }
+    summary = {k: v for k, v in report.items() if k not in ('queue_depth', 'config')}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import logging
+import uuid
+import weakref
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Same columns the catalog caches, plus the cosine distance the RPC returns.
+# The query vector goes over the wire as a 6 KB binary pgvector parameter
+# instead of ~30 KB of JSON text, and rows come back in the binary protocol.
+SELECT = """
+    select o.id, o.title, o.description, o.details, o.tags, o.deadline, o.updated_at,
+           o.embedding <=> $1 as distance
+    from opportunities o
+    where o.embedding is not null
+      and not exists (
+          select 1 from user_recommendations r
+          where r.user_id = $2 and r.item_id::text = o.id::text
+      )
+"""
+UNTAGGED_SQL = SELECT + " order by o.embedding <=> $1 limit $3"
+TAGGED_SQL = SELECT + " and o.tags && $4::text[] order by o.embedding <=> $1 limit $3"
+
+_pools = weakref.WeakKeyDictionary()  # event loop -> asyncpg pool
+_pool_locks = weakref.WeakKeyDictionary()
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    await register_vector(conn)
+    await conn.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+    await conn.set_type_codec('json', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+
+async def get_pool() -> asyncpg.Pool:
+    """asyncpg pool for the running loop. DATABASE_URL must be a session-mode or direct connection, since transaction-mode poolers drop prepared statements."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is not None:
+        return pool
+    lock = _pool_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        if loop not in _pools:
+            _pools[loop] = await asyncpg.create_pool(
+                settings.DATABASE_URL,
+                min_size=settings.PG_POOL_MIN_SIZE,
+                max_size=settings.PG_POOL_MAX_SIZE,
+                init=_init_connection,
+            )
+        return _pools[loop]
+
+
+async def close_pool() -> None:
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def _jsonable(value):
+    # Match what PostgREST would have returned for the same row
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _to_row(record) -> Dict[str, Any]:
+    row = {key: _jsonable(value) for key, value in record.items()}
+    row['distance'] = float(row['distance'])
+    return row
+
+
+def _tags(tag) -> List[str]:
+    if not tag:
+        return []
+    return [tag] if isinstance(tag, str) else list(tag)
+
+
+async def match_opportunities(user_id, embedding, top_k=5, tag=None, **kwargs) -> List[Dict[str, Any]]:
+    query = np.asarray(embedding, dtype=np.float32)
+    tags = _tags(tag)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        # fetch() prepares each query once per connection and reuses it from asyncpg's statement cache
+        if tags:
+            records = await conn.fetch(TAGGED_SQL, query, user_id, top_k, tags)
+        else:
+            records = await conn.fetch(UNTAGGED_SQL, query, user_id, top_k)
+    return [_to_row(record) for record in records]
@@ -0,0 +1,199 @@
+"""
+Precompute tomorrow-morning recommendations ahead of each timezone's send hour.
+
+Run hourly (e.g. at :15). Each run picks the users whose local clock reaches
+DAILY_SEND_HOUR in --hours-ahead hours, scores them against every live
+opportunity with blocked float32 matrix products, drops already-sent items and
+writes the top-k into precomputed_recommendations. send_daily_recommendations
+then only has to read that row; the picks reach recent_recommendations, where
+the conversation agent sees them, only once they are sent.
+
+Users are scored by their profile embedding alone. The live path instead
+embeds the anticipate_need query built from recent messages, so the two can
+pick different items for the same user.
+
+    python -m matcher.precompute_daily --hours-ahead 1 --top-k 5
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+from database.supabase import get_supabase_client
+from database.embedding import parse_embedding
+from matcher.send_daily_recommendations import parse_shard, users_due_now
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+IN_CHUNK = 200  # ids per `in` filter, keeps PostgREST URLs short
+OPPORTUNITY_COLUMNS = 'id, title, description, tags, details, deadline, updated_at, embedding'
+
+
+def _normalized_rows(vectors: Sequence[np.ndarray]) -> np.ndarray:
+    matrix = np.stack(vectors).astype(np.float32, copy=False)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def load_live_opportunities():
+    """(rows without embeddings, normalized float32 matrix) for opportunities that have not expired."""
+    supabase = get_supabase_client()
+    now = datetime.now(timezone.utc).isoformat()
+    rows, vectors = [], []
+    offset = 0
+    while True:
+        response = (
+            supabase.table('opportunities').select(OPPORTUNITY_COLUMNS)
+            .or_(f'deadline.is.null,deadline.gte.{now}')
+            .order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+        )
+        batch = response.data or []
+        for row in batch:
+            vec = parse_embedding(row.pop('embedding', None))
+            if vec is not None and vec.shape[0] == settings.VECTOR_DIM:
+                rows.append(row)
+                vectors.append(vec)
+        if len(batch) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+    if not rows:
+        return [], np.zeros((0, settings.VECTOR_DIM), dtype=np.float32)
+    return rows, _normalized_rows(vectors)
+
+
+def load_user_embeddings(user_ids: Sequence[str]):
+    supabase = get_supabase_client()
+    found_ids, vectors = [], []
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), IN_CHUNK):
+        response = supabase.table('profiles').select('user_id, embedding').in_('user_id', user_ids[start:start + IN_CHUNK]).execute()
+        for row in response.data or []:
+            vec = parse_embedding(row.get('embedding'))
+            if vec is not None and vec.shape[0] == settings.VECTOR_DIM:
+                found_ids.append(row['user_id'])
+                vectors.append(vec)
+    if not found_ids:
+        return [], np.zeros((0, settings.VECTOR_DIM), dtype=np.float32)
+    return found_ids, _normalized_rows(vectors)
+
+
+def load_sent_items(user_ids: Sequence[str]) -> Dict[str, set]:
+    supabase = get_supabase_client()
+    sent = {user_id: set() for user_id in user_ids}
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), IN_CHUNK):
+        chunk = user_ids[start:start + IN_CHUNK]
+        offset = 0
+        while True:
+            response = supabase.table('user_recommendations').select('user_id, item_id').in_('user_id', chunk).range(offset, offset + PAGE_SIZE - 1).execute()
+            batch = response.data or []
+            for row in batch:
+                sent[row['user_id']].add(str(row['item_id']))
+            if len(batch) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+    return sent
+
+
+def blocked_top_k(users: np.ndarray, items: np.ndarray, top_k: int, excluded_rows: np.ndarray = None,
+                  excluded_cols: np.ndarray = None, item_block: int = None):
+    """
+    Top-k item indices and cosine scores per user row.
+
+    Scores one (users x item_block) tile at a time and merges it into a running
+    top-k, so peak memory is one tile plus O(users * k) regardless of how many
+    items there are. (excluded_rows[i], excluded_cols[i]) pairs are never returned.
+    """
+    item_block = item_block or settings.PRECOMPUTE_ITEM_BLOCK
+    n_users = users.shape[0]
+    best_scores = np.full((n_users, top_k), -np.inf, dtype=np.float32)
+    best_items = np.full((n_users, top_k), -1, dtype=np.int64)
+    has_exclusions = excluded_rows is not None and len(excluded_rows)
+
+    for start in range(0, items.shape[0], item_block):
+        end = min(start + item_block, items.shape[0])
+        tile = users @ items[start:end].T
+        if has_exclusions:
+            in_block = (excluded_cols >= start) & (excluded_cols < end)
+            tile[excluded_rows[in_block], excluded_cols[in_block] - start] = -np.inf
+
+        k = min(top_k, end - start)
+        part = np.argpartition(-tile, k - 1, axis=1)[:, :k]
+        scores = np.concatenate([best_scores, np.take_along_axis(tile, part, axis=1)], axis=1)
+        candidates = np.concatenate([best_items, part + start], axis=1)
+        keep = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_items = np.take_along_axis(candidates, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_items, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def write_results(user_ids: Sequence[str], item_idx: np.ndarray, scores: np.ndarray, opportunities: List[dict], chunk_size=500) -> int:
+    supabase = get_supabase_client()
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for user_id, picks, picked_scores in zip(user_ids, item_idx, scores):
+        recs = [
+            {**opportunities[i], 'distance': float(1.0 - s), 'score': float(s)}
+            for i, s in zip(picks, picked_scores) if i >= 0 and np.isfinite(s)
+        ]
+        if recs:
+            rows.append({'user_id': user_id, 'recommendations': recs, 'precomputed_at': now})
+    for start in range(0, len(rows), chunk_size):
+        supabase.table('precomputed_recommendations').upsert(rows[start:start + chunk_size], on_conflict='user_id').execute()
+    return len(rows)
+
+
+def precompute(user_ids: Sequence[str], top_k: int = 5, user_block: int = None, dry_run: bool = False) -> int:
+    user_block = user_block or settings.PRECOMPUTE_USER_BLOCK
+    started = time.perf_counter()
+    opportunities, items = load_live_opportunities()
+    if not opportunities:
+        logger.info("No live opportunities with embeddings; nothing to precompute")
+        return 0
+    item_pos = {str(row['id']): i for i, row in enumerate(opportunities)}
+    logger.info(f"Loaded {len(opportunities)} live opportunities ({items.nbytes / 1e6:.1f} MB)")
+
+    written = 0
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), user_block):
+        block_ids, users = load_user_embeddings(user_ids[start:start + user_block])
+        if not block_ids:
+            continue
+        sent = load_sent_items(block_ids)
+        pairs = [(r, item_pos[item]) for r, uid in enumerate(block_ids) for item in sent[uid] if item in item_pos]
+        excluded = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        item_idx, scores = blocked_top_k(users, items, min(top_k, len(opportunities)), excluded[:, 0], excluded[:, 1])
+        if dry_run:
+            written += len(block_ids)
+        else:
+            written += write_results(block_ids, item_idx, scores, opportunities)
+        logger.info(f"Precomputed {start + len(block_ids)}/{len(user_ids)} users")
+
+    logger.info(f"Precomputed recommendations for {written} users in {time.perf_counter() - started:.1f}s")
+    return written
+
+
+def main(hours_ahead: int = 1, top_k: int = 5, shard: Optional[tuple] = None, dry_run: bool = False) -> int:
+    user_ids = users_due_now(shard, hours_ahead=hours_ahead)
+    if not user_ids:
+        logger.info(f"No users reach {settings.DAILY_SEND_HOUR}:00 in {hours_ahead}h")
+        return 0
+    return precompute(user_ids, top_k=top_k, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompute daily recommendations ahead of each timezone's send hour")
+    parser.add_argument('--hours-ahead', type=int, default=1, help="Precompute for users whose send hour is this many hours away")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--shard', type=parse_shard, default=None, help="Only handle shard i of N, e.g. 0/4")
+    parser.add_argument('--dry-run', action='store_true', help="Score users without writing results")
+    args = parser.parse_args()
+    main(hours_ahead=args.hours_ahead, top_k=args.top_k, shard=args.shard, dry_run=args.dry_run)
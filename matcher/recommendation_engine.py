@@ -1,12 +1,20 @@
-from matcher.supabase_matcher import match_opportunities
+import asyncio
+from matcher.supabase_matcher import amatch_opportunities
 from database.supabase import get_supabase_client
 import openai
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from agents.system_prompts import ANTICIPATORY_DAILY_PROMPT
 import json
+from typing import Dict, List, Sequence
 from matcher.tags import TAGS
 from config import settings
 from agents.callgpt import call_gpt, get_embedding
+from agents.context_loader import context_cache
+from database.bookkeeping import bookkeeping
+from database.message_log import fetch_recent_messages
+from matcher.result_cache import result_cache
+from matcher.tag_predictor import predict_tag
+from metrics import RESULT_CACHE_LOOKUPS, TAG_PREDICTIONS, timed
 
 # Helper to get user embedding (implement as needed)
 def get_user_embedding(user_id):
@@ -16,31 +24,41 @@ def get_user_embedding(user_id):
         return response.data[0]['embedding']
     return None
 
-# Record a recommendation in user_recommendations
+# Record a recommendation in user_recommendations (buffered; bulk-inserted in the background)
 def record_recommendation(user_id, item_id, score):
-    supabase = get_supabase_client()
-    supabase.table('user_recommendations').insert({
+    bookkeeping.add('user_recommendations', {
         'user_id': user_id,
         'item_id': item_id,
         'recommended_score': score,
         'status': 'sent',
-        'created_at': datetime.now(timezone.utc)
-    }).execute()
+        'created_at': datetime.now(timezone.utc).isoformat()
+    })
+    context_cache.invalidate(user_id)
+    result_cache.invalidate(user_id)
+    if settings.MATCHER_BACKEND == "faiss":
+        from matcher.vector_index import get_opportunity_index
+        get_opportunity_index().note_sent(user_id, item_id)
 
-# Main orchestration function
-async def recommend_to_user(user_id, filters=None, top_k=5):
-    supabase = get_supabase_client()
+# Steps 1-2: read the recent conversation and work out what the user needs today
+async def anticipate_need(user_id):
     # 1. Fetch recent user conversation (last 10 messages)
-    convo_response = supabase.table('user_conversations').select('messages').eq('user_id', user_id).order('started_at', desc=True).limit(1).execute()
-    recent_messages = []
-    if convo_response.data and convo_response.data[0].get('messages'):
-        recent_messages = convo_response.data[0]['messages']
+    recent_messages = await fetch_recent_messages(user_id, 10)
+
+    # 2a. Score the user's own words against the precomputed tag embeddings;
+    # the conversation text then doubles as the matching query
+    user_text = "\n".join(m['content'] for m in recent_messages if m.get('sender') == 'user' and m.get('content'))
+    prediction = await predict_tag(user_text) if user_text else None
+    if prediction:
+        TAG_PREDICTIONS.labels('embedding').inc()
+        anticipation_data = {"tag": prediction.tag, "description": user_text, "score": prediction.score, "margin": prediction.margin}
+        return anticipation_data, prediction.tag, user_text
 
-    # 2. Call OpenAI with anticipatory prompt
+    # 2b. Ambiguous or empty conversation: ask OpenAI with the anticipatory prompt
+    TAG_PREDICTIONS.labels('llm').inc()
     prompt = ANTICIPATORY_DAILY_PROMPT
     messages = [
         {"role": "system", "content": prompt},
-        {"role": "user", "content": "\n".join(recent_messages)}
+        {"role": "user", "content": "\n".join(m['content'] for m in recent_messages if m.get('content'))}
     ]
     gpt_response = await call_gpt(messages, model="o4-mini")
     anticipation_json = gpt_response.choices[0].message.content.strip()
@@ -53,55 +71,96 @@ async def recommend_to_user(user_id, filters=None, top_k=5):
             tag = None
     except Exception:
         anticipation_data = {"description": anticipation_json}
-    # 3. Generate embedding for GPT output (use description if available)
     embedding_input = anticipation_data.get('description') if anticipation_data and 'description' in anticipation_data else anticipation_json
+    return anticipation_data, tag, embedding_input
+
+# Keep everything but the top rec in recent_recommendations (up to last 4)
+def store_recent_recommendations(user_id, recs):
+    if len(recs) <= 1:
+        return
+    supabase = get_supabase_client()
+    # Get existing recent recommendations
+    response = supabase.table('recent_recommendations').select('recommendations').eq('user_id', user_id).single().execute()
+    existing = response.data['recommendations'] if response and response.data and response.data.get('recommendations') else []
+    # Append new recs (excluding the first/top rec)
+    new_recs = recs[1:]
+    combined = existing + new_recs
+    # Keep only the last 4
+    combined = combined[-4:]
+    supabase.table('recent_recommendations').upsert({
+        'user_id': user_id,
+        'recommendations': combined,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }).execute()
+    context_cache.invalidate(user_id)
+
+# Precomputed daily recommendations (matcher/precompute_daily.py)
+PRECOMPUTED_IN_CHUNK = 200
+
+def load_precomputed(user_ids: Sequence[str], max_age_hours: float = None) -> Dict[str, List[dict]]:
+    """Fresh precomputed recommendations by user id; users without one are left out."""
+    max_age_hours = settings.PRECOMPUTE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=max_age_hours)).isoformat()
+    supabase = get_supabase_client()
+    found = {}
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), PRECOMPUTED_IN_CHUNK):
+        response = (
+            supabase.table('precomputed_recommendations').select('user_id, recommendations')
+            .in_('user_id', user_ids[start:start + PRECOMPUTED_IN_CHUNK]).gte('precomputed_at', cutoff).execute()
+        )
+        for row in response.data or []:
+            if row.get('recommendations'):
+                found[row['user_id']] = row['recommendations']
+    return found
+
+def consume_precomputed(user_id, recs):
+    # The top rec is being sent now; only then do the rest become the user's recent recommendations
+    supabase = get_supabase_client()
+    supabase.table('recent_recommendations').upsert({
+        'user_id': user_id,
+        'recommendations': recs[1:][-4:],
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }).execute()
+    supabase.table('precomputed_recommendations').delete().eq('user_id', user_id).execute()
+    context_cache.invalidate(user_id)
+
+# Main orchestration function
+@timed('matcher.recommend_to_user')
+async def recommend_to_user(user_id, filters=None, top_k=5):
+    anticipation_data, tag, embedding_input = await anticipate_need(user_id)
+    # 3. Generate embedding for GPT output (use description if available)
     embedding = await get_embedding(embedding_input)
     if not embedding:
         return anticipation_data, []
     # 4. Call Supabase RPC to match opportunities, filtering by tag if available
-    recs = match_opportunities(user_id, embedding, top_k=top_k, tag=tag, **(filters or {}))
+    recs = await amatch_opportunities(user_id, embedding, top_k=top_k, tag=tag, **(filters or {}))
     if not recs:
         return anticipation_data, []
-    # 6. Store the rest of the recs (except the first) in recent_recommendations table (up to last 4)
-    if len(recs) > 1:
-        supabase = get_supabase_client()
-        # Get existing recent recommendations
-        response = supabase.table('recent_recommendations').select('recommendations').eq('user_id', user_id).single().execute()
-        existing = response.data['recommendations'] if response and response.data and response.data.get('recommendations') else []
-        # Append new recs (excluding the first/top rec)
-        new_recs = recs[1:]
-        combined = existing + new_recs
-        # Keep only the last 4
-        combined = combined[-4:]
-        supabase.table('recent_recommendations').upsert({
-            'user_id': user_id,
-            'recommendations': combined,
-            'created_at': datetime.now(timezone.utc)
-        }).execute()
+    # 5. Store the rest of the recs (except the first) in recent_recommendations table
+    bookkeeping.defer(store_recent_recommendations, user_id, recs)
 
     return recs
 
+@timed('matcher.secondary_recommend')
 async def secondary_recommend(user_id, message, tags, filters=None, top_k=5):
-    supabase = get_supabase_client()
     embedding = await get_embedding(message)
     if not embedding:
         return None, []
-    recs = match_opportunities(user_id, embedding, top_k=top_k, tag=tags, **(filters or {}))
+    # Filtered queries are rare and their filters are not part of the cache key
+    cacheable = settings.RESULT_CACHE_ENABLED and not filters
+    if cacheable:
+        cached = result_cache.get(user_id, tags, embedding)
+        RESULT_CACHE_LOOKUPS.labels('hit' if cached else 'miss').inc()
+        if cached:
+            # The agent reads these back as current_recommendations on the next turn
+            bookkeeping.defer(store_recent_recommendations, user_id, cached)
+            return cached
+    recs = await amatch_opportunities(user_id, embedding, top_k=top_k, tag=tags, **(filters or {}))
     if not recs:
         return None, []
-    if len(recs) > 1:
-        supabase = get_supabase_client()
-        response = supabase.table('recent_recommendations').select('recommendations').eq('user_id', user_id).single().execute()
-        existing = response.data['recommendations'] if response and response.data and response.data.get('recommendations') else []
-        # Append new recs 
-        new_recs = recs[1:]
-        combined = existing + new_recs
-
-        combined = combined[-4:]
-        supabase.table('recent_recommendations').upsert({
-            'user_id': user_id,
-            'recommendations': combined,
-            'created_at': datetime.now(timezone.utc)
-        }).execute()
+    bookkeeping.defer(store_recent_recommendations, user_id, recs)
+    if cacheable:
+        result_cache.set(user_id, tags, embedding, recs)
 
     return recs
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from config import settings
+from database.supabase import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+LSH_SEED = 1536  # fixed so every process hashes a query into the same bucket
+
+
+class CachedResult(NamedTuple):
+    query: np.ndarray  # unit-length query embedding
+    recs: List[dict]
+    expires_at: float
+    catalog_version: Optional[str]
+
+
+def _tag_key(tags) -> str:
+    if not tags:
+        return ""
+    tags = [tags] if isinstance(tags, str) else tags
+    return "|".join(sorted(set(tags)))
+
+
+def _deadline_ts(value) -> Optional[float]:
+    try:
+        deadline = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return deadline.timestamp()
+
+
+def _expiry(recs: List[dict], ttl: float) -> float:
+    # An entry must not outlive the first deadline among its results
+    deadlines = [_deadline_ts(rec['deadline']) for rec in recs if rec.get('deadline')]
+    return min([time.time() + ttl, *(d for d in deadlines if d is not None)])
+
+
+class SemanticResultCache:
+    """
+    Per-user cache of `secondary_recommend` results for near-identical queries.
+
+    Entries are bucketed by the sorted tag set and a random-hyperplane LSH of
+    the query embedding, so a lookup compares against at most one stored query.
+    A bucket hit is only reused when the cosine similarity of the two queries
+    is at least `threshold`. Entries expire after `ttl` seconds or at the first
+    deadline among their results, and are dropped when the opportunities table
+    changes (polled every `catalog_check` seconds via max(updated_at)) or when
+    the user is sent one of the cached items. The poll runs in a background
+    thread, so lookups never wait on Supabase.
+    """
+
+    def __init__(self, max_users: int = None, ttl: float = None, threshold: float = None,
+                 bits: int = None, catalog_check: float = None, dim: int = None):
+        self.max_users = max_users or settings.RESULT_CACHE_USERS
+        self.ttl = ttl or settings.RESULT_CACHE_TTL
+        self.threshold = settings.RESULT_CACHE_SIMILARITY if threshold is None else threshold
+        self.catalog_check = settings.RESULT_CACHE_CATALOG_CHECK if catalog_check is None else catalog_check
+        bits = bits or settings.RESULT_CACHE_LSH_BITS
+        dim = dim or settings.VECTOR_DIM
+        self.planes = np.random.default_rng(LSH_SEED).standard_normal((bits, dim)).astype(np.float32)
+        self._users = OrderedDict()  # user_id -> {bucket key: CachedResult}
+        self._lock = threading.Lock()
+        self._catalog_version = None
+        self._catalog_checked_at = 0.0
+        self._catalog_refreshing = False
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, tags, query: np.ndarray) -> str:
+        bits = (self.planes @ query) > 0
+        return f"{_tag_key(tags)}#{np.packbits(bits).tobytes().hex()}"
+
+    @staticmethod
+    def _unit(embedding) -> Optional[np.ndarray]:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else None
+
+    def catalog_version(self) -> Optional[str]:
+        """Last seen max(updated_at); starts a background re-read when it is older than catalog_check."""
+        with self._lock:
+            now = time.monotonic()
+            stale = now - self._catalog_checked_at >= self.catalog_check and not self._catalog_refreshing
+            if stale:
+                self._catalog_checked_at = now
+                self._catalog_refreshing = True
+        if stale:
+            threading.Thread(target=self._refresh_catalog_version, daemon=True).start()
+        return self._catalog_version
+
+    def _refresh_catalog_version(self) -> None:
+        try:
+            self.refresh_catalog_version()
+        finally:
+            self._catalog_refreshing = False
+
+    def refresh_catalog_version(self) -> Optional[str]:
+        """Read max(opportunities.updated_at) now, clearing the cache if it moved. Blocking."""
+        try:
+            response = (
+                get_supabase_client().table('opportunities').select('updated_at')
+                .order('updated_at', desc=True).limit(1).execute()
+            )
+            version = response.data[0]['updated_at'] if response.data else None
+        except Exception as e:
+            logger.warning(f"Could not read opportunities version for result cache: {e}")
+            return self._catalog_version
+        if version != self._catalog_version:
+            if self._catalog_version is not None:
+                logger.info(f"Opportunities changed ({self._catalog_version} -> {version}); clearing result cache")
+                self.clear()
+            self._catalog_version = version
+        return version
+
+    def get(self, user_id: str, tags, embedding) -> Optional[List[dict]]:
+        query = self._unit(embedding)
+        if query is None:
+            return None
+        version = self.catalog_version()
+        key = self._bucket(tags, query)
+        with self._lock:
+            entries = self._users.get(user_id)
+            entry = entries.get(key) if entries else None
+            if entry is not None and (entry.expires_at <= time.time() or entry.catalog_version != version):
+                del entries[key]
+                entry = None
+            if entry is not None:
+                self._users.move_to_end(user_id)
+        if entry is None or float(entry.query @ query) < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.recs
+
+    def set(self, user_id: str, tags, embedding, recs: List[dict]) -> None:
+        query = self._unit(embedding)
+        if query is None or not recs:
+            return
+        entry = CachedResult(query, recs, _expiry(recs, self.ttl), self._catalog_version)
+        with self._lock:
+            self._users.setdefault(user_id, {})[self._bucket(tags, query)] = entry
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "users": len(self._users),
+        }
+
+
+result_cache = SemanticResultCache()
@@ -1,7 +1,17 @@
 import asyncio
-from agents.conversation_agent import send_daily_recommendation
+import argparse
+import time
+import zlib
+from agents.conversation_agent import send_daily_recommendation, queue_daily_sms
+from agents.callgpt import get_embedding
+from matcher.recommendation_engine import (
+    anticipate_need, consume_precomputed, load_precomputed, record_recommendation, store_recent_recommendations
+)
+from matcher.supabase_matcher import amatch_opportunities
+from database.bookkeeping import bookkeeping
 from database.supabase import get_supabase_client
-from datetime import datetime, timezone
+from config import settings
+from datetime import datetime, timedelta, timezone
 import pytz
 import logging
 
@@ -23,37 +33,195 @@ def get_all_user_profiles(batch_size=1000):
         offset += batch_size
     return all_profiles
 
-def clear_recent_recommendations():
+def clear_recent_recommendations(user_ids, chunk_size=200):
+    # One set-based update per chunk of due users instead of a read plus an update per row
     supabase = get_supabase_client()
-    response = supabase.table('recent_recommendations').select('user_id, recommendations').execute()
-    if response.data:
-        for row in response.data:
-            user_id = row['user_id']
-            recs = row.get('recommendations', [])
-            if recs:
-                # Clear recommendations for this user
-                supabase.table('recent_recommendations').update({
-                    'recommendations': []
-                }).eq('user_id', user_id).execute()
-                logger.info(f"Cleared recent recommendations for {user_id}")
-
-async def main():
-    clear_recent_recommendations()
-    now_utc = datetime.now(timezone.utc).replace(tzinfo=pytz.utc)
-    user_profiles = get_all_user_profiles()
-    for profile in user_profiles:
+    cleared = 0
+    for start in range(0, len(user_ids), chunk_size):
+        response = (
+            supabase.table('recent_recommendations').update({'recommendations': []})
+            .in_('user_id', user_ids[start:start + chunk_size])
+            .execute()
+        )
+        cleared += len(response.data or [])
+    logger.info(f"Cleared recent recommendations for {cleared} users")
+
+def in_shard(user_id, shard):
+    # shard is (index, count); crc32 keeps the split stable across machines and runs
+    index, count = shard
+    return zlib.crc32(user_id.encode()) % count == index
+
+def parse_shard(value):
+    index, count = (int(part) for part in value.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard {value}, expected i/N with 0 <= i < N")
+    return index, count
+
+def users_due_now(shard=None, hours_ahead=0):
+    # hours_ahead > 0 finds users whose send hour is coming up (see precompute_daily)
+    now_utc = (datetime.now(timezone.utc) + timedelta(hours=hours_ahead)).replace(tzinfo=pytz.utc)
+    due = []
+    for profile in get_all_user_profiles():
         user_id = profile['user_id']
+        if shard and not in_shard(user_id, shard):
+            continue
         user_tz = profile.get('timezone')
         if not user_tz:
             logger.warning(f"No timezone for user {user_id}, skipping.")
             continue  # skip users without timezone info
         try:
             user_now = now_utc.astimezone(pytz.timezone(user_tz))
-            if user_now.hour == 8:
-                logger.info(f"Sending daily recommendation to {user_id} (timezone: {user_tz})")
-                await send_daily_recommendation(user_id)
+            if user_now.hour == settings.DAILY_SEND_HOUR:
+                due.append(user_id)
         except Exception as e:
             logger.error(f"Timezone error for user {user_id}: {e}")
+    return due
+
+class PipelineStats:
+    def __init__(self):
+        self.latencies = {}
+        self.completed = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def record(self, stage, seconds):
+        self.latencies.setdefault(stage, []).append(seconds)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        logger.info(
+            f"Daily pipeline finished: {self.completed} sent, {self.failed} dropped in {elapsed:.1f}s "
+            f"({self.completed / elapsed if elapsed else 0:.2f} users/s)"
+        )
+        for stage in PIPELINE_STAGES:
+            samples = sorted(self.latencies.get(stage, []))
+            if not samples:
+                continue
+            p50 = samples[len(samples) // 2]
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            logger.info(
+                f"  {stage:<10} n={len(samples)} mean={sum(samples) / len(samples) * 1000:.0f}ms "
+                f"p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms"
+            )
+
+# Each stage takes the item produced by the previous one and returns the next item,
+# or None to drop the user from the pipeline.
+async def _anticipate(user_id):
+    anticipation_data, tag, embedding_input = await anticipate_need(user_id)
+    return user_id, tag, embedding_input
+
+async def _embed(item):
+    user_id, tag, embedding_input = item
+    embedding = await get_embedding(embedding_input)
+    if not embedding:
+        return None
+    return user_id, tag, embedding
+
+async def _match(item):
+    user_id, tag, embedding = item
+    recs = await amatch_opportunities(user_id, embedding, 5, tag)
+    if not recs:
+        logger.info(f"No recommendations found for user {user_id}")
+        return None
+    return user_id, recs
+
+async def _record(item):
+    user_id, recs = item
+    top_rec = recs[0]
+    await asyncio.to_thread(store_recent_recommendations, user_id, recs)
+    await asyncio.to_thread(record_recommendation, user_id, top_rec['id'], top_rec.get('score', 0))
+    return user_id, top_rec
+
+async def _enqueue_sms(item):
+    user_id, top_rec = item
+    sent = await asyncio.to_thread(queue_daily_sms, user_id, top_rec)
+    return user_id if sent else None
+
+PIPELINE_STAGES = {
+    'anticipate': _anticipate,
+    'embed': _embed,
+    'match': _match,
+    'record': _record,
+    'sms': _enqueue_sms,
+}
+
+async def run_pipeline(user_ids, concurrency=None):
+    """Push users through anticipate -> embed -> match -> record -> sms with
+    `concurrency` workers per stage and bounded queues between stages."""
+    concurrency = concurrency or settings.DAILY_CONCURRENCY
+    stats = PipelineStats()
+    names = list(PIPELINE_STAGES)
+    queues = [asyncio.Queue(maxsize=concurrency) for _ in names]
+
+    async def worker(stage_index):
+        name = names[stage_index]
+        func = PIPELINE_STAGES[name]
+        inbox = queues[stage_index]
+        outbox = queues[stage_index + 1] if stage_index + 1 < len(queues) else None
+        while True:
+            item = await inbox.get()
+            try:
+                start = time.perf_counter()
+                result = await func(item)
+                stats.record(name, time.perf_counter() - start)
+            except Exception as e:
+                logger.error(f"Daily pipeline stage {name} failed: {e}")
+                result = None
+            if result is None:
+                stats.failed += 1
+            elif outbox is not None:
+                await outbox.put(result)
+            else:
+                stats.completed += 1
+            inbox.task_done()
+
+    workers = [
+        asyncio.create_task(worker(i))
+        for i in range(len(names))
+        for _ in range(concurrency)
+    ]
+    for user_id in user_ids:
+        await queues[0].put(user_id)
+    for queue in queues:
+        await queue.join()
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    stats.report()
+    return stats
+
+async def send_precomputed(user_id, recs):
+    top_rec = recs[0]
+    await asyncio.to_thread(consume_precomputed, user_id, recs)
+    await asyncio.to_thread(record_recommendation, user_id, top_rec['id'], top_rec.get('score', 0))
+    return await asyncio.to_thread(queue_daily_sms, user_id, top_rec)
+
+async def main(pipeline=False, concurrency=None, shard=None):
+    user_ids = users_due_now(shard)
+    clear_recent_recommendations(user_ids)
+    precomputed = load_precomputed(user_ids)
+    for user_id, recs in precomputed.items():
+        try:
+            await send_precomputed(user_id, recs)
+        except Exception as e:
+            logger.error(f"Sending precomputed recommendation failed for user {user_id}: {e}")
+    user_ids = [user_id for user_id in user_ids if user_id not in precomputed]
+    logger.info(f"{len(precomputed)} users served from precomputed results, {len(user_ids)} left to compute")
+    if pipeline:
+        await run_pipeline(user_ids, concurrency)
+    else:
+        for user_id in user_ids:
+            logger.info(f"Sending daily recommendation to {user_id}")
+            try:
+                await send_daily_recommendation(user_id)
+            except Exception as e:
+                logger.error(f"Daily recommendation failed for user {user_id}: {e}")
+    await asyncio.to_thread(bookkeeping.flush)
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Send the daily recommendation to every user at DAILY_SEND_HOUR local time")
+    parser.add_argument('--pipeline', action='store_true', help="Run users through the concurrent staged pipeline")
+    parser.add_argument('--concurrency', type=int, default=None, help="Workers per pipeline stage (default: DAILY_CONCURRENCY)")
+    parser.add_argument('--shard', type=parse_shard, default=None, help="Only handle shard i of N, e.g. 0/4")
+    args = parser.parse_args()
+    asyncio.run(main(pipeline=args.pipeline, concurrency=args.concurrency, shard=args.shard))
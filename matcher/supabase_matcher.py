@@ -1,11 +1,10 @@
+import asyncio
 import os
-from supabase import create_client, Client
 from config import settings 
+from database.supabase import get_supabase_client
+from metrics import timed
 
-# Initialize Supabase client
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
-
-def match_opportunities(user_id, embedding, top_k=5, tag=None, **kwargs):
+def match_opportunities_rpc(user_id, embedding, top_k=5, tag=None, **kwargs):
     params = {
         "p_user_id": user_id,
         "p_embedding": embedding,
@@ -13,7 +12,22 @@ def match_opportunities(user_id, embedding, top_k=5, tag=None, **kwargs):
     }
     if tag:
         params["p_tag"] = tag
-    return supabase.rpc("match_opportunities", params).execute().data
+    return get_supabase_client().rpc("match_opportunities", params).execute().data
+
+@timed('matcher.match_opportunities')
+def match_opportunities(user_id, embedding, top_k=5, tag=None, **kwargs):
+    if settings.MATCHER_BACKEND == "faiss":
+        from matcher.vector_index import match_opportunities as match_local
+        return match_local(user_id, embedding, top_k=top_k, tag=tag, **kwargs)
+    return match_opportunities_rpc(user_id, embedding, top_k=top_k, tag=tag, **kwargs)
+
+@timed('matcher.match_opportunities')
+async def amatch_opportunities(user_id, embedding, top_k=5, tag=None, **kwargs):
+    # Async callers use this; "pg" is async-only, the other backends run in a thread
+    if settings.MATCHER_BACKEND == "pg":
+        from matcher.pg_matcher import match_opportunities as match_pg
+        return await match_pg(user_id, embedding, top_k=top_k, tag=tag, **kwargs)
+    return await asyncio.to_thread(match_opportunities.__wrapped__, user_id, embedding, top_k, tag, **kwargs)
 
 # Example usage:
-# matches = match_opportunities(user_id, user_embedding, top_k=5)
\ No newline at end of file
+# matches = match_opportunities(user_id, user_embedding, top_k=5)
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from agents.callgpt import get_embedding
+from clients import get_openai_client
+from config import settings
+from matcher.tags import TAGS
+
+logger = logging.getLogger(__name__)
+
+# Bare tag names embed poorly ("SEO", "Hardware"); a short frame puts them in
+# the same space as what users say about their needs
+TAG_TEMPLATE = "A founder or student looking for {tag} opportunities, resources or advice"
+
+
+class TagPrediction(NamedTuple):
+    tag: str
+    score: float
+    margin: float  # top score minus runner-up
+
+
+def _fingerprint(model: str) -> str:
+    key = "\0".join([model, TAG_TEMPLATE, *TAGS])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class TagPredictor:
+    """
+    Scores a conversation embedding against every tag in matcher/tags.py.
+
+    Tag embeddings are computed once (one batched embeddings call) and kept in
+    TAG_EMBEDDINGS_PATH, keyed by the embedding model and tag list, so the
+    daily run only pays for a (tags x dim) @ (dim,) product per user.
+    """
+
+    def __init__(self, matrix: np.ndarray, tags: List[str] = None, margin: float = None):
+        self.tags = list(tags or TAGS)
+        self.matrix = _normalize(np.asarray(matrix, dtype=np.float32))
+        self.margin = settings.TAG_MARGIN_THRESHOLD if margin is None else margin
+
+    @classmethod
+    def load(cls, path: str = None, model: str = None) -> Optional['TagPredictor']:
+        path = path or settings.TAG_EMBEDDINGS_PATH
+        model = model or settings.EMBEDDING_MODEL
+        if not os.path.exists(path):
+            return None
+        data = np.load(path, allow_pickle=False)
+        if str(data["fingerprint"]) != _fingerprint(model):
+            logger.info(f"Tag embeddings at {path} are for another model or tag list; rebuilding")
+            return None
+        return cls(data["matrix"])
+
+    @classmethod
+    async def build(cls, path: str = None, model: str = None) -> 'TagPredictor':
+        path = path or settings.TAG_EMBEDDINGS_PATH
+        model = model or settings.EMBEDDING_MODEL
+        client = get_openai_client()
+        response = await client.embeddings.create(model=model, input=[TAG_TEMPLATE.format(tag=tag) for tag in TAGS])
+        matrix = np.asarray([row.embedding for row in sorted(response.data, key=lambda r: r.index)], dtype=np.float32)
+        # Workers that start together may all build; each writes its own temp file and swaps it in whole
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, matrix=matrix, fingerprint=_fingerprint(model))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info(f"Embedded {len(TAGS)} tags with {model} into {path}")
+        return cls(matrix)
+
+    def scores(self, embeddings) -> np.ndarray:
+        """Cosine similarity of each row of `embeddings` (or a single vector) to every tag."""
+        return _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32))) @ self.matrix.T
+
+    def predict_many(self, embeddings) -> List[TagPrediction]:
+        scores = self.scores(embeddings)
+        top2 = np.argpartition(-scores, 1, axis=1)[:, :2]
+        predictions = []
+        for row, (a, b) in zip(scores, top2):
+            best, second = (a, b) if row[a] >= row[b] else (b, a)
+            predictions.append(TagPrediction(self.tags[best], float(row[best]), float(row[best] - row[second])))
+        return predictions
+
+    def predict(self, embedding) -> TagPrediction:
+        return self.predict_many(embedding)[0]
+
+    def is_confident(self, prediction: TagPrediction) -> bool:
+        return prediction.margin >= self.margin
+
+
+_predictor = None
+_lock = threading.Lock()
+_build_locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock, as in clients._for_loop
+
+
+def _build_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if loop not in _build_locks:
+            _build_locks[loop] = asyncio.Lock()
+        return _build_locks[loop]
+
+
+async def get_tag_predictor() -> Optional[TagPredictor]:
+    """Shared predictor, loading or building the tag embeddings on first use."""
+    global _predictor
+    if _predictor is not None or not settings.TAG_PREDICTION_ENABLED:
+        return _predictor
+    async with _build_lock():
+        if _predictor is None:
+            try:
+                _predictor = TagPredictor.load() or await TagPredictor.build()
+            except Exception as e:
+                logger.error(f"Could not prepare tag embeddings: {str(e)}")
+                return None
+    return _predictor
+
+
+async def predict_tag(conversation_text: str) -> Optional[TagPrediction]:
+    """Confident tag for the conversation, or None when the LLM should decide."""
+    predictor = await get_tag_predictor()
+    if predictor is None or not conversation_text.strip():
+        return None
+    embedding = await get_embedding(conversation_text)
+    if not embedding:
+        return None
+    prediction = predictor.predict(embedding)
+    if not predictor.is_confident(prediction):
+        logger.info(f"Tag margin {prediction.margin:.3f} for {prediction.tag} below {predictor.margin}; falling back to the LLM")
+        return None
+    return prediction
+
+
+async def _rebuild():
+    predictor = await TagPredictor.build()
+    logger.info(f"Tag matrix {predictor.matrix.shape}, margin threshold {predictor.margin}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompute tag embeddings for the daily tag predictor")
+    parser.parse_args()
+    asyncio.run(_rebuild())
@@ -0,0 +1,392 @@
+import fcntl
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import faiss
+import numpy as np
+
+from config import settings
+from database.supabase import get_supabase_client
+from matcher.tags import TAGS
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+SENT_CACHE_TTL = 300  # seconds before a user's sent set is re-read from user_recommendations
+SENT_CACHE_USERS = 10000  # users whose sent sets are kept, least recently searched evicted first
+
+
+def _to_vector(embedding) -> Optional[np.ndarray]:
+    # PostgREST returns pgvector columns as text, e.g. "[0.1,0.2,...]"
+    if embedding is None:
+        return None
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    vec = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    if vec.shape[1] != settings.VECTOR_DIM:
+        return None
+    faiss.normalize_L2(vec)
+    return vec
+
+
+def _deadline_ts(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        deadline = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return deadline.timestamp()
+
+
+def _normalize_tags(tag) -> List[str]:
+    # Passed through as-is, like the rpc and pg backends, so an unknown tag matches nothing
+    if not tag:
+        return []
+    tags = [tag] if isinstance(tag, str) else list(tag)
+    unknown = [t for t in tags if t not in TAGS]
+    if unknown:
+        logger.warning(f"Searching the vector index with unknown tags {unknown}")
+    return tags
+
+
+class OpportunityIndex:
+    """
+    Local cosine-similarity index over the `opportunities` table.
+
+    The bulk of the vectors live in a read-only, memory-mapped FAISS file at
+    `settings.VECTOR_INDEX_PATH`. Opportunities added or changed since that file
+    was written go into a small in-memory delta index, and replaced rows are
+    masked out of the base index until the next `rebuild()`. Rows past their
+    deadline are masked at query time; deleted rows on `reconcile()`.
+
+    The index and meta files are only replaced under an exclusive lock on
+    `<index_path>.lock` and read under a shared one, so workers starting
+    together build the file once and never map a half-written pair.
+    """
+
+    def __init__(self, index_path: str = None, dim: int = None):
+        self.index_path = index_path or settings.VECTOR_INDEX_PATH
+        self.meta_path = self.index_path + ".meta.json"
+        self.lock_path = self.index_path + ".lock"
+        self.dim = dim or settings.VECTOR_DIM
+        self._lock = threading.RLock()
+        self._base = None
+        self._delta = self._new_index()
+        self._next_id = 0
+        self._rows: Dict[int, Dict[str, Any]] = {}  # internal id -> row without embedding
+        self._ids_by_opp: Dict[str, int] = {}  # opportunity id -> internal id
+        self._ids_by_tag: Dict[str, Set[int]] = {t: set() for t in TAGS}
+        self._masked: Set[int] = set()
+        self._expiries: List[tuple] = []  # heap of (deadline timestamp, internal id)
+        self._watermark: Optional[str] = None
+        self._sent: OrderedDict = OrderedDict()  # user_id -> (loaded_at, set of opportunity ids), LRU
+        self._sent_lock = threading.Lock()
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._ids_by_opp)
+
+    # Loading and persistence
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _files_exist(self) -> bool:
+        return os.path.exists(self.index_path) and os.path.exists(self.meta_path)
+
+    def load(self) -> bool:
+        """Memory-map the on-disk index. Returns False if no index has been built yet."""
+        with self._file_lock(exclusive=False):
+            if not self._files_exist():
+                return False
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            # The mapping keeps the old inode alive if a rebuild replaces the file later
+            base = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        with self._lock:
+            self._base = base
+            self._delta = self._new_index()
+            self._masked = set()
+            self._expiries = []
+            self._rows = {}
+            self._ids_by_opp = {}
+            self._ids_by_tag = {t: set() for t in TAGS}
+            for internal_id, row in meta["rows"].items():
+                self._register(int(internal_id), row)
+            self._next_id = meta["next_id"]
+            self._watermark = meta.get("watermark")
+        logger.info(f"Loaded opportunity index with {self.ntotal} vectors from {self.index_path}")
+        return True
+
+    def load_or_build(self) -> None:
+        """Load the index file, building it first if no process has yet."""
+        if self.load():
+            return
+        with self._file_lock(exclusive=True):
+            # Another worker may have built it while this one waited for the lock
+            if not self._files_exist():
+                self._build()
+        self.load()
+
+    def rebuild(self) -> None:
+        """Build the full index from Supabase, write it to disk and re-map it."""
+        with self._file_lock(exclusive=True):
+            self._build()
+        self.load()
+
+    def _write_atomic(self, path: str, write) -> None:
+        # Unique temp name in the target directory, so concurrent writers never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _build(self) -> None:
+        """Write the index and meta files from Supabase. Caller holds the exclusive file lock."""
+        index = self._new_index()
+        rows = {}
+        next_id = 0
+        watermark = None
+        for row in self._fetch_rows():
+            vec = _to_vector(row.pop('embedding', None))
+            if vec is None:
+                continue
+            index.add_with_ids(vec, np.array([next_id], dtype=np.int64))
+            rows[str(next_id)] = row
+            next_id += 1
+            if row.get('updated_at') and (watermark is None or row['updated_at'] > watermark):
+                watermark = row['updated_at']
+
+        def write_meta(path):
+            with open(path, "w") as f:
+                json.dump({"rows": rows, "next_id": next_id, "watermark": watermark}, f, default=str)
+
+        self._write_atomic(self.index_path, lambda path: faiss.write_index(index, path))
+        self._write_atomic(self.meta_path, write_meta)
+        logger.info(f"Rebuilt opportunity index with {next_id} vectors")
+
+    def refresh(self) -> int:
+        """Pull opportunities changed since the last load/refresh into the delta index."""
+        changed = 0
+        for row in self._fetch_rows(since=self._watermark):
+            vec = _to_vector(row.pop('embedding', None))
+            with self._lock:
+                self._unregister(str(row['id']))
+                if vec is not None:
+                    internal_id = self._next_id
+                    self._next_id += 1
+                    self._delta.add_with_ids(vec, np.array([internal_id], dtype=np.int64))
+                    self._register(internal_id, row)
+                if row.get('updated_at') and (self._watermark is None or row['updated_at'] > self._watermark):
+                    self._watermark = row['updated_at']
+            changed += 1
+        if changed:
+            logger.info(f"Refreshed {changed} opportunities into the vector index")
+        return changed
+
+    def reconcile(self) -> int:
+        """Drop opportunities that were deleted from Supabase. Returns how many were removed."""
+        live = set()
+        for row in self._fetch_rows(columns='id', order='id'):
+            live.add(str(row['id']))
+        with self._lock:
+            deleted = [opp_id for opp_id in self._ids_by_opp if opp_id not in live]
+        self.remove(deleted)
+        if deleted:
+            logger.info(f"Removed {len(deleted)} deleted opportunities from the vector index")
+        return len(deleted)
+
+    def remove(self, opportunity_ids: Iterable[str]) -> None:
+        with self._lock:
+            for opp_id in opportunity_ids:
+                self._unregister(str(opp_id))
+
+    def _register(self, internal_id: int, row: Dict[str, Any]) -> None:
+        self._rows[internal_id] = row
+        self._ids_by_opp[str(row['id'])] = internal_id
+        for t in row.get('tags') or []:
+            self._ids_by_tag.setdefault(t, set()).add(internal_id)
+        deadline = _deadline_ts(row.get('deadline'))
+        if deadline is not None:
+            heapq.heappush(self._expiries, (deadline, internal_id))
+
+    def _mask_expired(self) -> None:
+        # Caller holds self._lock
+        now = time.time()
+        while self._expiries and self._expiries[0][0] < now:
+            _, internal_id = heapq.heappop(self._expiries)
+            row = self._rows.get(internal_id)
+            if row is not None:
+                self._unregister(str(row['id']))
+
+    def _unregister(self, opp_id: str) -> None:
+        internal_id = self._ids_by_opp.pop(opp_id, None)
+        if internal_id is None:
+            return
+        row = self._rows.pop(internal_id, {})
+        for t in row.get('tags') or []:
+            self._ids_by_tag.get(t, set()).discard(internal_id)
+        self._masked.add(internal_id)
+
+    def _fetch_rows(self, since: Optional[str] = None, columns: str = '*', order: str = 'updated_at'):
+        supabase = get_supabase_client()
+        offset = 0
+        while True:
+            query = supabase.table('opportunities').select(columns)
+            if since:
+                query = query.gt('updated_at', since)
+            response = query.order(order).range(offset, offset + PAGE_SIZE - 1).execute()
+            batch = response.data or []
+            yield from batch
+            if len(batch) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+    # Already-sent exclusion
+
+    def sent_ids(self, user_id: str) -> Set[str]:
+        with self._sent_lock:
+            cached = self._sent.get(user_id)
+            if cached and time.monotonic() - cached[0] < SENT_CACHE_TTL:
+                self._sent.move_to_end(user_id)
+                return cached[1]
+        supabase = get_supabase_client()
+        sent, offset = set(), 0
+        while True:
+            response = (
+                supabase.table('user_recommendations').select('item_id').eq('user_id', user_id)
+                .order('item_id').range(offset, offset + PAGE_SIZE - 1).execute()
+            )
+            batch = response.data or []
+            sent.update(str(r['item_id']) for r in batch)
+            if len(batch) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        with self._sent_lock:
+            self._sent[user_id] = (time.monotonic(), sent)
+            self._sent.move_to_end(user_id)
+            while len(self._sent) > SENT_CACHE_USERS:
+                self._sent.popitem(last=False)
+        return sent
+
+    def note_sent(self, user_id: str, item_id: str) -> None:
+        with self._sent_lock:
+            cached = self._sent.get(user_id)
+            if cached:
+                cached[1].add(str(item_id))
+
+    # Search
+
+    def search(self, query, top_k: int = 5, tag=None, exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        vec = _to_vector(query)
+        if vec is None:
+            return []
+        with self._lock:
+            self._mask_expired()
+            excluded = set(self._masked)
+            excluded.update(self._ids_by_opp[i] for i in exclude if i in self._ids_by_opp)
+            tags = _normalize_tags(tag)
+            if tags:
+                allowed = set().union(*(self._ids_by_tag.get(t, set()) for t in tags)) - excluded
+                if not allowed:
+                    return []
+                selector = faiss.IDSelectorBatch(np.fromiter(allowed, dtype=np.int64))
+            elif excluded:
+                selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.fromiter(excluded, dtype=np.int64)))
+            else:
+                selector = None
+            params = faiss.SearchParameters(sel=selector) if selector is not None else None
+
+            hits = []
+            for index in (self._base, self._delta):
+                if index is None or index.ntotal == 0:
+                    continue
+                scores, ids = index.search(vec, min(top_k, index.ntotal), params=params)
+                hits.extend((float(s), int(i)) for s, i in zip(scores[0], ids[0]) if i != -1)
+            hits.sort(key=lambda h: h[0], reverse=True)
+
+            results = []
+            for score, internal_id in hits[:top_k]:
+                row = self._rows.get(internal_id)
+                if row is None:
+                    continue
+                results.append({**row, 'distance': 1.0 - score})
+            return results
+
+
+_index: Optional[OpportunityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_opportunity_index() -> OpportunityIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = OpportunityIndex()
+            index.load_or_build()
+            index.refresh()
+            _index = index
+        return _index
+
+
+def start_index_refresher(interval: int = None, reconcile_interval: int = None) -> threading.Thread:
+    """
+    Keep the process-wide index current by polling `opportunities.updated_at`,
+    and drop deleted opportunities every `reconcile_interval` seconds.
+    """
+    interval = interval or settings.VECTOR_INDEX_REFRESH_SECONDS
+    reconcile_interval = reconcile_interval or settings.VECTOR_INDEX_RECONCILE_SECONDS
+
+    def _loop():
+        last_reconcile = time.monotonic()
+        while True:
+            time.sleep(interval)
+            try:
+                index = get_opportunity_index()
+                index.refresh()
+                if time.monotonic() - last_reconcile >= reconcile_interval:
+                    index.reconcile()
+                    last_reconcile = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error refreshing opportunity index: {str(e)}")
+
+    thread = threading.Thread(target=_loop, daemon=True)
+    thread.start()
+    return thread
+
+
+def match_opportunities(user_id, embedding, top_k=5, tag=None, **kwargs):
+    index = get_opportunity_index()
+    return index.search(embedding, top_k=top_k, tag=tag, exclude=index.sent_ids(user_id))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    OpportunityIndex().rebuild()
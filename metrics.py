@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, start_http_server
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide Prometheus metrics for the SMS pipeline.
+#
+# Stages are labelled with dotted names so a slow reply can be traced to its
+# backend: e.g. twilio.process_message > agent.converse_with_user > openai.chat.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_SECONDS = Histogram(
+    'sms_stage_duration_seconds', 'Time spent in each pipeline stage', ['stage'], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter('sms_stage_errors_total', 'Exceptions raised out of a pipeline stage', ['stage'])
+OPENAI_RETRIES = Counter('openai_retries_total', 'OpenAI calls retried after a rate limit', ['endpoint'])
+OPENAI_FAILURES = Counter('openai_failures_total', 'OpenAI calls that gave up and returned None', ['endpoint'])
+RATE_LIMIT_WAIT = Counter(
+    'openai_rate_limit_wait_seconds_total', 'Time spent waiting on the local throttler or rate-limit backoff', ['endpoint', 'reason']
+)
+OPENAI_TOKENS = Counter('openai_tokens_total', 'Tokens reported by OpenAI usage', ['model', 'kind'])
+EMBEDDING_CACHE_LOOKUPS = Counter('embedding_cache_lookups_total', 'Embedding cache lookups', ['result'])
+RESULT_CACHE_LOOKUPS = Counter('result_cache_lookups_total', 'secondary_recommend result cache lookups', ['result'])
+TAG_PREDICTIONS = Counter('tag_predictions_total', 'Daily tag picks by source (embedding or llm fallback)', ['source'])
+SMS_SENT = Counter('sms_sent_total', 'Outbound SMS attempts by sender and result (sent, retried, failed)', ['sender', 'result'])
+SMS_QUEUED_SECONDS = Histogram(
+    'sms_queued_seconds', 'Time from enqueueing an outbound SMS to Twilio accepting it', buckets=LATENCY_BUCKETS
+)
+SMS_THROTTLE_SECONDS = Counter('sms_throttle_wait_seconds_total', 'Time outbound SMS waited on a sender token bucket', ['sender'])
+ONBOARDING_PREFETCH = Counter('onboarding_prefetch_total', 'Final onboarding answers that found (hit) or lacked (miss) a step-1 background lookup', ['result'])
+INTENT_ROUTES = Counter('intent_routes_total', 'Turns routed by the local intent classifier', ['intent', 'route'])
+
+QUEUES = ('twilio_messages', 'onboarding_queue', 'outbound_sms', 'user_feedback')
+
+
+class QueueDepthCollector:
+    """Reads Redis list lengths at scrape time so the gauge is never stale."""
+
+    def __init__(self, queues=QUEUES):
+        self.queues = queues
+
+    def collect(self):
+        gauge = GaugeMetricFamily('redis_queue_depth', 'Messages waiting in a Redis queue', labels=['queue'])
+        redis = settings.redis_client
+        if redis is not None:
+            for queue in self.queues:
+                try:
+                    gauge.add_metric([queue], redis.llen(queue))
+                except Exception as e:
+                    logger.warning(f"Could not read depth of {queue}: {e}")
+        yield gauge
+
+
+REGISTRY.register(QueueDepthCollector())
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def timed(stage: str):
+    """Decorator form of `span` for sync and async functions."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(model: str, usage) -> None:
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) or 0
+    OPENAI_TOKENS.labels(model, 'prompt').inc(getattr(usage, 'prompt_tokens', 0) or 0)
+    OPENAI_TOKENS.labels(model, 'cached').inc(cached)
+    OPENAI_TOKENS.labels(model, 'completion').inc(getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def _registry():
+    # Under gunicorn each worker has its own counters; with PROMETHEUS_MULTIPROC_DIR
+    # set they are written to shared files and merged here on every scrape.
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(QueueDepthCollector())
+        return registry
+    return REGISTRY
+
+
+def render():
+    """(body, content type) for a /metrics response."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int = None) -> None:
+    port = port or settings.WORKER_METRICS_PORT
+    if not port:
+        return
+    try:
+        start_http_server(port, registry=_registry())
+        logger.info(f"Serving worker metrics on :{port}/metrics")
+    except OSError as e:
+        logger.warning(f"Could not start metrics server on :{port}: {e}")
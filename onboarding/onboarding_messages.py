@@ -1,10 +1,12 @@
+import asyncio
 import logging
 from typing import Dict, Any, Optional, List, Union
 from config import settings
-from database.supabase import get_supabase_client
+from database.supabase import get_async_supabase_client
 from profiles.profiles import get_user_profile, create_user_profile, update_user_profile
 from agents.perplexity_client import query_user_background
 from agents.callgpt import get_embedding
+from onboarding.prefetch import start_prefetch, take_prefetched, merge_final_answer
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +22,8 @@ async def process_onboarding_message(
     current_profile: Dict[str, Any] = None,
 ) -> tuple[Dict[str, Any], str, bool]:
     try:
-        supabase = get_supabase_client()
-        state_response = supabase.table('user_states').select('accumulated_messages').eq('phone_number', phone_number).execute()
+        supabase = get_async_supabase_client()
+        state_response = await supabase.table('user_states').select('accumulated_messages').eq('phone_number', phone_number).execute()
         
         if not state_response.data:
             logger.error(f"No state found for user {phone_number}, either error in database fetch or user state not created (error in twilio_routes.py onboarding)")
@@ -42,24 +44,35 @@ async def process_onboarding_message(
         db_messages.append(message_to_store)
         
         # Update the accumulated messages in the database
-        supabase.table('user_states').update({
+        await supabase.table('user_states').update({
             'accumulated_messages': db_messages
         }).eq('phone_number', phone_number).execute()
         
+        if step == 1:
+            # Name and background are all the lookup needs; start it while the user answers the last question
+            start_prefetch(phone_number, db_messages)
+
         if step == 2:
-            extracted_info = await query_user_background(db_messages)
-            logger.info(f"Extracted info: {extracted_info}")
+            prefetched = await take_prefetched(phone_number, db_messages[:-1])
+            if prefetched:
+                extracted_info = merge_final_answer(prefetched['profile'], message_to_store)
+                logger.info(f"Using prefetched background for {phone_number}: {extracted_info}")
+            else:
+                extracted_info = await query_user_background(db_messages)
+                logger.info(f"Extracted info: {extracted_info}")
 
             updated_profile = {**current_profile, **extracted_info}
-            # Generate embedding
-            if updated_profile.get('bio'):
-                embedding = await get_embedding(updated_profile['bio'])
-                if embedding:
-                    updated_profile['embedding'] = embedding
             updated_profile['user_id'] = phone_number
 
+            async def embed_bio():
+                bio = updated_profile.get('bio')
+                return await get_embedding(bio) if bio else None
+
             try:
-                existing_profile = await get_user_profile(phone_number)
+                # The embedding and the profile lookup don't depend on each other
+                embedding, existing_profile = await asyncio.gather(embed_bio(), get_user_profile(phone_number))
+                if embedding:
+                    updated_profile['embedding'] = embedding
                 
                 if existing_profile:
                     # Update existing profile
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from agents.perplexity_client import query_user_background
+from config import settings
+from metrics import ONBOARDING_PREFETCH
+
+logger = logging.getLogger(__name__)
+
+# Speculative background lookup: the step-1 answer (name + background) is all
+# Perplexity really needs, so the search starts then and is ready, or nearly,
+# by the time the user sends the step-2 answer. The bio is not embedded here:
+# the step-2 answer is nearly always merged into it, so only the final bio is.
+
+KEY_PREFIX = "onboarding_prefetch:"
+
+_tasks: Dict[str, asyncio.Task] = {}  # phone number -> prefetch still running in this process
+
+
+def messages_key(messages: List[str]) -> str:
+    return hashlib.sha256("\0".join(messages).encode("utf-8")).hexdigest()
+
+
+async def _prefetch(phone_number: str, messages: List[str]) -> Optional[Dict[str, Any]]:
+    extracted = await query_user_background(messages)
+    if not extracted:
+        return None
+    result = {'key': messages_key(messages), 'profile': extracted}
+    redis = settings.redis_client
+    if redis is not None:
+        try:
+            await asyncio.to_thread(redis.set, KEY_PREFIX + phone_number, json.dumps(result), ex=settings.ONBOARDING_PREFETCH_TTL)
+        except Exception as e:
+            logger.warning(f"Could not store onboarding prefetch for {phone_number}: {e}")
+    return result
+
+
+def start_prefetch(phone_number: str, messages: List[str]) -> None:
+    """Start the background lookup for these answers without waiting for it."""
+    if not settings.ONBOARDING_PREFETCH_ENABLED:
+        return
+    task = asyncio.create_task(_prefetch(phone_number, list(messages)))
+    _tasks[phone_number] = task
+
+    def _forget(done):
+        if _tasks.get(phone_number) is done:
+            del _tasks[phone_number]
+        if not done.cancelled() and done.exception():
+            logger.error(f"Onboarding prefetch for {phone_number} failed: {done.exception()}")
+    task.add_done_callback(_forget)
+    logger.info(f"Started onboarding background lookup for {phone_number}")
+
+
+async def take_prefetched(phone_number: str, messages: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    The prefetched {'profile'} for exactly these answers, or None.
+
+    Waits for a lookup still running in this process; otherwise reads the one
+    another onboarding worker stored in Redis. A result computed from
+    different answers is ignored.
+    """
+    result = None
+    redis = settings.redis_client
+    task = _tasks.get(phone_number)
+    if task is not None:
+        try:
+            result = await task
+        except Exception:
+            result = None
+    elif redis is not None:
+        try:
+            raw = await asyncio.to_thread(redis.get, KEY_PREFIX + phone_number)
+            result = json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Could not read onboarding prefetch for {phone_number}: {e}")
+    if redis is not None:
+        try:
+            await asyncio.to_thread(redis.delete, KEY_PREFIX + phone_number)
+        except Exception as e:
+            logger.warning(f"Could not clear onboarding prefetch for {phone_number}: {e}")
+    if not result or result.get('key') != messages_key(messages):
+        ONBOARDING_PREFETCH.labels('miss').inc()
+        return None
+    ONBOARDING_PREFETCH.labels('hit').inc()
+    return result
+
+
+def merge_final_answer(profile: Dict[str, Any], answer: str) -> Dict[str, Any]:
+    """Fold the step-2 answer (interests, what they are looking for) into the prefetched bio."""
+    answer = (answer or "").strip()
+    if not answer:
+        return profile
+    bio = (profile.get('bio') or "").strip()
+    return {**profile, 'bio': f"{bio} Looking for: {answer}" if bio else f"Looking for: {answer}"}
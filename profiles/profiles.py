@@ -1,17 +1,19 @@
 import logging
 from typing import Dict, Any, Optional, List
 from config import settings
-from database.supabase import get_supabase_client
+from database.supabase import get_async_supabase_client
 from database.models import UserProfile, UserState
+from metrics import timed
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+@timed('supabase.get_profile')
 async def get_user_profile(phone_number: str) -> Optional[UserProfile]:
 
     try:
-        supabase = get_supabase_client()
-        response = supabase.table('profiles').select('*').eq('user_id', phone_number).execute()
+        supabase = get_async_supabase_client()
+        response = await supabase.table('profiles').select('*').eq('user_id', phone_number).execute()
         
         if not response.data:
             logger.info(f"No profile found for user {phone_number}")
@@ -22,14 +24,18 @@ async def get_user_profile(phone_number: str) -> Optional[UserProfile]:
         logger.error(f"Error retrieving user profile: {str(e)}")
         return None
 
+async def get_profile_by_phone(phone_number: str) -> Optional[UserProfile]:
+    # Profiles are keyed by phone number (user_id)
+    return await get_user_profile(phone_number)
+
 async def create_user_profile(profile_data: Dict[str, Any]) -> Optional[UserProfile]:
     try:
-        supabase = get_supabase_client()
+        supabase = get_async_supabase_client()
         # Create a UserProfile instance
         profile = UserProfile(**profile_data)
         # Convert to dict for Supabase
         supabase_data = profile.to_supabase_dict()
-        response = supabase.table('profiles').insert(supabase_data).execute()
+        response = await supabase.table('profiles').insert(supabase_data).execute()
         
         if not response.data:
             logger.error("No data returned after profile creation")
@@ -42,7 +48,7 @@ async def create_user_profile(profile_data: Dict[str, Any]) -> Optional[UserProf
 
 async def update_user_profile(phone_number: str, profile_data: Dict[str, Any]) -> Optional[UserProfile]:
     try:
-        supabase = get_supabase_client()
+        supabase = get_async_supabase_client()
         # Create a UserProfile instance with the phone number as user_id
         profile_data['user_id'] = phone_number
         profile_data['updated_at'] = datetime.now(timezone.utc)
@@ -50,7 +56,7 @@ async def update_user_profile(phone_number: str, profile_data: Dict[str, Any]) -
         supabase_data = profile.to_supabase_dict()
         
         # Update in Supabase
-        response = supabase.table('profiles').update(supabase_data).eq('user_id', phone_number).execute()
+        response = await supabase.table('profiles').update(supabase_data).eq('user_id', phone_number).execute()
         
         if not response.data:
             logger.error(f"No data returned after profile update for user {phone_number}")
@@ -89,8 +95,8 @@ def merge_profile_updates(existing_profile: Dict[str, Any], new_data: Dict[str,
 
 async def get_user_state(phone_number: str) -> Optional[UserState]:
     try:
-        supabase = get_supabase_client()
-        response = supabase.table('user_states').select('*').eq('phone_number', phone_number).execute()
+        supabase = get_async_supabase_client()
+        response = await supabase.table('user_states').select('*').eq('phone_number', phone_number).execute()
         
         if not response.data:
             logger.info(f"No state found for user {phone_number}")
@@ -108,14 +114,14 @@ async def create_user_state(
     accumulated_messages: List[str] = None
 ) -> Optional[UserState]:
     try:
-        supabase = get_supabase_client()
+        supabase = get_async_supabase_client()
         state = UserState(
             phone_number=phone_number,
             step=step,
             profile=profile or {},
             accumulated_messages=accumulated_messages or []
         )
-        response = supabase.table('user_states').insert(state.to_supabase_dict()).execute()
+        response = await supabase.table('user_states').insert(state.to_supabase_dict()).execute()
         
         if not response.data:
             logger.error("No data returned after state creation")
@@ -128,10 +134,10 @@ async def create_user_state(
 
 async def update_user_state(phone_number: str, state_data: Dict[str, Any]) -> Optional[UserState]:
     try:
-        supabase = get_supabase_client()
+        supabase = get_async_supabase_client()
         state_data['updated_at'] = datetime.now(timezone.utc)
         
-        response = supabase.table('user_states').update(state_data).eq('phone_number', phone_number).execute()
+        response = await supabase.table('user_states').update(state_data).eq('phone_number', phone_number).execute()
         
         if not response.data:
             logger.error(f"No data returned after state update for user {phone_number}")
@@ -144,8 +150,8 @@ async def update_user_state(phone_number: str, state_data: Dict[str, Any]) -> Op
 
 async def delete_user_state(phone_number: str) -> bool:
     try:
-        supabase = get_supabase_client()
-        response = supabase.table('user_states').delete().eq('phone_number', phone_number).execute()
+        supabase = get_async_supabase_client()
+        response = await supabase.table('user_states').delete().eq('phone_number', phone_number).execute()
         return True
     except Exception as e:
         logger.error(f"Error deleting user state: {str(e)}")